@@ -1,7 +1,7 @@
 #! /usr/bin/env python
 """Evaluate experiment reports created by oxn"""
 import itertools
-from typing import List
+from typing import Dict, List
 
 # TODO: figure out a way to use multiple feature columns
 # TODO: handle multiple interactions
@@ -26,17 +26,21 @@ from imblearn.over_sampling import SMOTE
 
 import numpy as np
 import pandas as pd
-import yaml
 import seaborn as sns
 import matplotlib.gridspec as gridspec
 import matplotlib.dates as mdates
 import matplotlib.ticker as mticker
 
 from matplotlib import pyplot as plt
+from oxn.histogram import QUANTILES, LatencyHistogram
+from oxn.report_stream import read_report
 from oxn.store import get_dataframe
 
 import argparse
 
+METRIC_RESPONSE_TYPES = {"MetricResponseVariable", "LoadgenResponseVariable", "ResourceResponseVariable"}
+"""Response types stored as time series with the observed value in a column named like the response"""
+
 
 class TraceModel:
     """A classifier to predict treatment labels from a trace response variable"""
@@ -372,6 +376,11 @@ class Interaction:
         self.p_value = data['p_value']
         self.test_statistic = data['test_statistic']
         self.test_performed = data['test_performed']
+        self.adjusted_p_value = data.get('adjusted_p_value')
+        self.mann_whitney_p_value = data.get('mann_whitney_p_value')
+        self.cohens_d = data.get('cohens_d')
+        self.cliffs_delta = data.get('cliffs_delta')
+        self.mean_difference_ci = data.get('mean_difference_ci')
         self.store_key = data['store_key']
         if self.store_key:
             self.response_data = self.get_data()
@@ -394,7 +403,7 @@ class Interaction:
         return model
 
     def get_metric_name(self):
-        if not self.response_type == "MetricResponseVariable":
+        if self.response_type not in METRIC_RESPONSE_TYPES:
             return ""
         return self.response_name
 
@@ -410,7 +419,7 @@ class Interaction:
     def get_model(self, score="f1", use_traces=False):
         if self.response_type == "TraceResponseVariable":
             return self.get_trace_model(score=score, use_traces=use_traces)
-        if self.response_type == "MetricResponseVariable":
+        if self.response_type in METRIC_RESPONSE_TYPES:
             return self.get_metric_model(score=score)
 
 
@@ -528,7 +537,7 @@ class Interaction:
             fig, ax = plt.subplots(figsize=(5, 5))
         if self.response_type == "TraceResponseVariable":
             self.plot_trace_interaction(ax=ax, color_services=color_services, write=write)
-        if self.response_type == "MetricResponseVariable":
+        if self.response_type in METRIC_RESPONSE_TYPES:
             self.plot_metric_interaction(ax=ax, write=write)
 
     def trace_durations(self):
@@ -605,6 +614,11 @@ class AccountingDetail:
         self.id = id
         self.cpu_seconds = data.get("cpu_seconds", 0.0)
         self.number_of_cpus = data.get("number_of_cpus", 0)
+        self.role = data.get("role", "sue")
+        self.memory_bytes = data.get("memory_bytes")
+        self.network_rx_bytes = data.get("network_rx_bytes")
+        self.network_tx_bytes = data.get("network_tx_bytes")
+        self.energy_joules = data.get("energy_joules")
 
 
 class Run:
@@ -617,6 +631,7 @@ class Run:
         self.loadgen_total_requests = run_data["loadgen"].get('loadgen_total_requests', 0)
         self.loadgen_total_failures = run_data["loadgen"].get('loadgen_total_failures', 0)
         self.task_details = [TaskDetail(id=k, data=v) for k, v in run_data["loadgen"].get('task_details', {}).items()]
+        self.latencies = run_data["loadgen"].get("latencies", {})
         self.accounting_details = []
         if "accounting" in run_data:
             self.accounting_details = [AccountingDetail(id=k, data=v) for k, v in run_data["accounting"].items()]
@@ -712,12 +727,18 @@ class Report:
     @property
     def accounting_data(self) -> pd.DataFrame:
         """Return the accounting data from each run"""
-        header = ["run_key", "service", "cpu_seconds", "number_of_cpus"]
+        header = [
+            "run_key", "service", "role", "cpu_seconds", "number_of_cpus",
+            "memory_bytes", "network_rx_bytes", "network_tx_bytes", "energy_joules",
+        ]
         data = []
         for run in self.runs:
             accounting_details = run.accounting_details
             for detail in accounting_details:
-                data.append([run.id, detail.id, detail.cpu_seconds, detail.number_of_cpus])
+                data.append([
+                    run.id, detail.id, detail.role, detail.cpu_seconds, detail.number_of_cpus,
+                    detail.memory_bytes, detail.network_rx_bytes, detail.network_tx_bytes, detail.energy_joules,
+                ])
         performance_df = pd.DataFrame.from_records(data)
         performance_df.columns = header
         return performance_df
@@ -749,13 +770,44 @@ class Report:
         loadgen_df.columns = header
         return loadgen_df
 
+    def merged_latencies(self, window="all") -> Dict[str, LatencyHistogram]:
+        """Return the latency histogram of every endpoint id merged across all runs for one window"""
+        merged = {}
+        for run in self.runs:
+            for endpoint_id, latencies in run.latencies.items():
+                histogram = latencies["windows"].get(window)
+                if histogram is None:
+                    continue
+                histogram = LatencyHistogram.from_dict(histogram["histogram"])
+                if endpoint_id in merged:
+                    merged[endpoint_id].merge(histogram)
+                else:
+                    merged[endpoint_id] = histogram
+        return merged
+
+    @property
+    def latency_data(self) -> pd.DataFrame:
+        """Return the latency percentiles in milliseconds of every endpoint and window merged across all runs"""
+        endpoints = {}
+        windows = set()
+        for run in self.runs:
+            for endpoint_id, latencies in run.latencies.items():
+                endpoints[endpoint_id] = latencies["endpoint"]
+                windows.update(latencies["windows"])
+        data = []
+        for window in sorted(windows):
+            for endpoint_id, histogram in self.merged_latencies(window=window).items():
+                data.append([endpoint_id, endpoints[endpoint_id], window, *histogram.summary().values()])
+        return pd.DataFrame.from_records(
+            data, columns=["endpoint_id", "endpoint", "window", "count", *QUANTILES]
+        )
+
     def __str__(self):
         return f"{self.__class__.__name__}(file={self.experiment_name}, created={self.created})"
 
     @classmethod
     def from_file(cls, report_path):
-        with open(report_path, "r") as report_file:
-            report_data = yaml.safe_load(report_file.read())
+        report_data = read_report(report_path)
         creation_time = datetime.datetime.fromtimestamp(os.path.getctime(report_path))
         return cls(experiment_name=report_path, created=creation_time, data=report_data)
 
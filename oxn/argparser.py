@@ -18,6 +18,13 @@ def validate_file(file):
     return file
 
 
+def validate_namespaces(namespaces):
+    namespaces = [namespace for namespace in namespaces.split(",") if namespace]
+    if len(set(namespaces)) != len(namespaces):
+        raise argparse.ArgumentTypeError(f"Namespaces must be unique: {namespaces}")
+    return namespaces
+
+
 def validate_output_formats(formats):
     valid_formats = {'hdf', 'json'}
     formats = set(formats.split(','))
@@ -38,10 +45,15 @@ parser.add_argument(
     "spec",
     action="store",
     type=validate_file,
-    help="Path to an oxn experiment specification to execute.",
+    nargs="+",
+    help="Path to an oxn experiment specification to execute. Several specifications can be run concurrently "
+    "on kubernetes together with the --namespaces option.",
 )
 parser.add_argument(
-    "--times", default=1, type=int, help="Run the experiment n times. Default is 1"
+    "--times",
+    default=1,
+    type=int,
+    help="Run the experiment n times. With a matrix section, every combination is run n times. Default is 1",
 )
 parser.add_argument(
     "--report",
@@ -91,6 +103,32 @@ parser.add_argument(
     type=time_string_to_seconds
 )
 
+parser.add_argument(
+    "--reuse-sue",
+    dest="reuse_sue",
+    action="store_true",
+    help="Keep the SUE running between runs instead of tearing it down after every run. "
+    "The SUE is only restarted when the next run needs different compile time treatments.",
+)
+
+parser.add_argument(
+    "--settle",
+    dest="settle",
+    default="0s",
+    help="Time to let a reused SUE settle between runs before checking readiness again. "
+    "Only used together with --reuse-sue. Default is 0s",
+    type=time_string_to_seconds
+)
+
+parser.add_argument(
+    "--pipeline-depth",
+    dest="pipeline_depth",
+    default=0,
+    type=int,
+    help="Number of finished runs that may wait for storage and reporting while the next run executes. "
+    "Default is 0, which stores and reports every run before starting the next one.",
+)
+
 parser.add_argument(
     "--out-path",
     dest="out_path",
@@ -106,9 +144,37 @@ parser.add_argument(
     help="Comma-separated (no spaces) list of output formats. Valid formats are: hdf, json. Default is hdf",
 )
 
+parser.add_argument(
+    "--namespaces",
+    dest="namespaces",
+    type=validate_namespaces,
+    help="Comma-separated (no spaces) list of sue namespaces. If specified, all specifications run concurrently "
+    "on kubernetes, each in its own namespace. Every namespace needs its own copy of the sue.",
+)
+
+parser.add_argument(
+    "--capacity",
+    dest="capacity",
+    type=float,
+    help="Capacity budget of the cluster for concurrent experiments. Every experiment needs the capacity given "
+    "in sue.capacity of its specification, 1 by default. Default is the number of namespaces",
+)
+
+parser.add_argument(
+    "--trace",
+    dest="trace",
+    type=str,
+    help="Write the durations of all experiment phases as a Chrome trace file to the specified path. "
+    "The file can be opened in chrome://tracing or Perfetto.",
+)
+
 
 def parse_oxn_args(args):
     args = parser.parse_args(args)
     if args.accounting and not args.report:
         parser.error("The --accounting option requires the --report option to be set")
+    if len(args.spec) > 1 and not args.namespaces:
+        parser.error("Running several specifications requires the --namespaces option to be set")
+    if args.capacity is not None and not args.namespaces:
+        parser.error("The --capacity option requires the --namespaces option to be set")
     return args
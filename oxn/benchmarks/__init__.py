@@ -0,0 +1,6 @@
+"""
+Purpose: Benchmarks the overhead of oxn itself.
+Functionality: Runs experiments end-to-end against local stand-ins for the sue and its observability backends.
+Connection: Executed with python -m oxn.benchmarks, independent of any orchestrator.
+
+Engine overhead benchmarks"""
@@ -0,0 +1,10 @@
+"""
+Purpose: Entry point for the benchmark suite.
+Functionality: Calls the main function from suite.py.
+Connection: Executed with python -m oxn.benchmarks.
+"""
+import sys
+
+from .suite import main
+
+sys.exit(main())
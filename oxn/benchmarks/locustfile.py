@@ -0,0 +1,14 @@
+import os
+
+from locust import HttpUser, constant, task
+
+FRONTEND_URL_VARIABLE = "OXN_BENCHMARK_FRONTEND"
+"""Environment variable holding the url of the stand-in frontend"""
+
+
+class BenchmarkUser(HttpUser):
+    wait_time = constant(0.1)
+
+    @task
+    def index(self):
+        self.client.get(os.environ.get(FRONTEND_URL_VARIABLE, "/"), name="/")
@@ -0,0 +1,250 @@
+"""
+Purpose: Serves synthetic Prometheus, Jaeger and frontend endpoints for benchmarks.
+Functionality: Answers range queries and trace searches with payloads of configurable size that cover the
+requested time window, and answers load generation requests with an empty page.
+Connection: Started in a separate process by the benchmark suite, so that oxn can observe data without a sue.
+
+Local stand-ins for the observability backends of a sue"""
+import argparse
+import json
+import logging
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+import gevent
+from gevent.pywsgi import WSGIServer
+
+from ..errors import OxnException
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PORT = 9090
+"""Port oxn expects Prometheus at"""
+JAEGER_PORT = 16686
+"""Port oxn expects Jaeger at"""
+DEFAULT_FRONTEND_PORT = 8089
+"""Port the stand-in frontend for the load generation listens on"""
+SERVICES = ["frontend", "cartservice", "checkoutservice", "productcatalogservice", "recommendationservice"]
+"""Service names used in the synthetic metrics and traces"""
+
+
+def prometheus_payload(series: int, samples: int, start: float, end: float) -> dict:
+    """
+    Return a range query result with series time series of samples samples each
+
+    The samples are spread evenly over the requested window, so that labeling sees treatment and
+    non-treatment samples.
+    """
+    step = (end - start) / max(samples - 1, 1)
+    result = []
+    for idx in range(series):
+        result.append(
+            {
+                "metric": {
+                    "__name__": "benchmark_metric",
+                    "service_name": SERVICES[idx % len(SERVICES)],
+                    "instance": f"instance-{idx}",
+                },
+                "values": [
+                    [round(start + sample * step, 3), str(((idx * 31 + sample * 17) % 1000) / 10)]
+                    for sample in range(samples)
+                ],
+            }
+        )
+    return {"status": "success", "data": {"resultType": "matrix", "result": result}}
+
+
+def jaeger_payload(traces: int, spans: int, start: int, end: int) -> dict:
+    """
+    Return a trace search result with traces traces of spans spans each
+
+    Start and end are microseconds like in the Jaeger API. Traces start evenly spread over the window and
+    all spans of a trace are children of its root span.
+    """
+    interval = (end - start) // max(traces, 1)
+    data = []
+    for trace in range(traces):
+        trace_id = f"{trace:032x}"
+        trace_start = start + trace * interval
+        trace_spans = []
+        for span in range(spans):
+            span_id = f"{trace * spans + span:016x}"
+            references = []
+            if span:
+                references = [{"refType": "CHILD_OF", "traceID": trace_id, "spanID": f"{trace * spans:016x}"}]
+            trace_spans.append(
+                {
+                    "traceID": trace_id,
+                    "spanID": span_id,
+                    "operationName": f"operation-{span % 7}",
+                    "references": references,
+                    "startTime": trace_start + span * 10,
+                    "duration": 100 + (trace * 13 + span * 7) % 900,
+                    "tags": [
+                        {"key": "span.kind", "type": "string", "value": "server" if span % 2 else "client"},
+                        {"key": "http.status_code", "type": "int64", "value": 500 if (trace + span) % 50 == 0 else 200},
+                    ],
+                    "logs": [],
+                    "processID": f"p{span % len(SERVICES) + 1}",
+                    "warnings": None,
+                }
+            )
+        data.append(
+            {
+                "traceID": trace_id,
+                "spans": trace_spans,
+                "processes": {
+                    f"p{idx + 1}": {"serviceName": service, "tags": []} for idx, service in enumerate(SERVICES)
+                },
+                "warnings": None,
+            }
+        )
+    return {"data": data, "total": 0, "limit": 0, "offset": 0, "errors": None}
+
+
+class StandinApplication:
+    """WSGI application that answers like Prometheus, Jaeger and a sue frontend"""
+
+    def __init__(self, series: int, samples: int, traces: int, spans: int):
+        self.series = series
+        """Number of time series per range query"""
+        self.samples = samples
+        """Number of samples per time series"""
+        self.traces = traces
+        """Number of traces per trace search"""
+        self.spans = spans
+        """Number of spans per trace"""
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        query = {key: values[0] for key, values in parse_qs(environ.get("QUERY_STRING", "")).items()}
+        if path.endswith("/api/v1/query_range"):
+            now = time.time()
+            payload = prometheus_payload(
+                series=self.series,
+                samples=self.samples,
+                start=float(query.get("start", now - 60)),
+                end=float(query.get("end", now)),
+            )
+        elif path.endswith("/api/traces"):
+            now = int(time.time() * 1e6)
+            payload = jaeger_payload(
+                traces=self.traces,
+                spans=self.spans,
+                start=int(query.get("start", now - 60_000_000)),
+                end=int(query.get("end", now)),
+            )
+        else:
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+        body = json.dumps(payload).encode()
+        start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
+
+
+def serve(address: str, series: int, samples: int, traces: int, spans: int, frontend_port: int) -> None:
+    """Serve the stand-ins on the Prometheus, Jaeger and frontend ports of an address until killed"""
+    application = StandinApplication(series=series, samples=samples, traces=traces, spans=spans)
+    servers = [
+        WSGIServer((address, port), application, log=None)
+        for port in (PROMETHEUS_PORT, JAEGER_PORT, frontend_port)
+    ]
+    for server in servers:
+        server.start()
+    logger.info(f"Serving stand-ins on {address}")
+    gevent.wait()
+
+
+class Standins:
+    """
+    Run the stand-ins in a separate process
+
+    The stand-ins run outside the benchmarked process, so that generating and serializing the payloads
+    does not count against the cpu time and memory of oxn.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        series: int,
+        samples: int,
+        traces: int,
+        spans: int,
+        frontend_port: int = DEFAULT_FRONTEND_PORT,
+    ):
+        self.address = address
+        """Loopback address to serve on. Any address of 127.0.0.0/8 keeps the fixed ports free on 127.0.0.1"""
+        self.frontend_port = frontend_port
+        """Port of the stand-in frontend"""
+        self.arguments = [
+            "--address", address,
+            "--series", str(series),
+            "--samples", str(samples),
+            "--traces", str(traces),
+            "--spans", str(spans),
+            "--frontend-port", str(frontend_port),
+        ]
+        """Command line arguments of the stand-in process"""
+        self.process: Optional[subprocess.Popen] = None
+        """The stand-in process"""
+
+    @property
+    def frontend_url(self) -> str:
+        return f"http://{self.address}:{self.frontend_port}/"
+
+    def _listening(self, port: int) -> bool:
+        try:
+            with socket.create_connection((self.address, port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def start(self, timeout: float = 15) -> None:
+        """Start the stand-in process and block until all ports accept connections"""
+        self.process = subprocess.Popen([sys.executable, "-m", "oxn.benchmarks.standins", *self.arguments])
+        deadline = time.monotonic() + timeout
+        ports = [PROMETHEUS_PORT, JAEGER_PORT, self.frontend_port]
+        while not all(self._listening(port) for port in ports):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise OxnException(
+                    message="Could not start the benchmark stand-ins",
+                    explanation=f"Stand-ins did not listen on {self.address} ports {ports} within {timeout}s",
+                )
+            time.sleep(0.1)
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+        self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic Prometheus, Jaeger and frontend endpoints")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--series", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--traces", type=int, default=100)
+    parser.add_argument("--spans", type=int, default=10)
+    parser.add_argument("--frontend-port", type=int, default=DEFAULT_FRONTEND_PORT)
+    args = parser.parse_args()
+    serve(
+        address=args.address,
+        series=args.series,
+        samples=args.samples,
+        traces=args.traces,
+        spans=args.spans,
+        frontend_port=args.frontend_port,
+    )
@@ -0,0 +1,419 @@
+"""
+Purpose: Measures the overhead of oxn itself, separate from the sue.
+Functionality: Runs the engine end-to-end against an orchestrator without a sue and local stand-ins for
+Prometheus and Jaeger, and reports throughput, peak memory and per-phase timings as JSON.
+Connection: Executed with python -m oxn.benchmarks to catch performance regressions of the engine.
+
+Engine overhead benchmarks"""
+import argparse
+import copy
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .. import store
+from ..engine import Engine
+from ..models.orchestrator import Orchestrator
+from ..responses import MetricResponseVariable, TraceResponseVariable
+from ..store import configure_output_path
+from ..timing import RESPONSES
+from .locustfile import FRONTEND_URL_VARIABLE
+from .standins import DEFAULT_FRONTEND_PORT, SERVICES, Standins
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "127.0.0.2"
+"""Loopback address of the stand-ins. Keeps a local Prometheus or Jaeger on 127.0.0.1 undisturbed"""
+LOCUSTFILE = os.path.join(os.path.dirname(__file__), "locustfile.py")
+"""Locust file that sends requests to the stand-in frontend"""
+TRACE_RESPONSE = "benchmark_traces"
+"""Name of the trace response of the benchmark experiment"""
+METRIC_RESPONSE = "benchmark_samples"
+"""Name of the metric response of the benchmark experiment"""
+LOADGEN_RESPONSE = "benchmark_requests"
+"""Name of the load generation response of the benchmark experiment"""
+
+
+class BenchmarkCase:
+    """Sizes of the synthetic data and the shape of the experiment a benchmark runs"""
+
+    def __init__(
+        self,
+        name: str,
+        series: int = 10,
+        samples: int = 120,
+        traces: int = 50,
+        spans: int = 10,
+        runs: int = 1,
+        duration: str = "1s",
+        users: int = 1,
+        workers: int = 0,
+    ):
+        self.name = name
+        """Name of the case in the benchmark results"""
+        self.series = series
+        """Number of time series Prometheus returns per range query"""
+        self.samples = samples
+        """Number of samples per time series"""
+        self.traces = traces
+        """Number of traces Jaeger returns per search"""
+        self.spans = spans
+        """Number of spans per trace"""
+        self.runs = runs
+        """Number of experiment runs"""
+        self.duration = duration
+        """Duration of the empty treatment and of the load generation of a run"""
+        self.users = users
+        """Number of simulated load generation users"""
+        self.workers = workers
+        """Number of local locust worker processes. Without workers, all users run in the engine process"""
+
+    def __repr__(self):
+        return f"BenchmarkCase({self.name}, series={self.series}, samples={self.samples}, traces={self.traces}, spans={self.spans})"
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, parameters: dict) -> "BenchmarkCase":
+        return cls(**parameters)
+
+
+CASES = {
+    "small": BenchmarkCase(name="small", series=10, samples=120, traces=50, spans=10),
+    "medium": BenchmarkCase(name="medium", series=50, samples=600, traces=500, spans=20),
+    "large": BenchmarkCase(name="large", series=200, samples=1800, traces=2000, spans=25),
+}
+"""Predefined benchmark cases"""
+
+
+def benchmark_spec(case: BenchmarkCase) -> dict:
+    """Return the experiment specification of a benchmark case"""
+    return {
+        "experiment": {
+            "name": f"benchmark_{case.name}",
+            "version": "0.0.1",
+            "orchestrator": "benchmark",
+            "responses": [
+                {
+                    "name": METRIC_RESPONSE,
+                    "type": "metric",
+                    "metric_name": "benchmark_metric",
+                    "step": 1,
+                    "left_window": "0s",
+                    "right_window": "0s",
+                    "target": "sue",
+                },
+                {
+                    "name": TRACE_RESPONSE,
+                    "type": "trace",
+                    "service_name": SERVICES[0],
+                    "limit": case.traces,
+                    "left_window": "0s",
+                    "right_window": "0s",
+                },
+                {
+                    "name": LOADGEN_RESPONSE,
+                    "type": "loadgen",
+                    "statistic": "p99",
+                    "left_window": "0s",
+                    "right_window": "0s",
+                },
+            ],
+            "treatments": [{"benchmark_empty": {"action": "empty", "params": {"duration": case.duration}}}],
+            "sue": {"compose": "benchmark", "required": []},
+            "loadgen": {
+                "run_time": case.duration,
+                "max_users": case.users,
+                "spawn_rate": case.users,
+                "locust_files": [LOCUSTFILE],
+                "workers": case.workers,
+            },
+        }
+    }
+
+
+class BenchmarkOrchestrator(Orchestrator):
+    """Orchestrator without a sue that points oxn to the stand-ins"""
+
+    def __init__(self, experiment_config: dict, address: str):
+        self.experiment_config = experiment_config
+        """The experiment spec"""
+        self.address = address
+        """Address of the stand-ins"""
+
+    def orchestrate(self):
+        pass
+
+    def ready(self, expected_services: List[str] = None, timeout: int = 120) -> bool:
+        return True
+
+    def teardown(self):
+        pass
+
+    def translate_compose_names(self, compose_names: List[str]):
+        return compose_names
+
+    def translate_container_names(self, container_names: List[str]):
+        return container_names
+
+    @property
+    def running_services(self) -> List[str]:
+        return list(SERVICES)
+
+    def get_address_for_service(self, service: str) -> str:
+        return self.address
+
+    def get_prometheus_address(self) -> str:
+        return self.address
+
+    def get_jaeger_address(self) -> str:
+        return self.address
+
+    def get_orchestrator_type(self) -> str:
+        return "benchmark"
+
+    def relevant_namespaces(self) -> List[str]:
+        return []
+
+
+class BenchmarkEngine(Engine):
+    """Engine that runs an in-memory specification against the benchmark orchestrator and counts the observed data"""
+
+    def __init__(self, spec: dict, address: str, **kwargs):
+        super().__init__(configuration_path=f"{spec['experiment']['name']}.yml", **kwargs)
+        self.spec = spec
+        self.address = address
+        """Address of the stand-ins"""
+        self.spans = 0
+        """Number of spans observed by all runs"""
+        self.samples = 0
+        """Number of metric samples observed by all runs"""
+
+    def _build_orchestrator(self, spec=None):
+        return BenchmarkOrchestrator(experiment_config=spec if spec else self.spec, address=self.address)
+
+    def _process_run(self, result):
+        for response in result.runner.observer.variables().values():
+            rows = 0 if response.data is None else len(response.data)
+            if isinstance(response, TraceResponseVariable):
+                self.spans += rows
+            elif isinstance(response, MetricResponseVariable):
+                self.samples += rows
+        super()._process_run(result)
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def response_seconds(timers, response: str) -> float:
+    """Return the seconds oxn spent observing, storing and reporting a response over all runs"""
+    total = 0.0
+    for timer in timers:
+        total += sum(timer.summary().get(RESPONSES, {}).get(response, {}).values())
+    return total
+
+
+def _per_second(count: int, seconds: float) -> Optional[float]:
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def run_case(case: BenchmarkCase, address: str = DEFAULT_ADDRESS, frontend_port: int = DEFAULT_FRONTEND_PORT) -> dict:
+    """
+    Run a benchmark case in this process and return its results
+
+    The engine writes its store, report and trie to a temporary directory. Throughput counts the observed
+    spans and samples per second spent observing, storing and reporting the response, summed over all runs.
+    The peak rss is the peak of the whole process, so cases should run in separate processes to compare it.
+    """
+    previous_directory = os.getcwd()
+    previous_output_path = store._configured_path
+    with tempfile.TemporaryDirectory(prefix="oxn-benchmark-") as workdir, Standins(
+        address=address,
+        series=case.series,
+        samples=case.samples,
+        traces=case.traces,
+        spans=case.spans,
+        frontend_port=frontend_port,
+    ) as standins:
+        os.environ[FRONTEND_URL_VARIABLE] = standins.frontend_url
+        os.chdir(workdir)
+        try:
+            engine = BenchmarkEngine(
+                spec=benchmark_spec(case),
+                address=address,
+                report_path=os.path.join(workdir, ""),
+                out_path=workdir,
+                out_formats=["hdf"],
+            )
+            started = time.monotonic()
+            cpu_started = time.process_time()
+            engine.run(runs=case.runs, orchestration_timeout="1s")
+            wall_seconds = time.monotonic() - started
+            cpu_seconds = time.process_time() - cpu_started
+        finally:
+            os.chdir(previous_directory)
+            configure_output_path(previous_output_path)
+    return {
+        "name": case.name,
+        "parameters": case.to_dict(),
+        "wall_seconds": round(wall_seconds, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "spans": engine.spans,
+        "samples": engine.samples,
+        "spans_per_second": _per_second(engine.spans, response_seconds(engine.run_timers, TRACE_RESPONSE)),
+        "samples_per_second": _per_second(engine.samples, response_seconds(engine.run_timers, METRIC_RESPONSE)),
+        "timings": {
+            "experiment": engine.timer.summary(),
+            "runs": [timer.summary() for timer in engine.run_timers],
+        },
+    }
+
+
+def run_isolated(case: BenchmarkCase, address: str = DEFAULT_ADDRESS, frontend_port: int = DEFAULT_FRONTEND_PORT) -> dict:
+    """Run a benchmark case in a fresh interpreter, so that its peak rss is not inflated by earlier cases"""
+    with tempfile.TemporaryDirectory(prefix="oxn-benchmark-") as directory:
+        out_path = os.path.join(directory, "result.json")
+        subprocess.run(
+            [
+                sys.executable, "-m", "oxn.benchmarks",
+                "--case-parameters", json.dumps(case.to_dict()),
+                "--address", address,
+                "--frontend-port", str(frontend_port),
+                "--in-process",
+                "--out", out_path,
+            ],
+            check=True,
+        )
+        with open(out_path) as fp:
+            return json.load(fp)["cases"][0]
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Compare benchmark results with a baseline and return the regressions
+
+    Throughput regresses if it drops by more than the tolerance, peak rss if it grows by more than the tolerance.
+    Cases missing in either document are ignored.
+    """
+    baseline_cases = {case["name"]: case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in results.get("cases", []):
+        reference = baseline_cases.get(case["name"])
+        if reference is None:
+            continue
+        for key in ("spans_per_second", "samples_per_second"):
+            if case.get(key) and reference.get(key) and case[key] < reference[key] * (1 - tolerance):
+                regressions.append(f"{case['name']}: {key} dropped from {reference[key]} to {case[key]}")
+        if case["peak_rss_bytes"] > reference["peak_rss_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{case['name']}: peak_rss_bytes grew from {reference['peak_rss_bytes']} to {case['peak_rss_bytes']}"
+            )
+    return regressions
+
+
+def benchmark_document(cases: List[dict]) -> dict:
+    """Return the machine-readable results of a benchmark session"""
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+parser = argparse.ArgumentParser(
+    prog="python -m oxn.benchmarks",
+    description="Measure the overhead of oxn against local stand-ins for the sue",
+)
+parser.add_argument(
+    "--cases",
+    nargs="+",
+    choices=sorted(CASES),
+    default=["small", "medium"],
+    help="Benchmark cases to run. Default is small and medium",
+)
+parser.add_argument("--series", type=int, help="Override the number of time series per range query")
+parser.add_argument("--samples", type=int, help="Override the number of samples per time series")
+parser.add_argument("--traces", type=int, help="Override the number of traces per trace search")
+parser.add_argument("--spans", type=int, help="Override the number of spans per trace")
+parser.add_argument("--runs", type=int, help="Override the number of experiment runs")
+parser.add_argument("--users", type=int, help="Override the number of load generation users")
+parser.add_argument("--workers", type=int, help="Override the number of local locust worker processes")
+parser.add_argument(
+    "--address",
+    default=DEFAULT_ADDRESS,
+    help=f"Loopback address to serve the stand-ins on. Default is {DEFAULT_ADDRESS}",
+)
+parser.add_argument(
+    "--frontend-port",
+    type=int,
+    default=DEFAULT_FRONTEND_PORT,
+    help=f"Port of the stand-in frontend. Default is {DEFAULT_FRONTEND_PORT}",
+)
+parser.add_argument("--out", help="Write the results to a JSON file instead of stdout")
+parser.add_argument("--baseline", help="Compare the results with a previous JSON result file and fail on regressions")
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.2,
+    help="Relative change against the baseline that counts as a regression. Default is 0.2",
+)
+parser.add_argument(
+    "--in-process",
+    action="store_true",
+    help="Run all cases in this process instead of one process per case. Peak rss then covers all cases",
+)
+parser.add_argument("--case-parameters", help=argparse.SUPPRESS)
+
+
+def selected_cases(args) -> List[BenchmarkCase]:
+    """Return the benchmark cases selected on the command line with their sizes overridden"""
+    if args.case_parameters:
+        return [BenchmarkCase.from_dict(json.loads(args.case_parameters))]
+    overrides: Dict[str, int] = {
+        key: getattr(args, key)
+        for key in ("series", "samples", "traces", "spans", "runs", "users", "workers")
+        if getattr(args, key) is not None
+    }
+    cases = []
+    for name in args.cases:
+        case = copy.copy(CASES[name])
+        for key, value in overrides.items():
+            setattr(case, key, value)
+        cases.append(case)
+    return cases
+
+
+def main(argv=None) -> int:
+    args = parser.parse_args(argv)
+    run = run_case if args.in_process else run_isolated
+    results = benchmark_document(
+        [run(case, address=args.address, frontend_port=args.frontend_port) for case in selected_cases(args)]
+    )
+    if args.out:
+        with open(args.out, "w") as fp:
+            json.dump(results, fp, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare_results(results, json.load(fp), tolerance=args.tolerance)
+        for regression in regressions:
+            logger.error(regression)
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,214 @@
+"""
+Purpose: Runs several independent experiments concurrently on one Kubernetes cluster.
+Functionality: Places every experiment in its own sue namespace, rewrites its specification to target the
+services of that namespace and schedules the experiments within a cluster capacity budget.
+Connection: Used by main.py to execute a campaign of experiment specifications with one Engine per experiment.
+
+Namespace-sharded experiment campaigns"""
+import copy
+import logging
+import os
+import re
+import time
+from typing import List, Optional
+
+import gevent
+from gevent.event import Event
+
+from .engine import Engine
+from .errors import OxnException
+from .kubernetes_orchestrator import DEFAULT_SUE_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+
+def shard_spec(spec: dict, namespace: str, base_namespace: Optional[str] = None) -> dict:
+    """
+    Rewrite an experiment specification to run in another sue namespace
+
+    Every occurrence of the base namespace, e.g. in the namespaces of required services, of the sue Prometheus
+    and Jaeger, of the load generation target, of treatments and in label matchers of PromQL queries, is replaced
+    by the given namespace. Namespaces of shared services outside the sue, like an external monitoring stack,
+    stay untouched.
+    """
+    sharded = copy.deepcopy(spec)
+    base_namespace = base_namespace or sharded["experiment"]["sue"].get("namespace", DEFAULT_SUE_NAMESPACE)
+    pattern = re.compile(rf"(?<![\w-]){re.escape(base_namespace)}(?![\w-])")
+
+    def _replace(thing):
+        if isinstance(thing, dict):
+            return {key: _replace(value) for key, value in thing.items()}
+        if isinstance(thing, list):
+            return [_replace(value) for value in thing]
+        if isinstance(thing, str):
+            return pattern.sub(namespace, thing)
+        return thing
+
+    sharded["experiment"] = _replace(sharded["experiment"])
+    sharded["experiment"]["sue"]["namespace"] = namespace
+    return sharded
+
+
+class CampaignExperiment:
+    """A single experiment of a campaign"""
+
+    def __init__(self, spec_path: str, engine: Engine, capacity: float = 1):
+        self.spec_path = spec_path
+        """Path to the experiment specification"""
+        self.engine = engine
+        """The engine executing the experiment"""
+        self.capacity = capacity
+        """Share of the cluster capacity budget the experiment needs"""
+        self.namespace = None
+        """The sue namespace the experiment was scheduled to"""
+        self.started = None
+        """Monotonic timestamp when the experiment started"""
+        self.finished = None
+        """Monotonic timestamp when the experiment finished"""
+        self.error = None
+        """Exception the experiment failed with, if any"""
+
+    def __repr__(self):
+        return f"CampaignExperiment(spec={self.spec_path}, namespace={self.namespace}, capacity={self.capacity})"
+
+    @property
+    def duration(self) -> float:
+        """Return the seconds the experiment ran for"""
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class Campaign:
+    """
+    Run independent experiments concurrently in separate sue namespaces
+
+    Every namespace hosts one copy of the sue with its own Prometheus, Jaeger and load generation target.
+    An experiment is started as soon as a namespace is free and the capacity it needs fits into the remaining
+    capacity budget of the cluster. Experiments are started in the given order, so a large experiment is not
+    starved by smaller ones behind it. With k namespaces and enough capacity, a campaign of N experiments
+    takes about N/k times as long as a single experiment.
+    """
+
+    def __init__(
+        self,
+        spec_paths: List[str],
+        namespaces: List[str],
+        capacity: Optional[float] = None,
+        report_path=None,
+        out_path=None,
+        out_formats=None,
+        treatment_file=None,
+        trace_path=None,
+    ):
+        assert namespaces, "A campaign needs at least one namespace"
+        self.namespaces = list(namespaces)
+        """Sue namespaces experiments can be scheduled to"""
+        self.capacity = capacity if capacity is not None else len(self.namespaces)
+        """Capacity budget of the cluster shared by all running experiments"""
+        self.free_namespaces = list(self.namespaces)
+        """Namespaces that currently do not host an experiment"""
+        self.used_capacity = 0.0
+        """Capacity used by the running experiments"""
+        self.released = Event()
+        """Set whenever a running experiment releases its namespace and capacity"""
+        self.experiments = [
+            CampaignExperiment(
+                spec_path=spec_path,
+                engine=Engine(
+                    configuration_path=spec_path,
+                    report_path=f"{report_path}{self._label(idx, spec_path)}_" if report_path else None,
+                    out_path=out_path,
+                    out_formats=out_formats,
+                    treatment_file=treatment_file,
+                    trace_path=self._trace_path(trace_path, idx, spec_path),
+                ),
+            )
+            for idx, spec_path in enumerate(spec_paths)
+        ]
+        """Experiments of the campaign in the order they are started"""
+
+    def __repr__(self):
+        return f"Campaign(experiments={len(self.experiments)}, namespaces={self.namespaces}, capacity={self.capacity})"
+
+    @staticmethod
+    def _label(idx: int, spec_path: str) -> str:
+        """Return a label that distinguishes the outputs of experiments of the campaign"""
+        return f"{idx}_{os.path.splitext(os.path.basename(spec_path))[0]}"
+
+    def _trace_path(self, trace_path: Optional[str], idx: int, spec_path: str) -> Optional[str]:
+        if not trace_path:
+            return None
+        root, extension = os.path.splitext(trace_path)
+        return f"{root}_{self._label(idx, spec_path)}{extension or '.json'}"
+
+    def prepare(self) -> None:
+        """Read and validate all specifications before any experiment starts"""
+        for experiment in self.experiments:
+            engine = experiment.engine
+            engine.read_experiment_specification()
+            engine.validate_syntax()
+            if engine.spec["experiment"]["orchestrator"] != "kubernetes":
+                raise OxnException(
+                    message=f"Can't run {experiment.spec_path} in a campaign",
+                    explanation="Only experiments on kubernetes can run concurrently in separate namespaces",
+                )
+            experiment.capacity = engine.spec["experiment"]["sue"].get("capacity", 1)
+            if experiment.capacity > self.capacity:
+                raise OxnException(
+                    message=f"Can't schedule {experiment.spec_path}",
+                    explanation=f"It needs capacity {experiment.capacity} but the budget is {self.capacity}",
+                )
+
+    def _acquire(self, experiment: CampaignExperiment) -> str:
+        """Block until a namespace is free and the capacity of the experiment fits into the budget"""
+        while not (self.free_namespaces and self.used_capacity + experiment.capacity <= self.capacity):
+            self.released.clear()
+            self.released.wait()
+        self.used_capacity += experiment.capacity
+        return self.free_namespaces.pop(0)
+
+    def _release(self, experiment: CampaignExperiment) -> None:
+        self.used_capacity -= experiment.capacity
+        self.free_namespaces.append(experiment.namespace)
+        self.released.set()
+
+    def _run_experiment(self, experiment: CampaignExperiment, run_options: dict) -> None:
+        engine = experiment.engine
+        engine.spec = shard_spec(spec=engine.spec, namespace=experiment.namespace)
+        logger.info(f"Starting {experiment}")
+        experiment.started = time.monotonic()
+        try:
+            engine.run(**run_options)
+        except Exception as e:
+            experiment.error = e
+            logger.error(f"{experiment} failed: {e}")
+            engine.shutdown()
+        finally:
+            experiment.finished = time.monotonic()
+            engine.write_trace()
+            self._release(experiment)
+            logger.info(f"Finished {experiment} after {experiment.duration:.1f}s")
+
+    def run(self, **run_options) -> List[CampaignExperiment]:
+        """
+        Run all experiments of the campaign and block until every experiment is done
+
+        The run options are passed on to the engine of every experiment.
+        """
+        self.prepare()
+        logger.info(f"Running {self}")
+        started = time.monotonic()
+        greenlets = []
+        for experiment in self.experiments:
+            experiment.namespace = self._acquire(experiment)
+            greenlets.append(gevent.spawn(self._run_experiment, experiment, run_options))
+        gevent.joinall(greenlets)
+        logger.info(f"Campaign finished after {time.monotonic() - started:.1f}s")
+        failed = [experiment for experiment in self.experiments if experiment.error is not None]
+        if failed:
+            raise OxnException(
+                message="Error while executing the campaign",
+                explanation="\n".join(f"{experiment.spec_path}: {experiment.error}" for experiment in failed),
+            )
+        return self.experiments
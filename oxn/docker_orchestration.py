@@ -4,22 +4,53 @@ Functionality: Manages Docker Compose orchestration to set up and tear down serv
 Connection: Called by the Engine to manage the lifecycle of the SUE.
 
 Module to handle orchestration of a system under experiment"""
+import datetime
+import fnmatch
 import logging
 import os
+import socket
 import time
 from pathlib import Path
 from typing import Optional, List, Tuple
 
 import docker.errors
+import gevent
+from gevent.pool import Pool
 import python_on_whales
+import requests
 from python_on_whales import DockerClient
 from docker.errors import NotFound
 from yaml import compose
 from .errors import OrchestrationException
+from .utils import time_string_to_seconds, utc_timestamp
 from oxn.models.orchestrator import Orchestrator  # Import the abstract base class
 
 logger = logging.getLogger(__name__)
 
+DOCKER_CONNECTION_POOL_SIZE = 32
+"""Number of pooled connections to the docker daemon, shared by the orchestrator and all treatments"""
+FAILED_CONTAINER_ACTIONS = {"die", "oom"}
+"""Docker events after which a container that should become ready has failed"""
+
+
+class ContainerCommandResult:
+    """Result of a console command executed in a single container"""
+
+    def __init__(self, container: str, exit_code: int, output: str, latency: float):
+        self.container = container
+        """The name of the container"""
+        self.exit_code = exit_code
+        """The exit code of the command, -1 if the container was not found, the docker api failed or the command timed out"""
+        self.output = output
+        """The output of the command"""
+        self.latency = latency
+        """Seconds between sending the command and receiving its exit code"""
+        self.finished = utc_timestamp()
+        """UTC timestamp when the command finished in the container"""
+
+    def __repr__(self):
+        return f"ContainerCommandResult(container={self.container}, exit_code={self.exit_code}, latency={self.latency:.3f}s)"
+
 
 class DockerComposeOrchestrator(Orchestrator):
     """
@@ -43,6 +74,8 @@ class DockerComposeOrchestrator(Orchestrator):
         self.exclude = None
         self.include = None
         self.messages = []
+        self.readiness_latencies = {}  # map service names to the seconds it took them to become ready
+        self.containers = {}  # map container names to cached docker-py container handles
         if self.experiment_config:
             self._read_orchestration_section()
             self._initialize_compose_client()
@@ -137,7 +170,7 @@ class DockerComposeOrchestrator(Orchestrator):
 
     def _initialize_docker_client(self):
         try:
-            self.docker_client = docker.from_env()
+            self.docker_client = docker.from_env(max_pool_size=DOCKER_CONNECTION_POOL_SIZE)
             self.docker_client.ping()
         except docker.errors.APIError as docker_api_error:
             raise OrchestrationException(
@@ -187,42 +220,247 @@ class DockerComposeOrchestrator(Orchestrator):
         containers = self.compose_client.compose.ps()
         return [self.container_service_map[container.name] for container in containers]
 
+    def get_container(self, container_name: str, refresh: bool = False):
+        """
+        Return a cached handle for a container
+
+        Treatments share the docker client of the orchestrator and look up containers through this cache, so that
+        a container is only looked up once per sue build. Cached handles keep the attributes from when they were
+        looked up, pass refresh to read the current state of the container.
+
+        Throws:
+            docker.errors.NotFound: If the container does not exist
+        """
+        container = self.containers.get(container_name)
+        if container is None:
+            container = self.docker_client.containers.get(container_id=container_name)
+            self.containers[container_name] = container
+        elif refresh:
+            try:
+                container.reload()
+            except NotFound:
+                del self.containers[container_name]
+                raise
+        return container
+
+    def resolve_containers(self, services) -> List[str]:
+        """
+        Resolve a service name, a list of service names or glob patterns like "*service" to container names
+
+        Patterns are matched against the service and container names of the sue. Names without a pattern are
+        passed through, so that containers outside of the sue can still be targeted by name.
+        """
+        if isinstance(services, str):
+            services = [services]
+        sue_containers = {
+            service_name: self.service_container_map.get(service_name) or service_name
+            for service_name in self.sue_service_names
+        }
+        resolved = []
+        for service in services:
+            if not any(character in service for character in "*?["):
+                resolved.append(sue_containers.get(service, service))
+                continue
+            resolved.extend(
+                container_name
+                for service_name, container_name in sorted(sue_containers.items())
+                if fnmatch.fnmatch(service_name, service) or fnmatch.fnmatch(container_name, service)
+            )
+        # keep the order of the targets but drop duplicates
+        return list(dict.fromkeys(resolved))
+
+    def _exec_in_container(self, container_name: str, command: List[str], timeout: Optional[float]) -> ContainerCommandResult:
+        started = time.monotonic()
+        try:
+            with gevent.Timeout(timeout):
+                exit_code, output = self.get_container(container_name).exec_run(cmd=command)
+        except gevent.Timeout:
+            exit_code, output = -1, f"Command timed out after {timeout}s"
+        except NotFound:
+            exit_code, output = -1, f"Container {container_name} does not exist"
+        except docker.errors.APIError as e:
+            exit_code, output = -1, f"Docker API returned an error: {e.explanation}"
+        if isinstance(output, bytes):
+            output = output.decode(errors="replace")
+        return ContainerCommandResult(
+            container=container_name, exit_code=exit_code, output=output, latency=time.monotonic() - started
+        )
+
+    def exec_in_containers(
+        self,
+        container_names: List[str],
+        command: List[str],
+        max_parallel: int = 16,
+        timeout: Optional[float] = None,
+    ) -> List[ContainerCommandResult]:
+        """
+        Execute a console command in several containers concurrently
+
+        Commands are sent through a bounded pool of greenlets over the shared docker client, so that a fault
+        starts at nearly the same time in all containers.
+
+        Returns:
+            One result per container, in the order of the container names
+        """
+        pool = Pool(size=max_parallel)
+        greenlets = [
+            pool.spawn(self._exec_in_container, container_name, command, timeout)
+            for container_name in container_names
+        ]
+        gevent.joinall(greenlets, raise_error=True)
+        return [greenlet.value for greenlet in greenlets]
+
     def orchestrate(self):
+        # compose recreates containers, so handles from an earlier build are stale
+        self.containers = {}
         self.compose_client.compose.up(
             detach=True, services=self.sue_service_names, quiet=True
         )
 
+    @staticmethod
+    def _container_ready(container) -> bool:
+        """
+        Check if a container is running and passes its healthcheck
+
+        Containers without a healthcheck are ready as soon as they are running.
+        """
+        state = container.attrs.get("State") or {}
+        if state.get("Status") != "running":
+            return False
+        health = state.get("Health")
+        return not health or health.get("Status") == "healthy"
+
+    @staticmethod
+    def _probe(probe: dict, deadline: float) -> bool:
+        """Probe a service via http or tcp until it responds or the deadline has passed"""
+        interval = time_string_to_seconds(probe.get("interval", "500ms"))
+        while time.monotonic() < deadline:
+            try:
+                if "http" in probe:
+                    response = requests.get(probe["http"], timeout=max(interval, 1.0))
+                    if response.status_code < 500:
+                        return True
+                elif "tcp" in probe:
+                    host, port = probe["tcp"].rsplit(":", 1)
+                    with socket.create_connection((host, int(port)), timeout=max(interval, 1.0)):
+                        return True
+            except (requests.RequestException, OSError):
+                pass
+            time.sleep(interval)
+        return False
+
+    def _read_probes(self) -> dict:
+        """Read the optional readiness probes per service from the sue section"""
+        if not self.experiment_config:
+            return {}
+        return self.experiment_config["experiment"]["sue"].get("probes") or {}
+
     def ready(self, expected_services=None, timeout=120) -> bool:
         """
         Block until all services are ready
+
+        A service is ready once its container is running, its healthcheck passes if it defines one and its
+        optional http or tcp probe from the sue section responds. The state of all containers is read once,
+        after which we wait on the docker events stream instead of polling each container. Optional probes
+        run concurrently for all services.
         """
-        all_ready = []
         if not expected_services:
-            expected_services = self.docker_service_names
-        for service_name in expected_services:
-            container_name = self.service_container_map[service_name]
-            try:
-                container = self.docker_client.containers.get(
-                    container_id=container_name
+            expected_services = self.sue_service_names
+        started = time.monotonic()
+        deadline = started + timeout
+        probes = self._read_probes()
+        pending = {
+            self.service_container_map[service_name]: service_name
+            for service_name in expected_services
+        }
+        self.readiness_latencies = {}
+        probe_greenlets = {}
+
+        def probe(service_name):
+            # record the latency when this probe succeeds, not when the slowest probe is done
+            if self._probe(probes[service_name], deadline):
+                self.readiness_latencies[service_name] = time.monotonic() - started
+
+        def mark_running(container_name):
+            service_name = pending.pop(container_name)
+            if service_name in probes:
+                probe_greenlets[service_name] = gevent.spawn(probe, service_name)
+            else:
+                self.readiness_latencies[service_name] = time.monotonic() - started
+                logger.debug(f"Container {container_name} is ready.")
+
+        # replay events from before the snapshot so that no state change is lost in between
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+        containers = {
+            container.name: container
+            for container in self.docker_client.containers.list(
+                all=True, filters={"name": list(pending.keys())}
+            )
+        }
+        self.containers.update(containers)
+        for container_name in list(pending.keys()):
+            container = containers.get(container_name)
+            if container is None:
+                raise OrchestrationException(
+                    message="Error while building the sue",
+                    explanation=f"Container {container_name} does not exist",
                 )
-                elapsed = 0
-                while not container.status == "running" and elapsed < timeout:
-                    time.sleep(1)
-                    elapsed += 1
-                    container = container.reload()
-                logger.debug(f"Container {container_name} is running.")
-                all_ready.append(True)
-            except NotFound as e:
-                raise OrchestrationException(message="Error while building the sue", explanation=e)
-        # TODO: container "running" state does not mean the service is responsive yet
-        # TODO: throw exception if container object is not accessible
-        return all(all_ready)
+            if self._container_ready(container):
+                mark_running(container_name)
+
+        if pending:
+            remaining = max(0.0, deadline - time.monotonic())
+            events = self.docker_client.events(
+                since=since,
+                until=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=remaining),
+                filters={"type": "container"},
+                decode=True,
+            )
+            try:
+                # the timeout ends the wait at the deadline even if no events arrive
+                with gevent.Timeout(remaining, False):
+                    for event in events:
+                        container_name = event.get("Actor", {}).get("Attributes", {}).get("name")
+                        if container_name not in pending:
+                            continue
+                        action = event.get("Action", "")
+                        # replayed events of a replaced container with the same name do not count
+                        if action in FAILED_CONTAINER_ACTIONS and event.get("id") == containers[container_name].id:
+                            raise OrchestrationException(
+                                message="Error while building the sue",
+                                explanation=f"Container {container_name} failed with event {action}",
+                            )
+                        if action == "start" or action.startswith("health_status"):
+                            try:
+                                container = self.docker_client.containers.get(container_id=container_name)
+                            except NotFound as e:
+                                raise OrchestrationException(message="Error while building the sue", explanation=e)
+                            containers[container_name] = container
+                            if self._container_ready(container):
+                                mark_running(container_name)
+                        if not pending or time.monotonic() >= deadline:
+                            break
+            finally:
+                events.close()
+
+        gevent.joinall(list(probe_greenlets.values()), timeout=max(0.0, deadline - time.monotonic()))
+        for service_name in probe_greenlets:
+            if service_name not in self.readiness_latencies:
+                logger.warning(f"Probe for service {service_name} did not succeed within {timeout}s")
+
+        for service_name, latency in sorted(self.readiness_latencies.items(), key=lambda item: item[1]):
+            logger.info(f"Service {service_name} ready after {latency:.2f}s")
+        not_ready = set(expected_services) - set(self.readiness_latencies)
+        if not_ready:
+            logger.warning(f"Services {', '.join(sorted(not_ready))} not ready within {timeout}s")
+        return not not_ready
 
     def teardown(self):
         """Stop the containers specified in compose file"""
         if "OXN_WAIT" in os.environ:
             time.sleep(int(os.environ["OXN_WAIT"]))
         self.compose_client.compose.down(remove_orphans=True, quiet=True)
+        self.containers = {}
         self.docker_client.close()
 
     def execute_console_command(self, service: str, command: str) -> Tuple[int, str]:
@@ -240,7 +478,13 @@ class DockerComposeOrchestrator(Orchestrator):
     
     def get_grafana_address(self) -> str:
         raise NotImplementedError
+
+    def get_jaeger_address(self) -> str:
+        raise NotImplementedError
     
     def get_orchestrator_type(self) -> str:
         return "docker-compose"
 
+    def relevant_namespaces(self) -> List[str]:
+        return []
+
@@ -6,6 +6,8 @@ Connection: Central component that coordinates between treatments, load generati
  """
 
 import logging
+import time
+
 import yaml
 from jsonschema import validate
 
@@ -15,7 +17,10 @@ from .kubernetes_orchestrator import KubernetesOrchestrator
 from .report import Reporter
 from .store import configure_output_path, write_dataframe, write_json_data
 from .loadgen import LoadGenerator
+from .pipeline import PostProcessingPipeline, RunResult
 from .locust_file_loadgenerator import LocustFileLoadgenerator
+from .matrix import PlannedRun, expand_matrix, plan_runs, shares_sue
+from .timing import PhaseTimer, RESPONSES, TREATMENTS, write_chrome_trace
 from .utils import utc_timestamp
 from .validation import load_schema
 from .context import Context
@@ -31,7 +36,15 @@ class Engine:
     This class encapsulates all behavior needed to execute observability experiments.
     """
 
-    def __init__(self, configuration_path=None, report_path=None, out_path=None, out_formats=None, treatment_file=None):
+    def __init__(
+        self,
+        configuration_path=None,
+        report_path=None,
+        out_path=None,
+        out_formats=None,
+        treatment_file=None,
+        trace_path=None,
+    ):
         assert configuration_path is not None, "Configuration path must be specified"
         self.config = configuration_path
         """The path to the configuration file for this engine"""
@@ -60,6 +73,16 @@ class Engine:
         """Status of the load generator"""
         self.sue_running = False
         """Status of the sue"""
+        self.pipeline = None
+        """A reference to the post-processing pipeline for finished runs"""
+        self.applied_treatments = {}
+        """Compile time treatments currently applied to the running sue, by name"""
+        self.timer = PhaseTimer(label="experiment")
+        """Timer for the phases of the experiment that do not belong to a single run"""
+        self.run_timers = []
+        """Timers of all runs of the experiment, sharing the origin of the experiment timer"""
+        self.trace_path = trace_path
+        """The path to write the timing trace of the experiment to"""
         # configure the output path for HDF storage
         if self.out_path:
             configure_output_path(self.out_path)
@@ -77,139 +100,287 @@ class Engine:
                 )
 
     def validate_syntax(self):
-        """Validate the specification syntactically"""
+        """
+        Validate the specification syntactically
+
+        A matrix is expanded first and every combination is validated, since ${name} placeholders only take
+        the type of their matrix values after the expansion.
+        """
         try:
             schema = load_schema()
-            validate(instance=self.spec, schema=schema)
+            matrix = self.spec["experiment"].get("matrix")
+            for planned in expand_matrix(self.spec):
+                instance = planned.spec
+                if matrix:
+                    instance = {**instance, "experiment": {**instance["experiment"], "matrix": matrix}}
+                validate(instance=instance, schema=schema)
+        except OxnException:
+            raise
         except Exception as e:
             raise OxnException(
                 message="Can't validate experiment spec", 
                 explanation=str(e)
             )
 
+    def _build_orchestrator(self, spec=None):
+        """Build the orchestrator named in the experiment specification"""
+        spec = spec if spec else self.spec
+        assert spec
+        assert spec["experiment"]
+        assert spec["experiment"]["orchestrator"]
+        if spec["experiment"]["orchestrator"] == "docker-compose":
+            return DockerComposeOrchestrator(
+                experiment_config=spec,
+            )
+        elif spec["experiment"]["orchestrator"] == "kubernetes":
+            return KubernetesOrchestrator(
+                experiment_config=spec,
+            )
+        raise OxnException(
+            message="Unknown orchestrator",
+            explanation=f"Orchestrator {spec['experiment']['orchestrator']} is not supported",
+        )
+
+    def _plan(self, runs) -> list[PlannedRun]:
+        """Expand the matrix of the experiment specification into the ordered plan of runs"""
+        treatment_keys = dict(ExperimentRunner.treatment_keys)
+        for treatment in self.additional_treatments:
+            treatment_keys |= {treatment.action: treatment}
+        return plan_runs(spec=self.spec, runs=runs, treatment_keys=treatment_keys)
+
+    def _start_sue(self, orchestration_timeout):
+        """Apply compile time treatments and build the sue"""
+        timer = self.runner.timer
+        self.runner.execute_compile_time_treatments()
+        self.applied_treatments = {
+            treatment.name: treatment for treatment in self.runner.treatments.values() if not treatment.is_runtime()
+        }
+        with timer.phase("orchestrate"):
+            self.orchestrator.orchestrate()
+        with timer.phase("ready"):
+            ready = self.orchestrator.ready(expected_services=None, timeout=orchestration_timeout)
+        if not ready:
+            self.runner.clean_compile_time_treatments()
+            self.orchestrator.teardown()
+            raise OrchestrationException(
+                message="Error while building the sue",
+                explanation=f"Could not build the sue within {orchestration_timeout}",
+            )
+        self.sue_running = True
+        logger.info("Started sue")
+
+    def _settle_sue(self, settle_time, orchestration_timeout):
+        """Wait for a reused sue to settle and confirm it is still ready"""
+        timer = self.runner.timer
+        logger.info(f"Reusing running sue. Letting it settle for {settle_time} seconds")
+        with timer.phase("settle"):
+            time.sleep(settle_time)
+        with timer.phase("ready"):
+            ready = self.orchestrator.ready(expected_services=None, timeout=orchestration_timeout)
+        if not ready:
+            raise OrchestrationException(
+                message="Error while reusing the sue",
+                explanation=f"Reused sue did not become ready within {orchestration_timeout}",
+            )
+        logger.info("Reused sue is ready")
+
+    def _stop_sue(self):
+        """Tear down the sue"""
+        with self.runner.timer.phase("teardown"):
+            self.orchestrator.teardown()
+        logger.info("Stopped sue")
+        self.sue_running = False
+        self.applied_treatments = {}
+
+    def _process_run(self, result: RunResult):
+        """Store the response data of a finished run and add the run to the report"""
+        runner = result.runner
+        timer = runner.timer
+        responses = runner.observer.variables()
+        for _, response in responses.items():
+            # default is hdf
+            if self.out_formats and 'hdf' in self.out_formats:
+                with timer.phase("store", category=RESPONSES, target=response.name):
+                    write_dataframe(
+                        dataframe=response.data,
+                        experiment_key=runner.config_filename,
+                        run_key=runner.short_id,
+                        response_key=response.name,
+                    )
+            if self.out_formats and 'json' in self.out_formats:
+                with timer.phase("store", category=RESPONSES, target=response.name):
+                    write_json_data(
+                        data=response.data,
+                        experiment_key=runner.config_filename,
+                        run_key=runner.short_id,
+                        response_key=response.name,
+                        out_path=self.out_path,
+                    )
+
+            logger.debug(
+                f"Experiment {runner.config_filename}: DataFrame: {len(response.data)} rows"
+            )
+            logger.info(f"Wrote {response.name} to store")
+        if self.report_path and responses:
+            with timer.phase("statistics"):
+                self.reporter.gather_interactions(
+                    experiment=runner,
+                    treatments=runner.treatments,
+                    responses=responses,
+                )
+            logger.debug(f"Gathered interaction data for {len(runner.treatments)} treatments and {len(responses)} responses")
+            self.reporter.assemble_interaction_data(
+                run_key=runner.short_id
+            )
+            logger.debug("Assembled all interaction data")
+            self.reporter.add_loadgen_data(
+                runner=runner, request_stats=result.request_stats, telemetry=result.telemetry
+            )
+            logger.debug("Added load generation data")
+            if result.accounting:
+                self.reporter.add_accountant_data(runner=runner)
+                logger.debug("Added accounting data")
+            self.reporter.add_parameter_data(runner=runner)
+            self.reporter.add_timing_data(timer=timer, runner=runner)
+            logger.debug("Added timing data")
+            self.reporter.write_run(run_key=runner.short_id)
+            logger.debug("Wrote run to report")
+
     def run(
         self,
         runs=None,
         orchestration_timeout=None,
         randomize=False,
         accounting=False,
+        reuse_sue=False,
+        settle_time=0,
+        pipeline_depth=0,
     ):
-        """Run an experiment n times"""
+        """
+        Run an experiment n times
+
+        If the specification has a matrix section, every combination of its parameter values is run n times.
+        Runs are ordered so that runs with the same compile time treatments follow each other.
+
+        If reuse_sue is set, the sue is kept running between runs and only has to settle for settle_time
+        seconds and pass the readiness check before the next run starts. Compile time treatments stay applied
+        as long as the following runs share them. The sue is only rebuilt when the next run needs different
+        compile time treatments.
+
+        If pipeline_depth is positive, storage and reporting of a finished run happen in the background
+        while the next run executes. At most pipeline_depth finished runs wait for post-processing.
+
+        The durations of all phases of a run are recorded by a timer per run and added to the report.
+        Phases of a run that happen after its report entry was assembled, like the teardown of the sue,
+        only show up in the timing trace.
+        """
         assert runs is not None, "Number of runs must be specified"
-        logger.info(f"Running experiment {self.config} for {runs} times")
-        for idx in range(runs):
-            logger.info(f"Experiment run {idx + 1} of {runs}")
-            assert self.spec
-            assert self.spec["experiment"]
-            assert self.spec["experiment"]["orchestrator"]
-            if self.spec["experiment"]["orchestrator"] == "docker-compose":
-                self.orchestrator = DockerComposeOrchestrator(
-                    experiment_config=self.spec,
-                )
-            elif self.spec["experiment"]["orchestrator"] == "kubernetes": 
-                self.orchestrator = KubernetesOrchestrator(
-                    experiment_config=self.spec,
-                )
-            else:
-                raise OxnException(
-                    message="Unknown orchestrator",
-                    explanation=f"Orchestrator {self.spec['experiment']['orchestrator']} is not supported",
-                )
-            self.generator = LocustFileLoadgenerator(orchestrator=self.orchestrator, config=self.spec)
+        if pipeline_depth > 0:
+            self.pipeline = PostProcessingPipeline(handler=self._process_run, depth=pipeline_depth)
+        with self.timer.phase("plan"):
+            plan = self._plan(runs=runs)
+        logger.info(f"Running experiment {self.config} with {len(plan)} runs")
+        for idx, planned in enumerate(plan):
+            following = plan[idx + 1] if idx + 1 < len(plan) else None
+            keep_sue = reuse_sue and shares_sue(planned, following)
+            logger.info(f"Experiment run {idx + 1} of {len(plan)} {planned.cell}")
+            timer = PhaseTimer(label=f"run {idx + 1}", origin=self.timer.origin)
+            self.run_timers.append(timer)
+            if not (reuse_sue and self.sue_running):
+                with timer.phase("build_orchestrator"):
+                    self.orchestrator = self._build_orchestrator(spec=planned.spec)
+            self.generator = LocustFileLoadgenerator(orchestrator=self.orchestrator, config=planned.spec)
             names = []
-            """ (
-                self.orchestrator.translate_compose_names(
-                    self.orchestrator.sue_service_names
-                )
-                if accounting
-                else []
-            ) """
+            if accounting and self.orchestrator.get_orchestrator_type() == "docker-compose":
+                names = self.orchestrator.translate_compose_names(self.orchestrator.sue_service_names)
             self.runner = ExperimentRunner(
-                config=self.spec,
+                config=planned.spec,
                 config_filename=self.config,
                 additional_treatments=self.additional_treatments,
                 random_treatment_order=randomize,
                 accountant_names=names,
                 orchestrator=self.orchestrator,
+                timer=timer,
+                parameters=planned.parameters,
+                telemetry=self.generator.telemetry,
+                accounting=accounting,
             )
-            self.runner.execute_compile_time_treatments()
-            self.orchestrator.orchestrate()
-            if not self.orchestrator.ready(expected_services=None, timeout=orchestration_timeout):
-                self.runner.clean_compile_time_treatments()
-                self.orchestrator.teardown()
-                raise OrchestrationException(
-                    message="Error while building the sue",
-                    explanation=f"Could not build the sue within {orchestration_timeout}",
-                )
-            self.sue_running = True
-            logger.info("Started sue")
+            self.runner.on_treatments_start = self.generator.anchor
+            timer.label = f"run {idx + 1} ({self.runner.short_id})"
+            if self.sue_running:
+                self._settle_sue(settle_time=settle_time, orchestration_timeout=orchestration_timeout)
+                self.runner.adopt_compile_time_treatments(applied=self.applied_treatments)
+            else:
+                self._start_sue(orchestration_timeout=orchestration_timeout)
             for treatment in self.runner.treatments.values():
-                if not treatment.preconditions():
+                with timer.phase("preconditions", category=TREATMENTS, target=treatment.name):
+                    satisfied = treatment.preconditions()
+                if not satisfied:
                     raise OxnException(
                         message=f"Error while checking preconditions for treatment {treatment.name} which is class {treatment.__class__}",
                         explanation="\n".join(treatment.messages),
                     )
-            self.generator.start()
+            with timer.phase("loadgen_start"):
+                self.generator.start()
             logger.info("Started load generation")
             self.loadgen_running = True
             experiment_start = utc_timestamp()
             self.runner.experiment_start = experiment_start
             self.runner.observer.experiment_start = experiment_start
             self.runner.execute_runtime_treatments()
-            self.runner.clean_compile_time_treatments()
+            self.runner.clean_compile_time_treatments(keep=keep_sue, applied=self.applied_treatments)
             self.runner.experiment_end = utc_timestamp()
             self.runner.observer.experiment_end = self.runner.experiment_end
             self.runner.observe_response_variables()
-            self.generator.stop()
+            with timer.phase("loadgen_stop"):
+                self.generator.stop()
             self.loadgen_running = False
             logger.info("Stopped load generation")
-            for _, response in self.runner.observer.variables().items():
-                # default is hdf
-                if self.out_formats and 'hdf' in self.out_formats:
-                    write_dataframe(
-                        dataframe=response.data,
-                        experiment_key=self.runner.config_filename,
-                        run_key=self.runner.short_id,
-                        response_key=response.name,
-                    )
-                if self.out_formats and 'json' in self.out_formats:
-                    write_json_data(
-                        data=response.data,
-                        experiment_key=self.runner.config_filename,
-                        run_key=self.runner.short_id,
-                        response_key=response.name,
-                        out_path=self.out_path,
-                    )
+            result = RunResult(
+                runner=self.runner,
+                request_stats=self.generator.env.stats,
+                accounting=accounting,
+                telemetry=self.generator.telemetry,
+            )
+            if self.pipeline:
+                with timer.phase("pipeline_submit"):
+                    self.pipeline.submit(result)
+            else:
+                self._process_run(result)
+            if not keep_sue:
+                if reuse_sue and following is not None:
+                    logger.info("The next run requires different compile time treatments, restarting the sue")
+                self._stop_sue()
+            logger.info(f"Experiment run {idx + 1} of {len(plan)} completed")
+        if self.pipeline:
+            with self.timer.phase("pipeline_join"):
+                self.pipeline.join()
+            self.pipeline.close()
+            self.pipeline = None
+        if self.report_path:
+            self.reporter.add_timing_data(timer=self.timer)
+            with self.timer.phase("report"):
+                self.reporter.dump_report_data()
+            logger.debug("Wrote report data to file")
 
-                logger.debug(
-                    f"Experiment {self.runner.config_filename}: DataFrame: {len(response.data)} rows"
-                )
-                logger.info(f"Wrote {response.name} to store")
-                if self.report_path:
-                    for _, treatment in self.runner.treatments.items():
-                        self.reporter.gather_interaction(
-                            experiment=self.runner,
-                            treatment=treatment,
-                            response=response,
-                        )
-                        logger.debug(
-                            f"Gathered interaction data for {treatment} and {response}"
-                        )
-                    self.reporter.assemble_interaction_data(
-                        run_key=self.runner.short_id
-                    )
-                    logger.debug("Assembled all interaction data")
-                    self.reporter.add_loadgen_data(
-                        runner=self.runner, request_stats=self.generator.env.stats
-                    )
-                    logger.debug("Added load generation data")
-                    if accounting:
-                        self.reporter.add_accountant_data(runner=self.runner)
-                        logger.debug("Added accounting data")
+    def shutdown(self):
+        """Stop the post-processing, the load generation and the sue after an interrupted experiment"""
+        if self.pipeline:
+            self.pipeline.close()
+        if self.runner:
+            self.runner.stop_sampling()
+        if self.loadgen_running:
+            self.generator.kill()
+            self.loadgen_running = False
+            logger.info("Shut down load generation")
+        if self.sue_running:
+            # TODO: call cleanup methods here
             self.orchestrator.teardown()
-            logger.info("Stopped sue")
             self.sue_running = False
-            logger.info(f"Experiment run {idx + 1} of {runs} completed")
-        if self.report_path:
-            self.reporter.dump_report_data()
-            logger.debug("Wrote report data to file")
+            logger.info("Shut down sue")
+
+    def write_trace(self):
+        """Write the recorded phases of all runs as a Chrome trace file, if a trace path is set"""
+        if not self.trace_path:
+            return
+        write_chrome_trace(path=self.trace_path, timers=[self.timer, *self.run_timers])
@@ -0,0 +1,123 @@
+"""
+Purpose: Records latencies with bounded relative error in mergeable histograms.
+Functionality: Implements the log-linear bucketing of HDR histograms, stores only non-empty buckets and
+serializes them compactly, so that histograms of endpoints, windows, workers and runs can be summed.
+Connection: Used by the request telemetry of the load generators, the reporter and the evaluation of reports.
+
+High dynamic range latency histograms"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p99.9": 0.999}
+"""Percentiles reported for every latency histogram"""
+
+
+class LatencyHistogram:
+    """
+    HDR histogram of latencies in microseconds
+
+    Values below 2 * 10 ** significant_digits are recorded exactly. Above, every power of two is split into
+    the same number of linear buckets, so every recorded value is off by less than 10 ** -significant_digits
+    relative to its bucket. Histograms with the same significant digits merge by adding their bucket counts.
+    """
+
+    def __init__(self, significant_digits: int = 2, counts: Optional[Dict[int, int]] = None):
+        assert 1 <= significant_digits <= 5, "Significant digits must be between 1 and 5"
+        self.significant_digits = significant_digits
+        """Decimal digits of precision of the recorded values"""
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        """Number of bits of a value that are kept exactly"""
+        self.sub_bucket_half_count = 1 << (self.sub_bucket_bits - 1)
+        """Number of linear buckets per power of two"""
+        self.counts: Dict[int, int] = dict(counts) if counts else {}
+        """Number of recorded values by bucket index"""
+
+    def __repr__(self):
+        return f"LatencyHistogram(count={self.count}, significant_digits={self.significant_digits})"
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, LatencyHistogram)
+            and self.significant_digits == other.significant_digits
+            and self.counts == other.counts
+        )
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return shift * self.sub_bucket_half_count + (value >> shift)
+
+    def _highest_equivalent_value(self, index: int) -> int:
+        """Return the largest value that is recorded into a bucket"""
+        shift = index // self.sub_bucket_half_count - 1
+        if shift <= 0:
+            return index
+        sub_bucket = index - shift * self.sub_bucket_half_count
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, microseconds: float, count: int = 1) -> None:
+        index = self._index(max(int(microseconds), 0))
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def record_milliseconds(self, milliseconds: float) -> None:
+        """Record a latency in milliseconds like locust reports response times"""
+        self.record(milliseconds * 1000)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add the counts of another histogram to this histogram and return this histogram"""
+        if other.significant_digits != self.significant_digits:
+            raise ValueError(
+                f"Cannot merge histograms with {other.significant_digits} and {self.significant_digits} significant digits"
+            )
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable["LatencyHistogram"], significant_digits: int = 2) -> "LatencyHistogram":
+        """Return a new histogram with the counts of all histograms"""
+        result = cls(significant_digits=significant_digits)
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    def value_at_quantile(self, quantile: float) -> float:
+        """
+        Return the latency in microseconds below which a quantile of the recorded values falls
+
+        Like HdrHistogram, we report the highest value that is equivalent to the bucket of the percentile.
+        """
+        total = self.count
+        if not total:
+            return float("nan")
+        rank = max(math.ceil(quantile * total), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return float(self._highest_equivalent_value(index))
+        return float(self._highest_equivalent_value(max(self.counts)))
+
+    def summary(self) -> Dict[str, float]:
+        """Return the count and the reported percentiles in milliseconds"""
+        summary: Dict[str, float] = {"count": self.count}
+        for name, quantile in QUANTILES.items():
+            summary[name] = self.value_at_quantile(quantile) / 1000
+        return summary
+
+    def to_dict(self) -> dict:
+        """Serialize the non-empty buckets as sorted pairs of bucket index and count"""
+        counts: List[List[int]] = [[index, self.counts[index]] for index in sorted(self.counts)]
+        return {"significant_digits": self.significant_digits, "unit": "us", "counts": counts}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        return cls(
+            significant_digits=data["significant_digits"],
+            counts={index: count for index, count in data["counts"]},
+        )
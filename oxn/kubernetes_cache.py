@@ -0,0 +1,271 @@
+"""
+Purpose: Keeps a local, watch-based cache of kubernetes resources.
+Functionality: Lists pods, deployments, services and configmaps once per namespace and keeps them up to date via
+watch streams. Lookups by name and by label are served from memory and callers can block on watch events until a
+condition on the cached resources holds.
+Connection: Used by the KubernetesOrchestrator to avoid a list call for every lookup and to wait for rollouts
+without sleep-polling.
+
+Informer-style cache of kubernetes resources"""
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import gevent
+from gevent.event import Event
+from kubernetes import client, watch
+from kubernetes.client.exceptions import ApiException
+
+logger = logging.getLogger(__name__)
+
+HTTP_STATUS_GONE = 410
+
+
+def parse_label_selector(label_selector: Optional[str]) -> List[str]:
+    """Split an equality-based label selector like "a=b,c=d" into its terms"""
+    if not label_selector:
+        return []
+    return [term.strip() for term in label_selector.split(",") if term.strip()]
+
+
+def _resource_version(obj) -> Optional[int]:
+    """Return the resource version of an object as an int if it is numeric"""
+    try:
+        return int(obj.metadata.resource_version)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class Informer:
+    """
+    Watch-based cache of a single kind of resource in a single namespace
+
+    The informer lists all resources once and then applies the events of a watch stream that starts at the
+    resource version of the list. If the watch expires, the informer lists again. Objects are indexed by name
+    and by each of their labels.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        list_function: Callable,
+        namespace: str,
+        on_change: Callable[[], None],
+        watch_timeout: int = 300,
+    ):
+        self.kind = kind
+        """Kind of the cached resources, e.g. pods"""
+        self.list_function = list_function
+        """Namespaced list function of the kubernetes api for the kind"""
+        self.namespace = namespace
+        """Namespace of the cached resources"""
+        self.on_change = on_change
+        """Called after every change of the cache"""
+        self.watch_timeout = watch_timeout
+        """Seconds after which the api server ends a watch request and the informer starts a new one"""
+        self.objects: Dict[str, Any] = {}
+        """Cached objects by name"""
+        self.label_index: Dict[str, Set[str]] = defaultdict(set)
+        """Names of cached objects by label term key=value"""
+        self.resource_version: Optional[str] = None
+        """Resource version the watch resumes from"""
+        self.greenlet: Optional[gevent.Greenlet] = None
+        self.stopped = False
+
+    def __repr__(self):
+        return f"Informer(kind={self.kind}, namespace={self.namespace})"
+
+    def start(self) -> None:
+        """List all resources and start watching for changes"""
+        self.relist()
+        self.greenlet = gevent.spawn(self._watch)
+
+    def stop(self) -> None:
+        self.stopped = True
+        if self.greenlet is not None:
+            self.greenlet.kill(block=False)
+
+    def relist(self) -> None:
+        """Replace the cached objects with a fresh list from the api server"""
+        response = self.list_function(namespace=self.namespace)
+        self.objects = {}
+        self.label_index = defaultdict(set)
+        for obj in response.items:
+            self._store(obj)
+        self.resource_version = response.metadata.resource_version
+        logger.debug(f"{self} listed {len(self.objects)} objects at resource version {self.resource_version}")
+        self.on_change()
+
+    def _watch(self) -> None:
+        while not self.stopped:
+            stream = watch.Watch()
+            try:
+                for event in stream.stream(
+                    self.list_function,
+                    namespace=self.namespace,
+                    resource_version=self.resource_version,
+                    timeout_seconds=self.watch_timeout,
+                    allow_watch_bookmarks=True,
+                ):
+                    self.apply(event["type"], event["object"])
+            except ApiException as e:
+                if e.status == HTTP_STATUS_GONE:
+                    logger.debug(f"{self} watch expired, listing again")
+                else:
+                    logger.warning(f"{self} watch failed: {e.reason}. Listing again")
+                    gevent.sleep(1)
+                self._relist_safely()
+            except Exception as e:
+                logger.warning(f"{self} watch failed: {e}. Listing again")
+                gevent.sleep(1)
+                self._relist_safely()
+            finally:
+                stream.stop()
+
+    def _relist_safely(self) -> None:
+        try:
+            self.relist()
+        except Exception as e:
+            logger.warning(f"{self} could not list: {e}")
+
+    def apply(self, event_type: str, obj) -> None:
+        """Apply a single watch event to the cache"""
+        if obj.metadata.resource_version:
+            self.resource_version = obj.metadata.resource_version
+        if event_type == "BOOKMARK":
+            return
+        if event_type == "DELETED":
+            self._remove(obj.metadata.name)
+            self.on_change()
+        else:
+            self.update(obj)
+
+    def update(self, obj) -> None:
+        """Store an object unless the cache already holds a newer version of it"""
+        cached = self.objects.get(obj.metadata.name)
+        if cached is not None:
+            cached_version, version = _resource_version(cached), _resource_version(obj)
+            if cached_version is not None and version is not None and version < cached_version:
+                return
+            self._remove(obj.metadata.name)
+        self._store(obj)
+        self.on_change()
+
+    def _store(self, obj) -> None:
+        name = obj.metadata.name
+        self.objects[name] = obj
+        for key, value in (obj.metadata.labels or {}).items():
+            self.label_index[f"{key}={value}"].add(name)
+
+    def _remove(self, name: str) -> None:
+        obj = self.objects.pop(name, None)
+        if obj is None:
+            return
+        for key, value in (obj.metadata.labels or {}).items():
+            names = self.label_index.get(f"{key}={value}")
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.label_index[f"{key}={value}"]
+
+    def get(self, name: str):
+        return self.objects.get(name)
+
+    def list(self, label_selector: Optional[str] = None) -> List[Any]:
+        """Return all cached objects matching an equality-based label selector, ordered by name"""
+        terms = parse_label_selector(label_selector)
+        if not terms:
+            names = set(self.objects)
+        else:
+            names = set.intersection(*(self.label_index.get(term, set()) for term in terms))
+        return [self.objects[name] for name in sorted(names)]
+
+
+class KubernetesCache:
+    """
+    Watch-based cache of pods, deployments, services and configmaps
+
+    Informers are started eagerly for the namespaces passed to the cache and lazily on the first lookup in any
+    other namespace. All informers share a single change notification, so that callers can wait for conditions
+    that span several kinds of resources, e.g. a deployment and its pods.
+    """
+
+    KINDS = ("pods", "deployments", "services", "configmaps")
+
+    def __init__(self, core_api: client.CoreV1Api, apps_api: client.AppsV1Api, namespaces: Iterable[str] = ()):
+        self.list_functions: Dict[str, Callable] = {
+            "pods": core_api.list_namespaced_pod,
+            "deployments": apps_api.list_namespaced_deployment,
+            "services": core_api.list_namespaced_service,
+            "configmaps": core_api.list_namespaced_config_map,
+        }
+        """Namespaced list functions of the kubernetes api by kind"""
+        self.informers: Dict[Tuple[str, str], Informer] = {}
+        """Informers by kind and namespace"""
+        self._changed = Event()
+        for namespace in namespaces:
+            self.watch_namespace(namespace)
+
+    @property
+    def namespaces(self) -> List[str]:
+        return sorted({namespace for _, namespace in self.informers})
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, Event()
+        changed.set()
+
+    def watch_namespace(self, namespace: str) -> None:
+        """Start informers for all kinds in a namespace"""
+        for kind in self.KINDS:
+            self.informer(kind, namespace)
+
+    def informer(self, kind: str, namespace: str) -> Informer:
+        """Return the informer for a kind in a namespace, starting it if needed"""
+        key = (kind, namespace)
+        if key not in self.informers:
+            informer = Informer(
+                kind=kind,
+                list_function=self.list_functions[kind],
+                namespace=namespace,
+                on_change=self._notify,
+            )
+            informer.start()
+            self.informers[key] = informer
+        return self.informers[key]
+
+    def get(self, kind: str, namespace: str, name: str):
+        return self.informer(kind, namespace).get(name)
+
+    def list(self, kind: str, namespace: str, label_selector: Optional[str] = None) -> List[Any]:
+        return self.informer(kind, namespace).list(label_selector)
+
+    def list_all(self, kind: str) -> List[Any]:
+        """Return all cached objects of a kind across all watched namespaces"""
+        return [
+            obj
+            for (informer_kind, _), informer in sorted(self.informers.items())
+            if informer_kind == kind
+            for obj in informer.list()
+        ]
+
+    def update(self, kind: str, obj) -> None:
+        """Write an object returned by the api server through to the cache"""
+        self.informer(kind, obj.metadata.namespace).update(obj)
+
+    def wait_for(self, condition: Callable[[], bool], timeout: float) -> bool:
+        """Block until the condition holds on the cached resources or the timeout has passed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = self._changed
+            if condition():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            changed.wait(timeout=remaining)
+
+    def stop(self) -> None:
+        for informer in self.informers.values():
+            informer.stop()
+        self.informers = {}
@@ -2,13 +2,18 @@
 """
 
 from cProfile import label
+import copy
 from math import exp
+import datetime
 import re
 import yaml
 import time
 
 import logging
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
+
+import gevent
+from gevent.pool import Pool
 from click import File
 from kubernetes import client, config
 from kubernetes.stream import stream
@@ -17,8 +22,75 @@ from kubernetes.client.models.v1_deployment import V1Deployment
 from kubernetes.client.models.v1_pod import V1Pod
 
 from oxn.models.orchestrator import Orchestrator  # Import the abstract base class
+from oxn.kubernetes_cache import KubernetesCache
 
 from .errors import OxnException, OrchestratorException, OrchestratorResourceNotFoundException
+from .utils import utc_timestamp
+
+DEFAULT_SUE_NAMESPACE = "system-under-evaluation"
+"""Namespace the sue runs in if the experiment specification does not name one"""
+
+RESTARTED_AT_ANNOTATION = "kubectl.kubernetes.io/restartedAt"
+"""Pod template annotation that triggers a rolling restart when changed"""
+
+
+class DeploymentPatch:
+    """Changes to a single deployment that are applied in one patch and one rollout"""
+
+    def __init__(
+        self,
+        deployment: V1Deployment,
+        env: Optional[Dict[str, Optional[str]]] = None,
+        resources: Optional[dict] = None,
+        annotations: Optional[Dict[str, str]] = None,
+        template_annotations: Optional[Dict[str, str]] = None,
+        container: Optional[str] = None,
+    ):
+        self.deployment = deployment
+        """The deployment to patch"""
+        self.env = env or {}
+        """Environment variables to set, a value of None removes the variable"""
+        self.resources = resources or {}
+        """Resource requirements of the container, e.g. {"limits": {"cpu": "500m"}}"""
+        self.annotations = annotations or {}
+        """Annotations of the deployment"""
+        self.template_annotations = template_annotations or {}
+        """Annotations of the pod template. Changing them triggers a rollout"""
+        self.container = container
+        """Name of the container to change env and resources for, defaults to the first container"""
+
+    def __repr__(self):
+        changes = [
+            f"{key}={value}"
+            for key, value in [
+                ("env", self.env),
+                ("resources", self.resources),
+                ("annotations", self.annotations),
+                ("template_annotations", self.template_annotations),
+            ]
+            if value
+        ]
+        return f"DeploymentPatch(deployment={self.deployment.metadata.name}, {', '.join(changes)})"
+
+
+class PodCommandResult:
+    """Result of a console command executed in a single pod"""
+
+    def __init__(self, pod: str, exit_code: int, output: str, latency: float):
+        self.pod = pod
+        """The name of the pod"""
+        self.exit_code = exit_code
+        """The exit code of the command, -1 if the command was not found or timed out"""
+        self.output = output
+        """The output of the command"""
+        self.latency = latency
+        """Seconds between opening the exec stream and receiving the exit code"""
+        self.finished = utc_timestamp()
+        """UTC timestamp when the command finished in the pod"""
+
+    def __repr__(self):
+        return f"PodCommandResult(pod={self.pod}, exit_code={self.exit_code}, latency={self.latency:.3f}s)"
+
 
 class KubernetesOrchestrator(Orchestrator):
     def __init__(self, experiment_config=None):
@@ -30,36 +102,58 @@ class KubernetesOrchestrator(Orchestrator):
         config.load_kube_config()
         self.kube_client = client.CoreV1Api()
         self.api_client = client.AppsV1Api()
-
-        logging.info("Loading all running resources in k8s cluster")
-        
-        self.list_of_all_pods = self.kube_client.list_pod_for_all_namespaces(watch=False)
-        #for i in self.list_of_all_pods.items:
-            #print("%s\t%s\t%s" % (i.status.pod_ip, i.metadata.namespace, i.metadata.name))
-        pass
-
-        self.list_of_all_services = self.kube_client.list_service_for_all_namespaces(watch=False)
-        #for i in self.list_of_all_services.items:
-            #print("%s\t%s" % (i.metadata.namespace, i.metadata.name))
+        self.exec_parallelism = 16
+        """Maximum number of concurrent exec streams when executing a command on several pods"""
+        self.exec_timeout = 30
+        """Seconds after which a command executed in a single pod is considered failed"""
 
         """Check if all of experiment_config.sue.required services are running"""
         self.required_services = self.experiment_config["experiment"]["sue"]["required"]
         #self._check_required_services(self.required_services)
-            
+        self.sue_namespace = self.experiment_config["experiment"]["sue"].get("namespace", DEFAULT_SUE_NAMESPACE)
+        """Namespace the sue of this experiment runs in. Experiments in different namespaces can run concurrently"""
+
+        logging.info("Watching resources in the namespaces of the experiment")
+        self.cache = KubernetesCache(
+            core_api=self.kube_client,
+            apps_api=self.api_client,
+            namespaces=self.relevant_namespaces(),
+        )
+        """Watch-based cache of pods, deployments, services and configmaps that serves all lookups"""
+
+    def relevant_namespaces(self) -> List[str]:
+        """Collect the namespaces of the required services, the observability services and the sue"""
+        namespaces = {self.sue_namespace}
+        for service in self.required_services or []:
+            namespaces.add(service["namespace"])
+        services = self.experiment_config["experiment"].get("services") or {}
+        for service_configs in services.values():
+            if isinstance(service_configs, dict):
+                service_configs = [service_configs]
+            for service_config in service_configs:
+                if service_config.get("namespace"):
+                    namespaces.add(service_config["namespace"])
+        return sorted(namespaces)
+
+    @property
+    def list_of_all_pods(self) -> client.V1PodList:
+        """All pods in the watched namespaces"""
+        return client.V1PodList(items=self.cache.list_all("pods"))
+
+    @property
+    def list_of_all_services(self) -> client.V1ServiceList:
+        """All services in the watched namespaces"""
+        return client.V1ServiceList(items=self.cache.list_all("services"))
     
     def _check_required_services(self, required_services) -> bool:
         """Check if all of experiment_config.sue.required services are running"""
         for service in required_services:
             service_name = service["name"]
             namespace = service["namespace"]
-            try:
-                service = self.kube_client.read_namespaced_service(service_name, namespace)
-                #logging.info(f"Service {service_name} in namespace {namespace} is running")
-            except ApiException as e:
-                #logging.error(f"Service {service_name} in namespace {namespace} is not running")
+            if self.cache.get("services", namespace, service_name) is None:
                 raise OxnException(
                     message=f"Service {service_name} in namespace {namespace} is not running but set as a required service",
-                    explanation=str(e),
+                    explanation=f"Service {service_name} not found in namespace {namespace}",
                 )
         return True
             
@@ -74,8 +168,8 @@ class KubernetesOrchestrator(Orchestrator):
         return self._check_required_services(expected_services)
 
     def teardown(self):
-        logging.info("teardown noop implementation")
-        pass
+        logging.info("teardown noop implementation, stopping resource watches")
+        self.cache.stop()
 
     def translate_compose_names(self, compose_names: List[str]):
         logging.info("translate_compose_names noop implementation")
@@ -101,40 +195,79 @@ class KubernetesOrchestrator(Orchestrator):
             command: The command to execute
 
         Returns:
-            A tuple of the return code and the output of the command
+            A tuple of the return code and the output of the command. The return code is the first non-zero
+            return code of any pod, the output is the output of the pods joined by newlines
 
         Throws:
             OrchestratorResourceNotFoundException: If no pods are found for the given label
             OrchestratorException: If an error occurs while executing the command
         
         """
-        #logging.info("execute_console_command noop implementation for service %s with command %s", service, command)
+        results = self.fan_out_console_command(
+            label_selector=label_selector, label=label, namespace=namespace, command=command
+        )
+        failed = [result for result in results if result.exit_code != 0]
+        if failed:
+            return failed[0].exit_code, "\n".join(f"{result.pod}: {result.output}" for result in failed)
+        return 0, "Success"
+
+    def fan_out_console_command(
+        self,
+        label_selector: str,
+        label: str,
+        namespace: str,
+        command: List[str],
+        max_parallel: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[PodCommandResult]:
+        """
+        Execute a console command concurrently on all pods with a given label
+
+        Commands are executed through a bounded pool of greenlets, so that a fault reaches all pods at nearly the
+        same time instead of one after another.
 
-        # Get all pods with label app.kubernetes.io/name=service
-        pods = self.kube_client.list_namespaced_pod(namespace=namespace, label_selector=f"{label_selector}={label}")
-        #pods = self.kube_client.list_pod_for_all_namespaces(label_selector=f"app.kubernetes.io/name={label}")
+        Args:
+            label_selector: The label selector for the pods
+            label: The value of the label
+            namespace: The namespace of the pods
+            command: The command to execute
+            max_parallel: The maximum number of concurrent exec streams. Defaults to exec_parallelism
+            timeout: Seconds after which the command on a single pod is considered failed. Defaults to exec_timeout
 
-        if not pods.items:
+        Returns:
+            One result per pod, ordered by pod name
+
+        Throws:
+            OrchestratorResourceNotFoundException: If no pods are found for the given label
+            OrchestratorException: If an error occurs while executing the command
+        """
+        pods = self.cache.list("pods", namespace, f"{label_selector}={label}")
+
+        if not pods:
             raise OrchestratorResourceNotFoundException(
                 message=f"No pods found with the given label selector {label_selector}={label}",
                 explanation="No pods found with the given label selector {label_selector}={label}",
             )
-        
-        # Execute the command on each pod
-        for pod in pods.items:
-            try:
-                exec_command = command
-                assert pod.metadata.labels[label_selector]
-                
-                container = None
-                if pod.spec.containers and pod.spec.containers.__len__() > 1:
-                    logging.warning(f"Pod {pod.metadata.name} in namespace {label} has more than one container. Using the first container to execute the command. (Container: {pod.spec.containers[0].name})")
-                    container = pod.spec.containers[0]
-                else:
-                    container = pod.spec.containers[0]
-
-                wrapped_command = ['sh', '-c', f"{' '.join(exec_command)}; echo $?"]
-    
+
+        timeout = timeout or self.exec_timeout
+        pool = Pool(size=max_parallel or self.exec_parallelism)
+        greenlets = [pool.spawn(self._execute_console_command_on_pod, pod, command, timeout) for pod in pods]
+        gevent.joinall(greenlets, raise_error=True)
+        results = [greenlet.value for greenlet in greenlets]
+        for result in results:
+            logging.debug(f"Executed {' '.join(command)} on {result}")
+        return results
+
+    def _execute_console_command_on_pod(self, pod: V1Pod, command: List[str], timeout: float) -> PodCommandResult:
+        """Execute a console command in the first container of a pod and parse its exit status"""
+        started = time.monotonic()
+        container = pod.spec.containers[0]
+        if len(pod.spec.containers) > 1:
+            logging.warning(f"Pod {pod.metadata.name} in namespace {pod.metadata.namespace} has more than one container. Using the first container to execute the command. (Container: {container.name})")
+
+        wrapped_command = ['sh', '-c', f"{' '.join(command)}; echo $?"]
+        try:
+            with gevent.Timeout(timeout):
                 response = stream(self.kube_client.connect_get_namespaced_pod_exec,
                                 name=pod.metadata.name,
                                 namespace=pod.metadata.namespace,
@@ -144,32 +277,37 @@ class KubernetesOrchestrator(Orchestrator):
                                 stdin=False,
                                 stdout=True,
                                 tty=False)
-                
-                if response == "0":
-                    return 0, "Success"
-                
-                # if response includes "not found" or "no such file or directory" then the command was not found
-                if "not found" in response or "no such file or directory" in response:
-                    return -1, f"Command not found: {' '.join(exec_command)}"
-                    
-                # Split the response to separate the command output and exit status
-                response_lines = response.split('\n')
-                exit_status_line = response_lines[-2].strip()
-                print(exit_status_line)
-                exit_status = int(exit_status_line)
-                command_output = '\n'.join(response_lines[:-2])
-                
-                return exit_status, command_output
-                
-                logging.info(response)
-            except ApiException as e:
-                raise OrchestratorException(
-                    message=f"Error while executing command {command} on pod {pod.metadata.name} in namespace {label}: {e.body}",
-                    explanation=str(e),
-                )
-            
+        except gevent.Timeout:
+            return PodCommandResult(
+                pod=pod.metadata.name,
+                exit_code=-1,
+                output=f"Command timed out after {timeout}s",
+                latency=time.monotonic() - started,
+            )
+        except ApiException as e:
+            raise OrchestratorException(
+                message=f"Error while executing command {command} on pod {pod.metadata.name} in namespace {pod.metadata.namespace}: {e.body}",
+                explanation=str(e),
+            )
+        latency = time.monotonic() - started
 
-        return 0, "Success"
+        if response.strip() == "0":
+            return PodCommandResult(pod=pod.metadata.name, exit_code=0, output="Success", latency=latency)
+
+        # if response includes "not found" or "no such file or directory" then the command was not found
+        if "not found" in response or "no such file or directory" in response:
+            return PodCommandResult(
+                pod=pod.metadata.name, exit_code=-1, output=f"Command not found: {' '.join(command)}", latency=latency
+            )
+
+        # Split the response to separate the command output and exit status
+        response_lines = response.rstrip('\n').split('\n')
+        try:
+            exit_status = int(response_lines[-1].strip())
+        except ValueError:
+            exit_status = -1
+        command_output = '\n'.join(response_lines[:-1])
+        return PodCommandResult(pod=pod.metadata.name, exit_code=exit_status, output=command_output, latency=latency)
     
     def apply_security_context_to_deployment(self, label_selector:str, label: str, namespace: str, capabilities: dict) -> Tuple[int, str]:
         """
@@ -250,7 +388,7 @@ class KubernetesOrchestrator(Orchestrator):
 
         """
         
-        service = self.kube_client.read_namespaced_service(namespace=namespace, name=name)
+        service = self.cache.get("services", namespace, name)
         if not service:
             raise OrchestratorResourceNotFoundException(
                 message=f"No service found for service {label}",
@@ -262,13 +400,13 @@ class KubernetesOrchestrator(Orchestrator):
             logging.info(f"Service {name} in namespace {namespace} has no cluster IP. Falling back to pod IP by selecting first pod and receiving its IP")
             # fall back to pod IP
             name_label_of_service = service.metadata.labels["app.kubernetes.io/name"]
-            pods = self.kube_client.list_namespaced_pod(namespace=namespace, label_selector=f"app.kubernetes.io/name={name_label_of_service}")
-            if not pods.items:
+            pods = self.cache.list("pods", namespace, f"app.kubernetes.io/name={name_label_of_service}")
+            if not pods:
                 raise OrchestratorResourceNotFoundException(
                     message=f"No pods found for service {label}",
                     explanation="No pods found for the given service",
                 )
-            cluster_ip = pods.items[0].status.pod_ip
+            cluster_ip = pods[0].status.pod_ip
         
         return cluster_ip
         
@@ -345,21 +483,21 @@ class KubernetesOrchestrator(Orchestrator):
             label: The label of the service
 
         Returns:
-            The deployment of the service
+            A copy of the cached deployment of the service
 
         """
-        deployments = self.api_client.list_namespaced_deployment(namespace, label_selector=f"{label_selector}={label}")
-        if not deployments.items:
+        deployments = self.cache.list("deployments", namespace, f"{label_selector}={label}")
+        if not deployments:
             raise OrchestratorResourceNotFoundException(
                 message=f"No deployments found for service {label}",
                 explanation="No deployments found for the given service",
             )
-        if len(deployments.items) > 1:
+        if len(deployments) > 1:
             raise OrchestratorException(
                 message=f"Multiple deployments found for service {label}",
                 explanation="Multiple deployments found for the given service",
             )
-        return deployments.items[0]
+        return copy.deepcopy(deployments[0])
     
     def scale_deployment(self, deployment: V1Deployment, replicas: int):
         """
@@ -396,16 +534,16 @@ class KubernetesOrchestrator(Orchestrator):
             label: The label of the service
 
         Returns:
-            The pods of the service
+            Copies of the cached pods of the service
 
         """
-        pods = self.kube_client.list_namespaced_pod(namespace, label_selector=f"{label_selector}={label}")
-        if not pods.items:
+        pods = self.cache.list("pods", namespace, f"{label_selector}={label}")
+        if not pods:
             raise OrchestratorResourceNotFoundException(
                 message=f"No pods found with the given label selector {label_selector}={label}",
                 explanation="No pods found with the given label selector {label_selector}={label}",
             )
-        return pods.items
+        return copy.deepcopy(pods)
     
     def kill_pod(self, pod: V1Pod):
         """
@@ -431,68 +569,112 @@ class KubernetesOrchestrator(Orchestrator):
                 message=f"Error while deleting pod {pod.metadata.name} in namespace {pod.metadata.namespace}: {e.body}",
                 explanation=str(e),
             )
-    def set_deployment_env_parameter(self, deployment: V1Deployment, environment_variable_name: str, environment_variable_value: str):
+    def set_deployment_env_parameter(self, deployment: V1Deployment, environment_variable_name: str, environment_variable_value: Optional[str]):
         """
         Set an environment variable for a deployment
 
         Args:
             deployment: The deployment to set the environment variable for
             environment_variable_name: The name of the environment variable
-            environment_variable_value: The value of the environment variable
+            environment_variable_value: The value of the environment variable, None removes the variable
 
+        Returns:
+            The patched deployment
 
         """
         assert deployment is not None
-        assert deployment.spec is not None
         assert deployment.metadata is not None
         assert deployment.metadata.name is not None
         assert deployment.metadata.namespace is not None
-        assert deployment.spec.template is not None
-        assert deployment.spec.template.spec is not None
-        assert deployment.spec.template.spec.containers is not None
         assert environment_variable_name is not None
-        assert environment_variable_value is not None
-        
-        new_env_var = client.V1EnvVar(name=environment_variable_name, value=environment_variable_value)
-        
-        # repeate until it is working
-        for i in range(0, 10):
+
+        patch = DeploymentPatch(
+            deployment=deployment,
+            env={environment_variable_name: environment_variable_value},
+        )
+        return self.patch_deployments([patch], wait=False)[0]
+
+    def _build_patch_body(self, patch: DeploymentPatch) -> dict:
+        """Build the strategic merge patch body for a deployment patch"""
+        template: dict = {}
+        if patch.template_annotations:
+            template["metadata"] = {"annotations": dict(patch.template_annotations)}
+        if patch.env or patch.resources:
+            container_name = patch.container
+            if container_name is None:
+                assert patch.deployment.spec is not None
+                assert patch.deployment.spec.template.spec.containers
+                container_name = patch.deployment.spec.template.spec.containers[0].name
+            container: dict = {"name": container_name}
+            if patch.env:
+                # env entries are merged by name, so variables not mentioned in the patch are left untouched
+                container["env"] = [
+                    {"name": name, "$patch": "delete"} if value is None else {"name": name, "value": str(value)}
+                    for name, value in patch.env.items()
+                ]
+            if patch.resources:
+                container["resources"] = patch.resources
+            template["spec"] = {"containers": [container]}
+        body: dict = {}
+        if patch.annotations:
+            body["metadata"] = {"annotations": dict(patch.annotations)}
+        if template:
+            body["spec"] = {"template": template}
+        return body
+
+    def patch_deployments(self, patches: List[DeploymentPatch], wait: bool = True, timeout: float = 120) -> List[V1Deployment]:
+        """
+        Apply several changes to one or more deployments with a single patch call per deployment
+
+        Each deployment is patched with one strategic merge patch that contains all of its env, resource and
+        annotation changes, so every deployment goes through a single rollout. Strategic merge patches do not
+        carry a resource version and therefore cannot conflict with concurrent updates of other fields.
+        Deployments are patched concurrently and, if requested, their rollouts are awaited concurrently.
+
+        Args:
+            patches: The changes to apply, at most one per deployment
+            wait: Whether to wait until the rollouts of all patched deployments are complete
+            timeout: Seconds to wait for the rollouts
+
+        Returns:
+            The patched deployments in the order of the patches
+
+        Throws:
+            OrchestratorException: If a deployment could not be patched or a rollout did not complete in time
+
+        """
+        def apply(patch: DeploymentPatch) -> V1Deployment:
+            name, namespace = patch.deployment.metadata.name, patch.deployment.metadata.namespace
             try:
-                deployment = self.get_deployment(namespace=deployment.metadata.namespace, label_selector="app.kubernetes.io/name", label=deployment.metadata.name)
-
-                container_bodies = []
-                containers = deployment.spec.template.spec.containers
-                container = containers[0]
-
-                if container.env is None:
-                    container.env = []
-
-                # check if env variable already exists and update it
-                is_updated = False
-                for env_var in container.env:
-                    if env_var.name == environment_variable_name:
-                        env_var.value = environment_variable_value
-                        is_updated = True
-                        break
-                if not is_updated:
-                    container.env.append(new_env_var)
-                    
                 response = self.api_client.patch_namespaced_deployment(
-                    name=deployment.metadata.name,
-                    namespace=deployment.metadata.namespace,
-                    body=deployment,
+                    name=name,
+                    namespace=namespace,
+                    body=self._build_patch_body(patch),
                 )
-                return response
             except ApiException as e:
-                logging.error(f"Error while updating deployment {deployment.metadata.name} in namespace {deployment.metadata.namespace}: {e.body}. Waiting for 1 second and retrying. Retry {i}")
-                time.sleep(1)
-                
-        raise OrchestratorException(
-            message=f"Error while updating deployment {deployment.metadata.name} in namespace {deployment.metadata.namespace}",
-            explanation="Error while updating deployment",
-        )
-        
-    
+                raise OrchestratorException(
+                    message=f"Error while updating deployment {name} in namespace {namespace}: {e.body}",
+                    explanation=str(e),
+                )
+            self.cache.update("deployments", response)
+            logging.info(f"Patched deployment {name} in namespace {namespace} with {patch}")
+            return response
+
+        greenlets = [gevent.spawn(apply, patch) for patch in patches]
+        gevent.joinall(greenlets, raise_error=True)
+        deployments = [greenlet.value for greenlet in greenlets]
+
+        if wait:
+            rollouts = [gevent.spawn(self.wait_for_rollout, deployment, timeout) for deployment in deployments]
+            gevent.joinall(rollouts, raise_error=True)
+            pending = [deployment.metadata.name for deployment, rollout in zip(deployments, rollouts) if not rollout.value]
+            if pending:
+                raise OrchestratorException(
+                    message="Error while rolling out patched deployments",
+                    explanation=f"Rollout of deployments {', '.join(pending)} did not complete within {timeout}s",
+                )
+        return deployments
+
     def get_deployment_env_parameters(self, deployment: V1Deployment) -> List[client.V1EnvVar]:
         """
         Get the environment variables for a deployment
@@ -535,15 +717,35 @@ class KubernetesOrchestrator(Orchestrator):
         assert deployment.metadata.name is not None
         assert deployment.metadata.namespace is not None
         
-        # update deployment status
-        deployment = self.api_client.read_namespaced_deployment_status(
-            name=deployment.metadata.name,
-            namespace=deployment.metadata.namespace,
-        )
-        
-        assert deployment.status is not None
-        return deployment.status.ready_replicas == deployment.status.replicas and deployment.status.replicas > 0
+        # read the latest deployment status from the cache
+        deployment = self.cache.get("deployments", deployment.metadata.namespace, deployment.metadata.name)
+        if deployment is None or deployment.status is None:
+            return False
+        return deployment.status.ready_replicas == deployment.status.replicas and (deployment.status.replicas or 0) > 0
     
+    def read_config_map(self, name: str, namespace: str) -> client.V1ConfigMap:
+        """
+        Read a ConfigMap from the cache
+
+        Args:
+            name: The name of the ConfigMap
+            namespace: The namespace of the ConfigMap
+
+        Returns:
+            A copy of the cached ConfigMap that can be modified and patched
+
+        Throws:
+            OrchestratorResourceNotFoundException: If the ConfigMap does not exist
+
+        """
+        configmap = self.cache.get("configmaps", namespace, name)
+        if configmap is None:
+            raise OrchestratorResourceNotFoundException(
+                message=f"Error while reading ConfigMap {name} in namespace {namespace}",
+                explanation=f"ConfigMap {name} not found in namespace {namespace}",
+            )
+        return copy.deepcopy(configmap)
+
     def set_prometheus_scrape_values(self, scrape_interval, evaluation_interval, scrape_timeout):
         """
         Set the Prometheus scrape values
@@ -556,13 +758,7 @@ class KubernetesOrchestrator(Orchestrator):
         """
         
         # TODO: make this more generic
-        try:
-            configmap = self.kube_client.read_namespaced_config_map(name="astronomy-shop-prometheus-server", namespace="system-under-evaluation")
-        except ApiException as e:
-            raise OrchestratorException(
-                message=f"Error while reading ConfigMap astronomy-shop-prometheus-server in namespace system-under-evaluation: {e.body}",
-                explanation=str(e),
-            )
+        configmap = self.read_config_map(name="astronomy-shop-prometheus-server", namespace=self.sue_namespace)
             
         assert configmap is not None
         assert isinstance(configmap, client.V1ConfigMap)
@@ -591,11 +787,12 @@ class KubernetesOrchestrator(Orchestrator):
         configmap.data['prometheus.yml'] = updated_prometheus_config_yaml
         
         try:
-            self.kube_client.patch_namespaced_config_map(name="astronomy-shop-prometheus-server", namespace="system-under-evaluation", body=configmap)
+            response = self.kube_client.patch_namespaced_config_map(name="astronomy-shop-prometheus-server", namespace=self.sue_namespace, body=configmap)
+            self.cache.update("configmaps", response)
             logging.info(f"ConfigMap astronomy-shop-prometheus-server updated successfully.")
         except ApiException as e:
             raise OrchestratorException(
-                message=f"Error while updating ConfigMap astronomy-shop-prometheus-server in namespace system-under-evaluation: {e.body}",
+                message=f"Error while updating ConfigMap astronomy-shop-prometheus-server in namespace {self.sue_namespace}: {e.body}",
                 explanation=str(e),
             )
                 
@@ -609,13 +806,7 @@ class KubernetesOrchestrator(Orchestrator):
 
         """
         
-        try:
-            configmap = self.kube_client.read_namespaced_config_map(name="astronomy-shop-prometheus-server", namespace="system-under-evaluation")
-        except ApiException as e:
-            raise OrchestratorException(
-                message=f"Error while reading ConfigMap astronomy-shop-prometheus-server in namespace system-under-evaluation: {e.body}",
-                explanation=str(e),
-            )
+        configmap = self.read_config_map(name="astronomy-shop-prometheus-server", namespace=self.sue_namespace)
             
         assert configmap is not None
         assert isinstance(configmap, client.V1ConfigMap)
@@ -648,13 +839,7 @@ class KubernetesOrchestrator(Orchestrator):
 
         configmap_name = "astronomy-shop-otelcol"
         
-        try:
-            configmap = self.kube_client.read_namespaced_config_map(name=configmap_name, namespace="system-under-evaluation")
-        except ApiException as e:
-            raise OrchestratorException(
-                message=f"Error while reading ConfigMap {configmap_name} in namespace system-under-evaluation: {e.body}",
-                explanation=str(e),
-            )
+        configmap = self.read_config_map(name=configmap_name, namespace=self.sue_namespace)
             
         assert configmap is not None
         assert isinstance(configmap, client.V1ConfigMap)
@@ -689,13 +874,7 @@ class KubernetesOrchestrator(Orchestrator):
         
         configmap_name = "astronomy-shop-otelcol"
         
-        try:
-            configmap = self.kube_client.read_namespaced_config_map(name=configmap_name, namespace="system-under-evaluation")
-        except ApiException as e:
-            raise OrchestratorException(
-                message=f"Error while reading ConfigMap {configmap_name} in namespace system-under-evaluation: {e.body}",
-                explanation=str(e),
-            )
+        configmap = self.read_config_map(name=configmap_name, namespace=self.sue_namespace)
             
         assert configmap is not None
         assert isinstance(configmap, client.V1ConfigMap)
@@ -719,56 +898,93 @@ class KubernetesOrchestrator(Orchestrator):
         configmap.data['relay'] = updated_otel_collector_config_yaml
         
         try:
-            self.kube_client.patch_namespaced_config_map(name=configmap_name, namespace="system-under-evaluation", body=configmap)
+            response = self.kube_client.patch_namespaced_config_map(name=configmap_name, namespace=self.sue_namespace, body=configmap)
+            self.cache.update("configmaps", response)
             logging.info(f"ConfigMap {configmap_name} updated successfully.")
         except ApiException as e:
             raise OrchestratorException(
-                message=f"Error while updating ConfigMap {configmap_name} in namespace system-under-evaluation: {e.body}",
+                message=f"Error while updating ConfigMap {configmap_name} in namespace {self.sue_namespace}: {e.body}",
                 explanation=str(e),
             )
 
-    def restart_pods_of_deployment(self, deployment: V1Deployment):
+    def is_rollout_complete(self, deployment: V1Deployment, generation: Optional[int] = None) -> bool:
+        """
+        Check if the latest rollout of a deployment is complete
+
+        A rollout is complete once the deployment controller has observed the given generation, all replicas
+        run the new pod template, no replicas of the old template are left and all new replicas are available.
+
+        Args:
+            deployment: The deployment to check
+            generation: The generation that has to be rolled out. Defaults to the generation of the cached deployment
+
+        Returns:
+            True if the rollout is complete, False otherwise
+
+        """
+        current = self.cache.get("deployments", deployment.metadata.namespace, deployment.metadata.name)
+        if current is None or current.status is None:
+            return False
+        status = current.status
+        generation = generation if generation is not None else current.metadata.generation
+        if (status.observed_generation or 0) < (generation or 0):
+            return False
+        desired = current.spec.replicas if current.spec.replicas is not None else 1
+        updated = status.updated_replicas or 0
+        if updated < desired:
+            return False
+        if (status.replicas or 0) > updated:
+            return False
+        return (status.available_replicas or 0) >= updated
+
+    def wait_for_rollout(self, deployment: V1Deployment, timeout: float = 120) -> bool:
+        """
+        Block until the rollout of a deployment is complete
+
+        Waits on watch events of the deployment instead of polling its status.
+
+        Args:
+            deployment: The deployment as returned by the patch that started the rollout
+            timeout: Seconds to wait for the rollout to complete
+
+        Returns:
+            True if the rollout completed within the timeout, False otherwise
+
+        """
+        assert deployment is not None
+        assert deployment.metadata is not None
+        generation = deployment.metadata.generation
+        started = time.monotonic()
+        if not self.cache.wait_for(lambda: self.is_rollout_complete(deployment, generation), timeout=timeout):
+            logging.warning(f"Rollout of deployment {deployment.metadata.name} in namespace {deployment.metadata.namespace} did not complete within {timeout}s")
+            return False
+        logging.info(f"Rollout of deployment {deployment.metadata.name} completed in {time.monotonic() - started:.2f}s")
+        return True
+
+    def restart_pods_of_deployment(self, deployment: V1Deployment, timeout: float = 120) -> bool:
         """
         Restart pods for a service
 
+        Triggers a rolling restart by annotating the pod template, like kubectl rollout restart does, and waits
+        until the new generation is available.
+
         Args:
             deployment: The deployment to restart the pods for
+            timeout: Seconds to wait for the restarted deployment to become available
+
+        Returns:
+            True if the restart completed within the timeout, False otherwise
 
         """
         assert deployment is not None
         assert deployment.metadata is not None
         assert deployment.metadata.name is not None
         assert deployment.metadata.namespace is not None
-        assert deployment.spec is not None
-        assert deployment.spec.selector is not None
-        assert deployment.spec.selector.match_labels is not None
-
-        # Extract the label selector from the deployment spec
-        label_selector = deployment.spec.selector.match_labels
-        label_selector_str = ','.join([f"{key}={value}" for key, value in label_selector.items()])
 
-      # List all pods with the label selector
-        pods = self.kube_client.list_namespaced_pod(
-            namespace=deployment.metadata.namespace, 
-            label_selector=label_selector_str)
-
-        if not pods.items:
-            raise OrchestratorResourceNotFoundException(
-                message=f"No pods found for deployment {deployment.metadata.name}",
-                explanation="No pods found for the given deployment",
-            )
-        
-        for pod in pods.items:
-            self.kill_pod(pod)
-            logging.info(f"Pod {pod.metadata.name} in namespace {deployment.metadata.namespace} has been killed because of restart")
-            
-        time.sleep(4)
-        for i in range(0, 10):
-            if self.is_deployment_ready(deployment):
-                break
-            time.sleep(i * 2)
-            logging.info(f"Waiting for deployment {deployment.metadata.name} to be ready after restart. Retry {i}")
-            
-        logging.info(f"Deployment {deployment.metadata.name} is ready after restart")
-            
-        
+        patch = DeploymentPatch(
+            deployment=deployment,
+            template_annotations={RESTARTED_AT_ANNOTATION: datetime.datetime.now(datetime.timezone.utc).isoformat()},
+        )
+        response = self.patch_deployments([patch], wait=False)[0]
+        logging.info(f"Deployment {deployment.metadata.name} in namespace {deployment.metadata.namespace} is restarting")
+        return self.wait_for_rollout(response, timeout=timeout)
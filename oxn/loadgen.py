@@ -16,6 +16,8 @@ from locust.env import Environment
 from oxn.kubernetes_orchestrator import KubernetesOrchestrator
 
 from .models.orchestrator import Orchestrator
+from .open_loop import OpenLoopDriver, is_open_loop
+from .telemetry import RequestTelemetry
 import oxn.utils as utils
 
 logger = logging.getLogger(__name__)
@@ -46,6 +48,10 @@ class LoadGenerator:
         """The total desired run time of the load generation"""
         self.env = None
         """Locust environment"""
+        self.telemetry = None
+        """Aggregated requests of the load generation"""
+        self.open_loop = None
+        """Open-loop driver if the stages define request rates instead of users"""
         self._read_config()
         """Read the experiment spec and populate stages and tasks"""
 
@@ -58,6 +64,7 @@ class LoadGenerator:
             LocustTask(**task_dict) for task_dict in loadgen_section["tasks"]
         ]
         self.target = loadgen_section.get("target")
+        self.telemetry = RequestTelemetry(sample_rate=loadgen_section.get("request_sample_rate", 0.0))
         
         self.base_address = "localhost"
         self.port = 8080
@@ -74,7 +81,8 @@ class LoadGenerator:
             self.locust_class = self._locust_factory_random()
         else:
             self.locust_class = self._locust_factory_sequential()
-        if self.stages:
+        open_loop = is_open_loop(self.stages)
+        if self.stages and not open_loop:
             self.shape_instance = self._shape_factory()
         else:
             self.shape_instance = None
@@ -83,6 +91,15 @@ class LoadGenerator:
             shape_class=self.shape_instance,
             events=events,
         )
+        if open_loop:
+            self.open_loop = OpenLoopDriver(
+                environment=self.env,
+                user_classes=[self.locust_class],
+                stages=self.stages,
+                arrival=loadgen_section.get("arrival", "uniform"),
+                max_in_flight=loadgen_section.get("max_in_flight", 1000),
+                telemetry=self.telemetry,
+            )
 
     def _task_sequence_factory(self):
         """Create a sequential task set to force ordered execution of tasks"""
@@ -136,21 +153,33 @@ class LoadGenerator:
     def start(self):
         """Start the load generation"""
         runner = self.env.create_local_runner()
-        if self.shape_instance:
+        self.telemetry.attach(self.env.events)
+        if self.open_loop:
+            self.open_loop.start()
+        elif self.shape_instance:
             runner.start_shape()
         else:
             runner.start(user_count=1, spawn_rate=1)
-        gevent.spawn_later(self.run_time, lambda: runner.quit())
+        gevent.spawn_later(self.run_time, self._quit)
+
+    def _quit(self):
+        if self.open_loop:
+            self.open_loop.stop()
+        self.env.runner.quit()
 
     def stop(self):
         """Join the greenlet created by locust env (= wait until it has finished)"""
         runner = self.env.runner
         runner.greenlet.join()
+        self.telemetry.detach()
 
     def kill(self):
         """Kill all greenlets spawned by locust"""
+        if self.open_loop:
+            self.open_loop.kill()
         runner = self.env.runner
         runner.greenlet.kill(block=True)
+        self.telemetry.detach()
 
 
 class LocustTask:
@@ -193,27 +222,6 @@ def task_post_factory(endpoint, params):
     return _locust_task
 
 
-@events.request.add_listener
-def _on_request(
-        request_type,
-        name,
-        response_time,
-        response_length,
-        response,
-        context,
-        exception,
-        start_time,
-        url,
-        **kwargs,
-):
-    """Event hook to log requests made by Locust"""
-    logger.info(
-        f"{request_type} {name} {response.status_code} {response_time} {context}"
-    )
-    if exception:
-        logger.info(f"{request_type} {exception}")
-
-
 def task_factory(task: LocustTask):
     """Factory to create simple locust tasks from a loadgen section in experiment spec"""
     verb = task.verb
@@ -2,6 +2,12 @@ import importlib
 from importlib.machinery import ModuleSpec
 import importlib.util
 import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional, Union
 
 from locust import HttpUser, TaskSet, task
 from locust.env import Environment
@@ -10,13 +16,56 @@ from locust.log import setup_logging
 from .errors import LocustException, OxnException
 from .kubernetes_orchestrator import KubernetesOrchestrator
 from .models.orchestrator import Orchestrator
+from .open_loop import OpenLoopDriver, is_open_loop
+from .shapes import ANCHORS, StageScheduler, build_stages
+from .telemetry import RequestTelemetry
 import oxn.utils as utils
 
+import gevent
 from gevent import Greenlet
 from gevent.pool import Group
 
 logger = logging.getLogger(__name__)
 
+MASTER_HOST = "127.0.0.1"
+"""Address the locust master binds to and local workers connect to"""
+
+
+def load_locust_file(path):
+    """Load a locust file from the specified path"""
+    spec = importlib.util.spec_from_file_location("locustfile", path)
+    if not spec:
+        raise LocustException(f"Could not load locust file from {path}")
+
+    assert isinstance(spec, ModuleSpec)
+    assert spec.loader is not None
+
+    locustfile = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(locustfile)
+    return locustfile
+
+
+def load_user_classes(locust_files: List[Union[str, dict]]) -> list:
+    """Return the http user classes defined in a list of locust files"""
+    user_classes = []
+    for locust_file in locust_files:
+        path = locust_file["path"] if isinstance(locust_file, dict) else locust_file
+
+        locust_module = load_locust_file(path)
+        for user_class in dir(locust_module):
+            user_class_instance = getattr(locust_module, user_class)
+            if isinstance(user_class_instance, type) and issubclass(user_class_instance, HttpUser) and user_class_instance is not HttpUser:
+                user_classes.append(user_class_instance)
+                logger.info(f"Added user class {user_class_instance.__name__} from {path}")
+    return user_classes
+
+
+def _free_port() -> int:
+    """Return a tcp port on the master host that is currently free"""
+    with socket.socket() as sock:
+        sock.bind((MASTER_HOST, 0))
+        return sock.getsockname()[1]
+
 
 class LocustFileLoadgenerator:
     """
@@ -37,6 +86,20 @@ class LocustFileLoadgenerator:
         """Locust environment"""
         self.locust_files = None
         """List of Locust files to run"""
+        self.telemetry = None
+        """Aggregated requests of the load generation"""
+        self.workers = 0
+        """Number of local worker processes. Without workers, all users run in this process"""
+        self.master_port = None
+        """Port the locust master listens on for its workers"""
+        self.worker_processes: List[subprocess.Popen] = []
+        """The local worker processes"""
+        self.open_loop: Optional[OpenLoopDriver] = None
+        """Open-loop driver if the stages define request rates instead of users"""
+        self.scheduler: Optional[StageScheduler] = None
+        """Scheduler of closed-loop stages"""
+        self.anchor_to = "loadgen"
+        """Whether the stages start with the load generation or with the runtime treatments"""
         self._read_config()
         """Read the experiment spec and populate stages and tasks"""
         self.greenlets = Group()
@@ -45,10 +108,23 @@ class LocustFileLoadgenerator:
         """Read the load generation section of an experiment specification"""
         loadgen_section: dict = self.config["experiment"]["loadgen"]
         self.stages = loadgen_section.get("stages", None)
+        shape = loadgen_section.get("shape")
+        if shape:
+            if self.stages:
+                raise LocustException(
+                    message="Cannot combine stages and a load shape",
+                    explanation="Define either stages or a shape in the loadgen section",
+                )
+            self.stages = build_stages(shape)
+        self.anchor_to = loadgen_section.get("anchor", "loadgen")
+        if self.anchor_to not in ANCHORS:
+            raise LocustException(message=f"Unknown anchor {self.anchor_to}", explanation=f"Use one of {ANCHORS}")
         self.run_time = int(utils.time_string_to_seconds(loadgen_section["run_time"]))
         self.locust_files = loadgen_section.get("locust_files", None)
        
         self.target = loadgen_section.get("target")
+        self.telemetry = RequestTelemetry(sample_rate=loadgen_section.get("request_sample_rate", 0.0))
+        self.workers = self._worker_count(loadgen_section.get("workers", 0))
         
         self.max_users = loadgen_section.get("max_users", 100)
         self.spawn_rate = loadgen_section.get("spawn_rate", 10)
@@ -63,32 +139,75 @@ class LocustFileLoadgenerator:
             
         logger.info(f"Base address for load generation set to {self.base_address}:{self.port}")
         
-        self.env = Environment(user_classes=[], host=f"http://{self.base_address}:{self.port}")
-        self.env.create_local_runner()
-        
-        for locust_file in self.locust_files:
-            path = locust_file["path"] if isinstance(locust_file, dict) else locust_file
-            
-            locust_module = self._load_locust_file(path)
-            for user_class in dir(locust_module):
-                user_class_instance = getattr(locust_module, user_class)
-                if isinstance(user_class_instance, type) and issubclass(user_class_instance, HttpUser) and user_class_instance is not HttpUser:
-                    self.env.user_classes.append(user_class_instance)
-                    logger.info(f"Added user class {user_class_instance.__name__} from {path}")
-                    
-        
-    def _load_locust_file(self, path):
-        """Load a locust file from the specified path"""
-        spec = importlib.util.spec_from_file_location("locustfile", path)
-        if not spec:
-            raise LocustException(f"Could not load locust file from {path}")
-        
-        assert isinstance(spec, ModuleSpec)
-        assert spec.loader is not None
-        
-        locustfile = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(locustfile)
-        return locustfile
+        self.env = Environment(
+            user_classes=load_user_classes(self.locust_files),
+            host=f"http://{self.base_address}:{self.port}",
+        )
+        if is_open_loop(self.stages):
+            if self.workers:
+                raise LocustException(
+                    message="Cannot distribute open-loop load generation",
+                    explanation="Open-loop stages run in the oxn process, remove workers from the loadgen section",
+                )
+            self.open_loop = OpenLoopDriver(
+                environment=self.env,
+                user_classes=self.env.user_classes,
+                stages=self.stages,
+                arrival=loadgen_section.get("arrival", "uniform"),
+                max_in_flight=loadgen_section.get("max_in_flight", 1000),
+                telemetry=self.telemetry,
+            )
+            logger.info(f"Generating open-loop load with {loadgen_section.get('arrival', 'uniform')} arrivals")
+        if self.workers:
+            self.master_port = _free_port()
+            self.env.create_master_runner(master_bind_host=MASTER_HOST, master_bind_port=self.master_port)
+            logger.info(f"Distributing load generation to {self.workers} local workers")
+        else:
+            self.env.create_local_runner()
+        if self.stages and not self.open_loop:
+            self.scheduler = StageScheduler(
+                runner=self.env.runner, stages=self.stages, default_spawn_rate=self.spawn_rate
+            )
+
+    @staticmethod
+    def _worker_count(workers: Union[int, str]) -> int:
+        """Return the number of local worker processes. auto starts one worker per core"""
+        if workers == "auto":
+            return os.cpu_count() or 1
+        return int(workers)
+
+    def _start_workers(self, timeout: float = 60) -> None:
+        """Start the local worker processes and block until all of them connected to the master"""
+        paths = [locust_file["path"] if isinstance(locust_file, dict) else locust_file for locust_file in self.locust_files]
+        command = [
+            sys.executable, "-m", "oxn.locust_worker",
+            "--master-host", MASTER_HOST,
+            "--master-port", str(self.master_port),
+            "--host", self.env.host,
+            "--sample-rate", str(self.telemetry.sample_rate),
+            *paths,
+        ]
+        self.worker_processes = [subprocess.Popen(command) for _ in range(self.workers)]
+        deadline = time.monotonic() + timeout
+        while self.env.runner.worker_count < self.workers:
+            if time.monotonic() > deadline or any(process.poll() is not None for process in self.worker_processes):
+                self._stop_workers()
+                raise LocustException(
+                    message="Could not start the locust workers",
+                    explanation=f"{self.env.runner.worker_count} of {self.workers} workers connected within {timeout}s",
+                )
+            gevent.sleep(0.1)
+        logger.info(f"{self.workers} locust workers connected")
+
+    def _stop_workers(self, timeout: float = 10) -> None:
+        """Wait for the worker processes to exit after the master told them to quit and kill stragglers"""
+        for process in self.worker_processes:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self.worker_processes = []
 
     def start(self):
         """Start the load generation"""
@@ -97,22 +216,69 @@ class LocustFileLoadgenerator:
         assert self.env is not None, "Locust environment must be initialized before starting"
         assert self.env.runner is not None, "Locust runner must be initialized before starting"
         
-        self.env.runner.start(self.max_users, self.spawn_rate)
+        if self.workers:
+            # users run in the workers, which ship their request aggregates with their stats reports
+            self.telemetry.attach_master(self.env.events)
+            self._start_workers()
+        else:
+            self.telemetry.attach(self.env.events)
+        hold = self.anchor_to == "treatments"
+        if self.open_loop:
+            # the runner only collects the stats, the open-loop driver issues the requests
+            self.open_loop.start(hold=hold)
+        elif self.scheduler:
+            self.scheduler.start(hold=hold)
+        else:
+            self.env.runner.start(self.max_users, self.spawn_rate)
         self.greenlets.spawn(stats_printer(self.env.stats))
         self.greenlets.spawn(stats_history, self.env.runner)
 
 
+    def anchor(self, origin: float) -> None:
+        """
+        Start the stages relative to the start of the runtime treatments
+
+        Offsets of the stages then match the start offsets of the treatments, so that load changes happen
+        at the same point of every run. Until then, the load of the first stage is generated.
+        """
+        if self.anchor_to != "treatments":
+            return
+        logger.info("Starting load stages with the runtime treatments")
+        if self.open_loop:
+            self.open_loop.anchor(origin)
+        elif self.scheduler:
+            self.scheduler.anchor(origin)
+
     def stop(self):
-        """Join the greenlet created by locust env (= wait until it has finished)"""
+        """
+        Join the greenlet created by locust env (= wait until it has finished)
+
+        A master waits for the final stats reports of its workers while quitting, so the stats of all workers
+        are merged into env.stats when stop returns.
+        """
+        if self.open_loop:
+            self.open_loop.stop()
+        if self.scheduler:
+            self.scheduler.stop()
         if self.env and self.env.runner:
             self.env.runner.quit()
-            self.greenlets.join(timeout=30)  # Add a timeout to ensure it doesn't stall indefinitely
-            self.greenlets.kill()  # Kill any remaining greenlets if they didn't terminate
+            # the stats printer and the stats history loop forever, so joining them would only run into a timeout
+            self.greenlets.kill()
+        self._stop_workers()
+        if self.telemetry:
+            self.telemetry.detach()
 
     def kill(self):
         """Kill all greenlets spawned by locust"""
         self.greenlets.kill()
+        if self.open_loop:
+            self.open_loop.kill()
+        if self.scheduler:
+            self.scheduler.stop()
         if self.env and self.env.runner:
             self.env.runner.quit()  # Ensure the runner is stopped if kill is called
+        self._stop_workers(timeout=0)
+        if self.telemetry:
+            self.telemetry.detach()
 
 
@@ -0,0 +1,43 @@
+"""
+Purpose: Runs a local locust worker process for distributed load generation.
+Functionality: Loads the user classes of the experiment's locust files, connects to the locust master of oxn
+and generates load until the master tells it to quit.
+Connection: Started by the LocustFileLoadgenerator once per worker when the loadgen section sets workers.
+
+Locust worker process"""
+import argparse
+import logging
+
+from locust.env import Environment
+
+from .locust_file_loadgenerator import load_user_classes
+from .telemetry import RequestTelemetry
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(master_host: str, master_port: int, host: str, locust_files: list, sample_rate: float = 0.0) -> None:
+    """Generate load for the master until it quits"""
+    env = Environment(user_classes=load_user_classes(locust_files), host=host)
+    telemetry = RequestTelemetry(sample_rate=sample_rate)
+    telemetry.attach_worker(env.events)
+    runner = env.create_worker_runner(master_host=master_host, master_port=master_port)
+    logger.info(f"Locust worker connected to {master_host}:{master_port}")
+    runner.greenlet.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local locust worker of oxn")
+    parser.add_argument("--master-host", default="127.0.0.1")
+    parser.add_argument("--master-port", type=int, required=True)
+    parser.add_argument("--host", required=True, help="Base url of the load generation target")
+    parser.add_argument("--sample-rate", type=float, default=0.0)
+    parser.add_argument("locust_files", nargs="+")
+    args = parser.parse_args()
+    run_worker(
+        master_host=args.master_host,
+        master_port=args.master_port,
+        host=args.host,
+        locust_files=args.locust_files,
+        sample_rate=args.sample_rate,
+    )
@@ -7,6 +7,7 @@ Connection: Central coordination script that ties together argument parsing, log
 import logging
 import sys
 
+from .campaign import Campaign
 from .engine import Engine
 from .errors import (
     OrchestrationException,
@@ -20,15 +21,50 @@ from .argparser import parse_oxn_args
 logger = logging.getLogger(__name__)
 
 
+def run_campaign(args):
+    """Run all specifications concurrently in separate sue namespaces"""
+    campaign = Campaign(
+        spec_paths=args.spec,
+        namespaces=args.namespaces,
+        capacity=args.capacity,
+        report_path=args.report,
+        treatment_file=args.extend,
+        out_path=args.out_path,
+        out_formats=args.out_formats,
+        trace_path=args.trace,
+    )
+    try:
+        campaign.run(
+            runs=args.times,
+            orchestration_timeout=args.timeout,
+            randomize=args.randomize,
+            accounting=args.accounting,
+            reuse_sue=args.reuse_sue,
+            settle_time=args.settle,
+            pipeline_depth=args.pipeline_depth,
+        )
+    except OxnException as oxn_exception:
+        logger.error(f"OxnException: {oxn_exception}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logger.info("Trying to shut down gracefully. Press ctrl-c to force")
+        for experiment in campaign.experiments:
+            experiment.engine.shutdown()
+
+
 def main():
     args = parse_oxn_args(sys.argv[1:])
     initialize_logging(loglevel=args.log_level, logfile=args.log_file)
+    if args.namespaces:
+        run_campaign(args)
+        return
     engine = Engine(
-        configuration_path=args.spec,
+        configuration_path=args.spec[0],
         report_path=args.report,
         treatment_file=args.extend,
         out_path=args.out_path,
         out_formats=args.out_formats,
+        trace_path=args.trace,
     )
     try:
         engine.read_experiment_specification()
@@ -47,6 +83,9 @@ def main():
             orchestration_timeout=args.timeout,
             randomize=args.randomize,
             accounting=args.accounting,
+            reuse_sue=args.reuse_sue,
+            settle_time=args.settle,
+            pipeline_depth=args.pipeline_depth,
         )
     except OrchestrationException as orc_exception:
         logger.error(f"OrchestrationException: {orc_exception}")
@@ -59,10 +98,5 @@ def main():
     except KeyboardInterrupt:
         logger.info("Trying to shut down gracefully. Press ctrl-c to force")
     finally:
-        if engine.loadgen_running:
-            engine.generator.kill()
-            logger.info("Shut down load generation")
-        if engine.sue_running:
-            # TODO: call cleanup methods here
-            engine.orchestrator.teardown()
-            logger.info("Shut down sue")
+        engine.write_trace()
+        engine.shutdown()
@@ -0,0 +1,146 @@
+"""
+Purpose: Expands parameter sweeps in experiment specifications into a plan of runs.
+Functionality: Builds the cartesian product of the matrix section, renders one specification per combination
+and orders the runs so that runs sharing compile time treatments follow each other.
+Connection: Used by the Engine to execute factorial experiments from a single specification.
+
+Parameter sweeps over experiment specifications"""
+import copy
+import itertools
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from .errors import OxnException
+
+logger = logging.getLogger(__name__)
+
+placeholder_regex = re.compile(r"\$\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}")
+"""Placeholders for matrix parameters in the experiment section, e.g. ${delay_time}"""
+
+
+def cell_key(parameters: dict) -> str:
+    """Return a readable key of matrix parameter values, e.g. delay_time=10ms,service=cart"""
+    return ",".join(f"{name}={value}" for name, value in parameters.items())
+
+
+class PlannedRun:
+    """A single run of an experiment with the matrix parameters substituted into its specification"""
+
+    def __init__(self, spec: dict, parameters: Optional[dict] = None, compile_time_key: str = ""):
+        self.spec = spec
+        """The rendered experiment specification for this run"""
+        self.parameters = parameters if parameters else {}
+        """The matrix parameter values of this run"""
+        self.compile_time_key = compile_time_key
+        """Canonical description of the compile time treatments of this run. Runs with equal keys can share a sue"""
+
+    def __repr__(self):
+        return f"PlannedRun({self.cell})"
+
+    @property
+    def cell(self) -> str:
+        """Return a readable key of the parameter values of this run"""
+        return cell_key(self.parameters)
+
+
+def _render(thing, parameters: dict):
+    """Substitute matrix parameters into all strings of a specification section"""
+    if isinstance(thing, dict):
+        return {key: _render(value, parameters) for key, value in thing.items()}
+    if isinstance(thing, list):
+        return [_render(value, parameters) for value in thing]
+    if not isinstance(thing, str):
+        return thing
+    for name in placeholder_regex.findall(thing):
+        if name not in parameters:
+            raise OxnException(
+                message="Error while expanding the experiment matrix",
+                explanation=f"Placeholder {name} in '{thing}' is not defined in the matrix section",
+            )
+    whole = placeholder_regex.fullmatch(thing)
+    if whole:
+        # a lone placeholder keeps the type of the matrix value, e.g. integers stay integers
+        return parameters[whole.group(1)]
+    return placeholder_regex.sub(lambda match: str(parameters[match.group(1)]), thing)
+
+
+def expand_matrix(spec: dict) -> List[PlannedRun]:
+    """
+    Expand the matrix section of a specification into one run per combination of parameter values
+
+    Specifications without a matrix section expand into a single run with the unchanged specification.
+    """
+    matrix = spec["experiment"].get("matrix")
+    if not matrix:
+        return [PlannedRun(spec=copy.deepcopy(spec))]
+    names = list(matrix)
+    planned = []
+    for values in itertools.product(*(matrix[name] for name in names)):
+        parameters = dict(zip(names, values))
+        rendered = copy.deepcopy(spec)
+        experiment = {key: value for key, value in rendered["experiment"].items() if key != "matrix"}
+        rendered["experiment"] = _render(experiment, parameters)
+        planned.append(PlannedRun(spec=rendered, parameters=parameters))
+    logger.info(f"Expanded matrix {names} into {len(planned)} combinations")
+    return planned
+
+
+def is_compile_time(treatment_class) -> bool:
+    """
+    Return True if a treatment class implements a compile time treatment
+
+    All treatments decide this independent of their configuration, so we can ask an uninitialized instance.
+    Treatments that can't answer are treated as compile time treatments, which only costs a restart.
+    """
+    try:
+        return not treatment_class.__new__(treatment_class).is_runtime()
+    except Exception:
+        return True
+
+
+def compile_time_key(spec: dict, treatment_keys: Dict[str, type]) -> str:
+    """Return a canonical description of the compile time treatments in a specification"""
+    compile_time = []
+    for treatment in spec["experiment"].get("treatments", []):
+        name = next(iter(treatment))
+        description = treatment[name]
+        treatment_class = treatment_keys.get(description["action"])
+        if treatment_class is None or is_compile_time(treatment_class):
+            compile_time.append([name, description["action"], description.get("params", {})])
+    if not compile_time:
+        return ""
+    return json.dumps(compile_time, sort_keys=True, default=str)
+
+
+def plan_runs(
+    spec: dict, runs: int = 1, treatment_keys: Optional[Dict[str, type]] = None
+) -> List[PlannedRun]:
+    """
+    Plan all runs of an experiment
+
+    Every combination of the matrix is run runs times. Combinations are grouped by their compile time
+    treatments, so that a sue built for one group can be reused for all of its runs. Groups keep the order
+    in which they first appear in the matrix, and runs within a group keep the matrix order.
+    """
+    treatment_keys = treatment_keys if treatment_keys else {}
+    groups: Dict[str, List[PlannedRun]] = {}
+    for combination in expand_matrix(spec):
+        combination.compile_time_key = compile_time_key(combination.spec, treatment_keys)
+        groups.setdefault(combination.compile_time_key, []).extend(
+            PlannedRun(
+                spec=copy.deepcopy(combination.spec),
+                parameters=combination.parameters,
+                compile_time_key=combination.compile_time_key,
+            )
+            for _ in range(runs)
+        )
+    plan = [planned for group in groups.values() for planned in group]
+    logger.info(f"Planned {len(plan)} runs in {len(groups)} groups of shared compile time treatments")
+    return plan
+
+
+def shares_sue(planned: PlannedRun, following: Optional[PlannedRun]) -> bool:
+    """Return True if the following run can reuse the sue and compile time treatments of a run"""
+    return following is not None and planned.compile_time_key == following.compile_time_key
@@ -91,4 +91,15 @@ class Orchestrator(ABC):
             The orchestrator type
 
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def relevant_namespaces(self) -> List[str]:
+        """
+        Get the namespaces that the sue and the observability services run in
+
+        Returns:
+            The namespaces of the experiment, empty if the orchestrator has no namespaces
+
+        """
+        pass
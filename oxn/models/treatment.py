@@ -5,12 +5,12 @@ Connection: Used as a base class for specific treatment implementations in treat
  """
 
 import abc
-from typing import List
+from typing import List, Optional
 import logging
 import uuid
 
 from oxn.errors import OxnException
-from oxn.utils import humanize_utc_timestamp
+from oxn.utils import humanize_utc_timestamp, to_milliseconds, utc_timestamp
 from oxn.models.orchestrator import Orchestrator
 
 logger = logging.getLogger(__name__)
@@ -32,6 +32,8 @@ class Treatment(abc.ABC):
         """A unix float timestamp in utc indicating when the treatment instance has been started"""
         self.end = None
         """A unix float timestamp in utc indicating when the treatment instance has finished execution"""
+        self.applied = None
+        """A unix float timestamp in utc indicating when the treatment took effect on all of its targets, if known"""
         self.messages = []
         """A list of strings to provide helpful messages to the user in case of any errors"""
         validates = self._validate_params()
@@ -66,6 +68,19 @@ class Treatment(abc.ABC):
         """Return the truncated id for the treatment instance"""
         return self.id[:8]
 
+    @property
+    def injection_latency(self):
+        """Seconds between the start of the treatment and the moment it took effect, None if unknown"""
+        if self.start is None or self.applied is None:
+            return None
+        return self.applied - self.start
+
+    def mark_applied(self, timestamp: Optional[float] = None) -> None:
+        """Record that the treatment has taken effect on all of its targets, now or at the given timestamp"""
+        self.applied = timestamp if timestamp is not None else utc_timestamp()
+        if self.injection_latency is not None:
+            logger.info(f"Treatment {self.name} took effect after {to_milliseconds(self.injection_latency):.1f}ms")
+
     @property
     def humanize_start_time(self):
         """Provide a human-readable version of the start timestamp"""
@@ -11,8 +11,11 @@ from operator import attrgetter
 from .models.orchestrator import Orchestrator
 
 
-from .responses import MetricResponseVariable, TraceResponseVariable
+from .responses import LoadgenResponseVariable, MetricResponseVariable, ResourceResponseVariable, TraceResponseVariable
 from .models.response import ResponseVariable
+from .sampler import ResourceSampler
+from .telemetry import RequestTelemetry
+from .timing import PhaseTimer, RESPONSES
 from .utils import time_string_to_seconds
 
 logger = logging.getLogger(__name__)
@@ -24,9 +27,19 @@ class Observer:
     an experiment description and then observing the variables during or after an experiment.
     """
 
-    def __init__(self, config: dict, orchestrator):
+    def __init__(
+            self,
+            config: dict,
+            orchestrator,
+            telemetry: Optional[RequestTelemetry] = None,
+            sampler: Optional[ResourceSampler] = None,
+    ):
         self.config = config
         self.orchestrator = orchestrator
+        self.telemetry = telemetry
+        """Aggregated requests of the load generator for loadgen response variables"""
+        self.sampler = sampler
+        """Background sampler of the sue containers for resource response variables"""
         self.experiment_start: Optional[float] = None
         self.experiment_end: Optional[float] = None
         self._response_variables: Dict[str, ResponseVariable] = {}
@@ -66,6 +79,30 @@ class Observer:
                 )
                 self._response_variables[name] = response_variable
 
+            elif response_type == "loadgen":
+                response_variable = LoadgenResponseVariable(
+                    telemetry=self.telemetry,
+                    name=name,
+                    experiment_start=self.experiment_start,
+                    experiment_end=self.experiment_end,
+                    description=response,
+                    right_window=response["right_window"],
+                    left_window=response["left_window"],
+                )
+                self._response_variables[name] = response_variable
+
+            elif response_type == "resources":
+                response_variable = ResourceResponseVariable(
+                    sampler=self.sampler,
+                    name=name,
+                    experiment_start=self.experiment_start,
+                    experiment_end=self.experiment_end,
+                    description=response,
+                    right_window=response["right_window"],
+                    left_window=response["left_window"],
+                )
+                self._response_variables[name] = response_variable
+
     def variables(self) -> Dict[str, ResponseVariable]:
         """Return all response variables"""
         return self._response_variables
@@ -106,9 +143,12 @@ class Observer:
             if isinstance(v, TraceResponseVariable)
         ]
 
-    def observe(self) -> None:
+    def observe(self, timer: Optional[PhaseTimer] = None) -> None:
+        """Observe all response variables, optionally timing the observation of each variable"""
+        timer = timer if timer else PhaseTimer()
         for variable in self.variables().values():
             try:
-                variable.observe()
+                with timer.phase("observe", category=RESPONSES, target=variable.name):
+                    variable.observe()
             except Exception as e:
                 logger.info(f"failed to capture {variable.name}, proceeding. {e}")
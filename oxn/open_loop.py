@@ -0,0 +1,228 @@
+"""
+Purpose: Generates open-loop load with a target request rate per stage.
+Functionality: Issues the tasks of locust user classes on a fixed arrival schedule, regardless of how long
+earlier tasks take, and measures how long every arrival waited for a free user separately from response times.
+Connection: Used by the load generators instead of the closed-loop locust runner when the stages of the
+loadgen section define a rate instead of users.
+
+Open-loop load generation"""
+import logging
+import random
+import time
+from typing import Dict, Iterator, List, Optional
+
+import gevent
+from gevent.pool import Pool
+from locust import SequentialTaskSet, TaskSet
+from locust.exception import InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately, StopUser
+
+from .errors import LocustException
+from .shapes import level_at, stage_index
+from .telemetry import RequestTelemetry
+
+logger = logging.getLogger(__name__)
+
+ARRIVALS = ["uniform", "poisson"]
+"""Supported arrival processes. Uniform arrivals are evenly spaced, poisson arrivals are exponentially spaced"""
+RAMP_STEP = 0.01
+"""Resolution in seconds of the rate of stages that ramp"""
+
+
+def is_open_loop(stages: Optional[List[dict]]) -> bool:
+    """Return whether loadgen stages define open-loop rates instead of closed-loop users"""
+    if not stages:
+        return False
+    rated = ["rate" in stage for stage in stages]
+    if any(rated) and not all(rated):
+        raise LocustException(
+            message="Cannot mix open-loop and closed-loop stages",
+            explanation="Either every stage of the loadgen section defines a rate or none does",
+        )
+    return all(rated)
+
+
+def arrival_offsets(stages: List[dict], arrival: str = "uniform", rng: Optional[random.Random] = None) -> Iterator[float]:
+    """
+    Yield the scheduled arrival times in seconds since the start of the stages
+
+    Like the closed-loop stages, the duration of a stage is the run time in seconds at which the stage ends.
+    An arrival is due whenever the integral of the rate since the previous arrival reaches one, for uniform
+    arrivals, or an exponentially distributed threshold, for poisson arrivals. Every stage starts its own
+    arrivals at its start, and the rate of a stage that ramps is integrated in steps of RAMP_STEP seconds.
+    After the last stage, arrivals continue at the rate of the last stage until the load generation is stopped.
+    """
+    if arrival not in ARRIVALS:
+        raise LocustException(message=f"Unknown arrival process {arrival}", explanation=f"Use one of {ARRIVALS}")
+    rng = rng or random.Random()
+
+    def threshold() -> float:
+        return rng.expovariate(1.0) if arrival == "poisson" else 1.0
+
+    offset, work, due = 0.0, 0.0, threshold()
+    while True:
+        idx = stage_index(stages, offset)
+        stage = stages[idx]
+        end = float(stage["duration"]) if idx < len(stages) - 1 else float("inf")
+        if stage.get("ramp") and offset < stage["duration"]:
+            step = min(RAMP_STEP, stage["duration"] - offset)
+            rate = float(level_at(stages, "rate", offset + step / 2))
+            if rate > 0 and work + rate * step >= due:
+                offset += (due - work) / rate
+                work, due = 0.0, threshold()
+                yield offset
+            else:
+                work += rate * step
+                offset += step
+                if offset >= end:
+                    work, due = 0.0, threshold()
+            continue
+        rate = float(level_at(stages, "rate", offset))
+        needed = (due - work) / rate if rate > 0 else float("inf")
+        if offset + needed >= end:
+            if end == float("inf"):
+                # an idle last stage issues nothing anymore
+                return
+            # the next stage starts its own arrivals at its start
+            offset, work, due = end, 0.0, threshold()
+            continue
+        offset += needed
+        work, due = 0.0, threshold()
+        yield offset
+
+
+class OpenLoopDriver:
+    """
+    Issue the tasks of locust users on an arrival schedule
+
+    Every arrival runs one randomly picked task of an idle user, creating a new user if none is idle. At
+    most max_in_flight tasks run at the same time. When all of them are busy, later arrivals queue up in
+    arrival order instead of being skipped, and the time between the scheduled and the actual start of a
+    task is recorded as queueing delay. Response times still only cover the requests themselves.
+    Wait times of the user classes are ignored.
+    """
+
+    def __init__(
+            self,
+            environment,
+            user_classes: list,
+            stages: List[dict],
+            arrival: str = "uniform",
+            max_in_flight: int = 1000,
+            telemetry: Optional[RequestTelemetry] = None,
+    ):
+        if not user_classes:
+            raise LocustException(message="Cannot generate open-loop load", explanation="No user classes to run")
+        assert max_in_flight > 0, "At least one task must be allowed in flight"
+        if environment.host:
+            # like the locust runners, the host of the environment overrides the host of the user classes
+            for user_class in user_classes:
+                user_class.host = environment.host
+        self.environment = environment
+        """Locust environment the users report their requests to"""
+        self.user_classes = user_classes
+        """User classes whose tasks are issued"""
+        self.stages = stages
+        """Open-loop stages with their end in seconds and their rate in arrivals per second"""
+        self.arrival = arrival
+        """Arrival process, one of ARRIVALS"""
+        self.max_in_flight = max_in_flight
+        """Maximum number of concurrently running tasks"""
+        self.telemetry = telemetry
+        """Telemetry that records the queueing delay of every arrival"""
+        self.pool = Pool(max_in_flight)
+        """Greenlets of the running tasks"""
+        self.idle_users: Dict[type, list] = {user_class: [] for user_class in user_classes}
+        """Users that are not running a task, by user class"""
+        self.user_count = 0
+        """Number of users created so far"""
+        self.arrivals = 0
+        """Number of arrivals so far"""
+        self.greenlet: Optional[gevent.Greenlet] = None
+        """Greenlet that dispatches the arrivals"""
+
+    def start(self, hold: bool = False) -> None:
+        """Start the stages now, or only issue the rate at the start of the stages until the driver is anchored"""
+        if hold:
+            held = [{"duration": 0, "rate": level_at(self.stages, "rate", 0)}]
+            self.greenlet = gevent.spawn(self._schedule, held, time.time())
+        else:
+            self.anchor(time.time())
+
+    def anchor(self, origin: float) -> None:
+        """Start the stages relative to a unix timestamp"""
+        if self.greenlet:
+            self.greenlet.kill()
+        self.greenlet = gevent.spawn(self._schedule, self.stages, origin)
+
+    def _schedule(self, stages: List[dict], origin_wall: float) -> None:
+        origin_monotonic = time.monotonic() - (time.time() - origin_wall)
+        for offset in arrival_offsets(stages, self.arrival):
+            delay = origin_monotonic + offset - time.monotonic()
+            if delay > 0:
+                gevent.sleep(delay)
+            # blocks while max_in_flight tasks run, which queues this and all later arrivals
+            self.pool.wait_available()
+            self.arrivals += 1
+            self.pool.spawn(self._execute, origin_wall + offset, origin_monotonic + offset)
+
+    def _execute(self, scheduled_wall: float, scheduled_monotonic: float) -> None:
+        if self.telemetry:
+            self.telemetry.on_arrival(scheduled_wall, max(time.monotonic() - scheduled_monotonic, 0) * 1000)
+        user = None
+        try:
+            user = self._acquire()
+            self._run_task(user)
+        except (RescheduleTask, RescheduleTaskImmediately, InterruptTaskSet, StopUser):
+            pass
+        except Exception as e:
+            logger.debug(f"Open-loop task failed: {e}")
+        finally:
+            if user is not None:
+                self.idle_users[type(user)].append(user)
+
+    def _acquire(self):
+        """Return an idle user of a user class picked by weight"""
+        user_class = random.choices(self.user_classes, weights=[cls.weight for cls in self.user_classes])[0]
+        idle = self.idle_users[user_class]
+        if idle:
+            return idle.pop()
+        user = user_class(self.environment)
+        self.user_count += 1
+        user.on_start()
+        return user
+
+    @staticmethod
+    def _run_task(user) -> None:
+        """
+        Run one task of a user
+
+        A task set runs one of its tasks on a fresh instance of the task set, a sequential task set runs
+        all of its tasks in order.
+        """
+        task = random.choice(user.tasks)
+        if isinstance(task, type) and issubclass(task, SequentialTaskSet):
+            task_set = task(user)
+            for sequential_task in task_set.tasks:
+                sequential_task(task_set)
+        elif isinstance(task, type) and issubclass(task, TaskSet):
+            task_set = task(user)
+            random.choice(task_set.tasks)(task_set)
+        else:
+            task(user)
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop dispatching arrivals and give the running tasks timeout seconds to finish"""
+        if self.greenlet:
+            self.greenlet.kill()
+        self.pool.join(timeout=timeout)
+        self.pool.kill()
+        for users in self.idle_users.values():
+            for user in users:
+                try:
+                    user.on_stop()
+                except Exception as e:
+                    logger.debug(f"Stopping {type(user).__name__} failed: {e}")
+            users.clear()
+
+    def kill(self) -> None:
+        self.stop(timeout=0)
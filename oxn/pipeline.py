@@ -0,0 +1,111 @@
+"""
+Purpose: Post-processes finished experiment runs in the background.
+Functionality: Queues finished runs in a bounded queue and hands them to worker greenlets that do storage,
+statistics and report assembly in native threads.
+Connection: Used by the Engine so that run i is persisted and reported while run i+1 executes.
+
+Background post-processing of experiment runs"""
+import logging
+from typing import Callable, List, Optional
+
+import gevent
+from gevent import monkey
+from gevent.queue import Queue
+from gevent.threadpool import ThreadPool
+
+from .errors import OxnException
+
+logger = logging.getLogger(__name__)
+
+
+class RunResult:
+    """Everything the post-processing of a single finished run needs"""
+
+    def __init__(self, runner, request_stats, accounting=False, telemetry=None):
+        self.runner = runner
+        """The runner of the finished run, holding treatments and observed response variables"""
+        self.request_stats = request_stats
+        """Locust request stats of the load generator used in the finished run"""
+        self.accounting = accounting
+        """If accounting data should be added to the report"""
+        self.telemetry = telemetry
+        """Aggregated requests of the load generator used in the finished run"""
+
+    def __repr__(self):
+        return f"RunResult(runner={self.runner})"
+
+
+class PostProcessingPipeline:
+    """
+    Bounded pipeline that post-processes finished runs while the next run executes
+
+    Finished runs are put into a bounded queue. Worker greenlets take runs from the queue and call the
+    handler for each run in a native thread, so that storage and statistics do not block the gevent loop the
+    load generator runs on. If the queue is full, submitting a run blocks until a worker is done with an
+    earlier run. This bounds the number of runs held in memory to depth + workers.
+    """
+
+    def __init__(self, handler: Callable[[RunResult], None], depth: int = 1, workers: int = 1):
+        assert depth > 0, "Pipeline depth must be positive"
+        assert workers > 0, "Number of pipeline workers must be positive"
+        self.handler = handler
+        """Callable that post-processes a single finished run"""
+        self.depth = depth
+        """Maximum number of finished runs waiting in the queue"""
+        self.queue: Queue = Queue(maxsize=depth)
+        """Bounded queue of finished runs"""
+        self.threadpool = ThreadPool(maxsize=workers)
+        """Native threads the handler is executed in"""
+        self.lock = monkey.get_original("threading", "Lock")()
+        """Native lock that serializes handler calls, since the store and reporter are not thread-safe"""
+        self.errors: List[Exception] = []
+        """Exceptions raised by the handler"""
+        self.workers = [gevent.spawn(self._work) for _ in range(workers)]
+        """Worker greenlets consuming the queue"""
+
+    def _handle(self, result: RunResult) -> None:
+        with self.lock:
+            self.handler(result)
+
+    def _work(self) -> None:
+        for result in self.queue:
+            try:
+                self.threadpool.apply(self._handle, (result,))
+                logger.info(f"Post-processed {result}")
+            except Exception as e:
+                logger.error(f"Failed to post-process {result}: {e}")
+                self.errors.append(e)
+            finally:
+                self.queue.task_done()
+
+    def _raise_errors(self) -> None:
+        if self.errors:
+            raise OxnException(
+                message="Error while post-processing experiment runs",
+                explanation="\n".join(str(error) for error in self.errors),
+            )
+
+    def submit(self, result: RunResult) -> None:
+        """Submit a finished run. Blocks while the queue is full and raises if an earlier run failed"""
+        self._raise_errors()
+        logger.debug(f"Submitting {result} to post-processing, {self.queue.qsize()} runs waiting")
+        self.queue.put(result)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Block until all submitted runs have been post-processed and raise if any of them failed"""
+        self.queue.join(timeout=timeout)
+        self._raise_errors()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Post-process the runs still in the queue and stop the workers
+
+        If a run failed before, or the queue is not drained within timeout, the remaining runs are logged
+        as not post-processed instead.
+        """
+        if not self.errors:
+            self.queue.join(timeout=timeout)
+        for result in list(self.queue.queue):
+            logger.warning(f"Stopping post-processing before {result} was stored and reported")
+        gevent.killall(self.workers)
+        self.threadpool.kill()
@@ -1,7 +1,8 @@
 """
 
 Purpose: Calculates resource utilization and costs during an experiment.
-Functionality: Collects and consolidates CPU and memory usage statistics using psutil and Docker stats.
+Functionality: Collects and consolidates CPU and memory usage statistics using psutil and Docker stats, and on
+Kubernetes the cAdvisor and Kepler series of all sue and observability pods from Prometheus.
 Connection: Used to generate cost-related metrics and is invoked by the Runner and Reporter.
 
 Module to price a synthetic dataset produced by an observability experiment
@@ -15,15 +16,21 @@ more specifically from the docker stats sub-command.
 import pytz
 import datetime
 import logging
+import math
+import re
 import dateutil.parser
 
 from typing import List, Optional
 from collections import defaultdict
 
 import psutil
+from gevent.pool import Group
 from docker import DockerClient
 from docker.models.containers import Container
 
+from .errors import OrchestratorException, PrometheusException
+from .prometheus import Prometheus
+
 logger = logging.Logger(__name__)
 
 
@@ -79,15 +86,20 @@ class Accountant:
         }
         self.data[container_name].append(values)
 
+    def _read_container(self, container: Container):
+        self.read_container_stats(
+            container_name=container.name,
+            container_id=container.id,
+            container_stats=container.stats(stream=False),
+        )
+
     def read_all_containers(self):
-        """Read docker stats for all containers"""
+        """Read docker stats for all containers concurrently, since every read takes about two seconds"""
+        group = Group()
         for container in self.containers():
             if container.name and self.container_names and container.name in self.container_names:
-                self.read_container_stats(
-                    container_name=container.name,
-                    container_id=container.id,
-                    container_stats=container.stats(stream=False),
-                )
+                group.spawn(self._read_container, container)
+        group.join(raise_error=True)
 
     def consolidate(self):
         """Calculate experiment resource expenditure from two reads of docker stats"""
@@ -128,3 +140,94 @@ class Accountant:
                 "number_of_cpus": psutil.cpu_count(),
             }
             self.data["oxn"].append(values)
+
+
+POD_QUERIES = {
+    "total_cpu_usage": 'sum by (namespace, pod) (increase(container_cpu_usage_seconds_total{{namespace=~"{namespaces}", container!="", container!="POD"}}[{window}s]))',
+    "memory_bytes": 'sum by (namespace, pod) (max_over_time(container_memory_working_set_bytes{{namespace=~"{namespaces}", container!="", container!="POD"}}[{window}s]))',
+    "network_rx_bytes": 'sum by (namespace, pod) (increase(container_network_receive_bytes_total{{namespace=~"{namespaces}"}}[{window}s]))',
+    "network_tx_bytes": 'sum by (namespace, pod) (increase(container_network_transmit_bytes_total{{namespace=~"{namespaces}"}}[{window}s]))',
+    "energy_joules": 'sum by (namespace, pod) (label_replace(label_replace(increase(kepler_container_joules_total{{container_namespace=~"{namespaces}"}}[{window}s]), "namespace", "$1", "container_namespace", "(.*)"), "pod", "$1", "pod_name", "(.*)"))',
+}
+"""Prometheus queries for the resource expenditure of all pods of the accounted namespaces, one per resource"""
+OBSERVABILITY_PODS = ["otel", "collector", "prometheus", "jaeger", "grafana", "kepler"]
+"""Parts of pod names that identify the observability stack within the sue namespace"""
+
+
+class KubernetesAccountant(Accountant):
+    """
+    Accountant for sue and observability pods on Kubernetes
+
+    Instead of reading every container twice, the accountant only remembers when it read and asks Prometheus
+    for the cAdvisor counters of all pods in the accounted namespaces with one query per resource when it
+    consolidates. Energy is added for the pods that Kepler measures. Pods outside of the sue namespace and
+    pods named like the observability stack are accounted as observability.
+    """
+
+    def __init__(self, orchestrator, process: psutil.Process, namespaces: List[str], sue_namespace: str):
+        super().__init__(client=None, process=process, container_names=[])
+        self.orchestrator = orchestrator
+        """A reference to the kubernetes orchestrator"""
+        self.namespaces = namespaces
+        """Namespaces whose pods are accounted"""
+        self.sue_namespace = sue_namespace
+        """Namespace of the sue"""
+        self.reads: List[float] = []
+        """UTC timestamps of the reads"""
+
+    def containers(self) -> List[Container]:
+        return []
+
+    def read_all_containers(self):
+        """Remember the time of the read, the counters are queried in bulk when consolidating"""
+        self.reads.append(datetime.datetime.now(pytz.utc).timestamp())
+
+    def role(self, namespace: str, pod: str) -> str:
+        """Return whether a pod belongs to the sue or to the observability stack"""
+        if namespace != self.sue_namespace or any(part in pod for part in OBSERVABILITY_PODS):
+            return "observability"
+        return "sue"
+
+    def _prometheus(self) -> Prometheus:
+        # the external monitoring scrapes the kubelets of all nodes, the prometheus of the sue might not
+        try:
+            return Prometheus(orchestrator=self.orchestrator, target="oxn")
+        except OrchestratorException:
+            return Prometheus(orchestrator=self.orchestrator, target="sue")
+
+    def query_pods(self, prometheus, start: float, end: float) -> dict:
+        """Return the resource expenditure of every pod between two timestamps, by namespace and pod name"""
+        namespaces = "|".join(re.escape(namespace) for namespace in self.namespaces)
+        window = max(math.ceil(end - start), 1)
+        pods: dict = {}
+        for field, query in POD_QUERIES.items():
+            try:
+                response = prometheus.instant_query(query.format(namespaces=namespaces, window=window), time=end)
+            except PrometheusException as e:
+                logger.warning(f"Could not query {field} of the accounted pods: {e}")
+                continue
+            for result in response["data"]["result"]:
+                namespace, pod = result["metric"].get("namespace"), result["metric"].get("pod")
+                if not namespace or not pod:
+                    continue
+                entry = pods.setdefault(
+                    f"{namespace}/{pod}",
+                    {"container_name": f"{namespace}/{pod}", "namespace": namespace, "role": self.role(namespace, pod)},
+                )
+                entry[field] = float(result["value"][1])
+        return pods
+
+    def consolidate(self):
+        """Consolidate the reads of oxn and query the pods between the first and the last read"""
+        super().consolidate()
+        if len(self.reads) < 2:
+            logger.error("Could not account the pods without two reads")
+            return
+        pods = self.query_pods(self._prometheus(), start=self.reads[0], end=self.reads[-1])
+        for key, pod in pods.items():
+            pod.setdefault("total_cpu_usage", 0.0)
+            self.consolidated_data[key] = pod
+
+    def clear(self):
+        super().clear()
+        self.reads = []
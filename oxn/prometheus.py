@@ -5,8 +5,12 @@ Connection: Used by responses.py and validation.py to gather metrics and validat
 
 Wrapper around the Prometheus HTTP API"""
 import logging
+import time
 from math import e
+from typing import Optional
+
 import requests
+import yaml
 from requests.adapters import Retry, HTTPAdapter
 
 from .kubernetes_orchestrator import KubernetesOrchestrator
@@ -14,6 +18,7 @@ from .kubernetes_orchestrator import KubernetesOrchestrator
 from .models.orchestrator import Orchestrator
 
 from .errors import PrometheusException
+from .utils import time_string_to_seconds
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +40,8 @@ class Prometheus:
             address = orchestrator.get_prometheus_address(target)
         else:
             address = orchestrator.get_prometheus_address()
-        self.base_url = f"http://{address}:9090/api/v1/"
+        self.server_url = f"http://{address}:9090/"
+        self.base_url = f"{self.server_url}api/v1/"
         self.endpoints = {
             "range_query": "query_range",
             "instant_query": "query",
@@ -47,6 +53,8 @@ class Prometheus:
             "target_metadata": "targets/metadata",
             "config": "status/config",
             "flags": "status/flags",
+            "runtimeinfo": "status/runtimeinfo",
+            "reload": "-/reload",
         }
 
     @staticmethod
@@ -236,6 +244,78 @@ class Prometheus:
                 explanation=f"{requests_exception}",
             )
 
+    def runtimeinfo(self):
+        runtimeinfo = self.endpoints.get("runtimeinfo")
+        url = self.base_url + runtimeinfo
+        try:
+            response = self.session.get(url=url)
+            response.raise_for_status()
+            return response.json()
+        except (requests.ConnectionError, requests.HTTPError) as requests_exception:
+            raise PrometheusException(
+                message=f"Error while talking to Prometheus at {url}",
+                explanation=f"{requests_exception}",
+            )
+
+    def loaded_global_config(self) -> dict:
+        """Return the global section of the configuration Prometheus currently runs with"""
+        loaded = yaml.safe_load(self.config()["data"]["yaml"])
+        return loaded.get("global") or {}
+
+    def reload(self, expected_global: Optional[dict] = None, timeout: float = 90, interval: float = 1) -> bool:
+        """
+        Reload the Prometheus configuration via the lifecycle api without restarting Prometheus
+
+        Prometheus reads its configuration from a mounted file, which is updated by the kubelet some time after
+        the underlying configmap changed. The reload is therefore triggered repeatedly until the last successful
+        reload time has changed and the loaded global section matches the expected durations.
+
+        Returns False if the lifecycle api is disabled or the expected configuration was not loaded in time.
+        """
+        url = self.server_url + self.endpoints.get("reload")
+        try:
+            reloaded_before = self.runtimeinfo()["data"].get("lastConfigTime")
+        except PrometheusException as e:
+            logger.warning(f"Cannot read Prometheus runtime information: {e.explanation}")
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                response = self.session.post(url=url)
+            except requests.ConnectionError as e:
+                logger.warning(f"Error while reloading Prometheus at {url}: {e}")
+                return False
+            if response.status_code in (403, 404, 405):
+                logger.warning(f"Prometheus at {url} does not allow config reloads, start it with --web.enable-lifecycle")
+                return False
+            try:
+                runtimeinfo = self.runtimeinfo()["data"]
+                loaded_global = self.loaded_global_config()
+            except PrometheusException as e:
+                logger.debug(f"Prometheus not responding after reload: {e.explanation}")
+                runtimeinfo, loaded_global = {}, {}
+            if (
+                runtimeinfo.get("reloadConfigSuccess")
+                and runtimeinfo.get("lastConfigTime") != reloaded_before
+                and self._matches(loaded_global, expected_global or {})
+            ):
+                logger.info(f"Prometheus reloaded its configuration at {runtimeinfo.get('lastConfigTime')}")
+                return True
+            time.sleep(interval)
+        logger.warning(f"Prometheus did not load the expected configuration within {timeout}s")
+        return False
+
+    @staticmethod
+    def _matches(loaded_global: dict, expected_global: dict) -> bool:
+        """Compare durations of two global config sections, since Prometheus normalizes e.g. 60s to 1m"""
+        for key, expected in expected_global.items():
+            if expected is None:
+                continue
+            loaded = loaded_global.get(key)
+            if loaded is None or time_string_to_seconds(str(loaded)) != time_string_to_seconds(str(expected)):
+                return False
+        return True
+
     def instant_query(self, query, time=None, timeout=None):
         """Evaluate a Prometheus query instantly"""
         instant_query = self.endpoints.get("instant_query")
@@ -1,27 +1,42 @@
 """
 Purpose: Generates reports from experiment results.
-Functionality: Collects and formats interaction data between treatments and responses, generates statistical analyses, and writes to a report file.
+Functionality: Collects and formats interaction data between treatments and responses, generates statistical analyses, and streams every run to a report file as soon as it is reported.
 Connection: Called by main.py and Engine to compile and save experiment results.
 
 Handle the generation of experiment reports"""
 import datetime
-import uuid
-from typing import Tuple, Union
+from typing import Dict, Optional, Tuple, Union
 
 import locust.stats
-import yaml
 
 import pandas as pd
 from scipy.stats import ttest_ind
 
 from .runner import ExperimentRunner
 from .models.treatment import Treatment
-from .responses import TraceResponseVariable, MetricResponseVariable
+from .responses import LoadgenResponseVariable, ResourceResponseVariable, TraceResponseVariable, MetricResponseVariable
+from .matrix import cell_key
+from .report_stream import ReportStream
+from .statistics import StatisticsStage
 from .store import construct_key
+from .telemetry import RequestTelemetry, endpoint_id
+from .timing import PhaseTimer
 from .utils import humanize_utc_timestamp
 from .errors import OxnException
 
 
+ACCOUNTING_FIELDS = [
+    "number_of_cpus",
+    "namespace",
+    "role",
+    "memory_bytes",
+    "network_rx_bytes",
+    "network_tx_bytes",
+    "energy_joules",
+]
+"""Optional accounting fields that are reported if the accountant measured them"""
+
+
 class Reporter:
     def __init__(
         self,
@@ -31,6 +46,10 @@ class Reporter:
         self.report_path = report_path
         self.report_file_name = f"report_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.yaml"
         self.interactions = []
+        self.stream = ReportStream(path=self.report_path + self.report_file_name)
+        """Append-only stream that runs are written to once they are reported"""
+        self.statistics = StatisticsStage()
+        """Statistics stage that compares all treatment and response pairs of a run"""
 
     @staticmethod
     def compute_welch_ttest(
@@ -58,23 +77,61 @@ class Reporter:
         )
         return str(ttest_result[0]), str(ttest_result[1]), "welch t-test"
 
+    @staticmethod
+    def _value_column(response) -> Tuple[str, str]:
+        """Return the column that holds the values of a response and the name of the response in the report"""
+        if isinstance(response, TraceResponseVariable):
+            return "duration", f"{response.name}.duration"
+        if isinstance(response, (LoadgenResponseVariable, ResourceResponseVariable)):
+            return response.name, response.name
+        return response.metric_name, response.name
+
+    def gather_interactions(self, experiment: ExperimentRunner, treatments: Dict[str, Treatment], responses: dict):
+        """
+        Gather the interaction data of all treatment and response pairs of a run for the experiment report
+
+        All pairs are compared at once by the statistics stage, which adds effect sizes, a Mann-Whitney U test and
+        bootstrap confidence intervals, and corrects the p-values of the run for multiple testing.
+        """
+        columns = {}
+        for response in responses.values():
+            store_key = construct_key(
+                experiment_key=experiment.config_filename,
+                run_key=experiment.short_id,
+                response_key=response.name,
+            )
+            columns[store_key] = (response, *self._value_column(response))
+        comparisons = self.statistics.compare(
+            responses={store_key: (response.data, value_column) for store_key, (response, value_column, _) in columns.items()},
+            treatments=[treatment.name for treatment in treatments.values()],
+        )
+        for store_key, (response, _, display_response_name) in columns.items():
+            for treatment in treatments.values():
+                comparison = dict(comparisons[store_key][treatment.name])
+                self._add_interaction_data(
+                    treatment_name=treatment.name,
+                    treatment_type=treatment.treatment_type,
+                    treatment_start=treatment.start,
+                    treatment_end=treatment.end,
+                    response_type=response.response_type,
+                    response_start=response.start,
+                    response_end=response.end,
+                    response_name=display_response_name,
+                    p_value=str(comparison.pop("p_value")),
+                    test_statistic=str(comparison.pop("test_statistic")),
+                    test_performed="welch t-test",
+                    store_key=store_key,
+                    effects=comparison,
+                )
+
     def gather_interaction(
         self,
         experiment: ExperimentRunner,
         treatment: Treatment,
-        response: Union[TraceResponseVariable, MetricResponseVariable],
+        response: Union[TraceResponseVariable, MetricResponseVariable, LoadgenResponseVariable, ResourceResponseVariable],
     ):
         """Gather interaction data between a treatment and a response for the experiment report"""
-        value_column = (
-            "duration"
-            if isinstance(response, TraceResponseVariable)
-            else response.metric_name
-        )
-        display_response_name = (
-            response.name
-            if isinstance(response, MetricResponseVariable)
-            else f"{response.name}.duration"
-        )
+        value_column, display_response_name = self._value_column(response)
         store_key = construct_key(
             experiment_key=experiment.config_filename,
             run_key=experiment.short_id,
@@ -115,8 +172,9 @@ class Reporter:
         test_statistic: str,
         test_performed: str,
         store_key: str,
+        effects: Optional[dict] = None,
     ) -> None:
-        """Populate the interaction dict with interaction data"""
+        """Populate the interaction dict with interaction data, followed by effect sizes and further tests"""
         humanized_treatment_start = self._humanize_timestamp(treatment_start)
         humanized_treatment_end = self._humanize_timestamp(treatment_end)
         humanized_response_start = self._humanize_timestamp(response_start)
@@ -135,6 +193,7 @@ class Reporter:
                 "test_statistic": test_statistic,
                 "test_performed": test_performed,
                 "store_key": store_key,
+                **(effects or {}),
             }
         )
 
@@ -144,13 +203,15 @@ class Reporter:
         return humanize_utc_timestamp(timestamp)
 
     def assemble_interaction_data(self, run_key) -> dict:
-        """Assemble all interaction data for an experiment run"""
+        """Assemble the interaction data gathered since the last run into an experiment run"""
         self.report_data["report"]["runs"][run_key] = {}
         self.report_data["report"]["runs"][run_key]["interactions"] = {}
         for idx, interaction in enumerate(self.interactions):
             self.report_data["report"]["runs"][run_key]["interactions"][
                 f"interaction_{idx}"
             ] = interaction
+        self.statistics.forget(interaction["store_key"] for interaction in self.interactions)
+        self.interactions = []
         return self.report_data
 
     def add_experiment_data(self, runner: ExperimentRunner) -> dict:
@@ -172,8 +233,14 @@ class Reporter:
         self,
         request_stats: locust.stats.RequestStats,
         runner: ExperimentRunner,
+        telemetry: Optional[RequestTelemetry] = None,
     ) -> dict:
-        """Add load generation details to the report"""
+        """
+        Add load generation details and the aggregated requests per endpoint and interval to the report
+
+        Tasks and latencies are keyed by endpoint ids that are the same in every run, and latencies are
+        split into the windows of the treatments of the run.
+        """
         self.report_data["report"]["runs"][runner.short_id]["loadgen"] = {}
         self.report_data["report"]["runs"][runner.short_id]["loadgen"][
             "loadgen_start_time"
@@ -191,11 +258,9 @@ class Reporter:
             "task_details"
         ] = {}
         for entry in request_stats.entries.values():
-            # get a random task identifier
-            task_id = uuid.uuid4().hex[:16]
             self.report_data["report"]["runs"][runner.short_id]["loadgen"][
                 "task_details"
-            ][task_id] = {
+            ][endpoint_id(f"{entry.method} {entry.name}")] = {
                 "url": entry.name,
                 "verb": entry.method,
                 "requests": entry.num_requests,
@@ -207,23 +272,63 @@ class Reporter:
                 "avg_response_time": entry.avg_response_time,
                 "median_response_time": entry.median_response_time,
             }
+        if telemetry is not None:
+            self.report_data["report"]["runs"][runner.short_id]["loadgen"][
+                "telemetry"
+            ] = telemetry.to_report()
+            windows = {
+                treatment.name: (treatment.applied or treatment.start, treatment.end)
+                for treatment in runner.treatments.values()
+                if treatment.start is not None and treatment.end is not None
+            }
+            self.report_data["report"]["runs"][runner.short_id]["loadgen"][
+                "latencies"
+            ] = telemetry.latency_report(windows)
         return self.report_data
 
     def add_accountant_data(self, runner: ExperimentRunner):
-        """Add data from an accountant"""
+        """Add data from an accountant. Pods on Kubernetes additionally report memory, network and energy"""
         self.report_data["report"]["runs"][runner.short_id]["accounting"] = {}
+        if runner.accountant is None:
+            return
         accountant_data = runner.accountant.consolidated_data
         for container_id, container_data in accountant_data.items():
             container_name = container_data["container_name"]
+            accounting = {"cpu_seconds": container_data["total_cpu_usage"]}
+            for field in ACCOUNTING_FIELDS:
+                if field in container_data:
+                    accounting[field] = container_data[field]
             self.report_data["report"]["runs"][runner.short_id]["accounting"][
                 container_name
-            ] = {
-                "cpu_seconds": container_data["total_cpu_usage"],
-                "number_of_cpus": container_data["number_of_cpus"],
-            }
+            ] = accounting
+
+    def add_parameter_data(self, runner: ExperimentRunner) -> dict:
+        """Add the matrix parameters of a run and index the run by its parameter values"""
+        if not runner.parameters:
+            return self.report_data
+        self.report_data["report"]["runs"][runner.short_id]["parameters"] = dict(runner.parameters)
+        cell = self.report_data["report"].setdefault("matrix", {}).setdefault(
+            cell_key(runner.parameters), {"parameters": dict(runner.parameters), "runs": []}
+        )
+        cell["runs"].append(runner.short_id)
+        return self.report_data
+
+    def add_timing_data(self, timer: PhaseTimer, runner: ExperimentRunner = None) -> dict:
+        """Add the recorded phase durations of a run, or of the whole experiment if no runner is given"""
+        if runner is None:
+            self.report_data["report"]["timings"] = timer.summary()
+        else:
+            self.report_data["report"]["runs"][runner.short_id]["timings"] = timer.summary()
+        return self.report_data
+
+    def write_run(self, run_key: str) -> None:
+        """Append a completely reported run to the report file and release its section from memory"""
+        run = self.report_data["report"]["runs"].pop(run_key)
+        self.stream.append_run(run_key=run_key, run=run)
 
     def dump_report_data(self):
-        # report name has current time in it
-        with open(self.report_path + self.report_file_name , "w+") as fp:
-            contents = yaml.dump(self.report_data, sort_keys=False)
-            fp.write(contents)
+        """Write all runs that were not written yet and close the report file with its index"""
+        for run_key in list(self.report_data["report"]["runs"]):
+            self.write_run(run_key=run_key)
+        report = {key: value for key, value in self.report_data["report"].items() if key != "runs"}
+        self.stream.close(report=report)
@@ -0,0 +1,121 @@
+"""
+Purpose: Streams experiment reports to disk while the experiment runs.
+Functionality: Appends the section of every finished run as its own YAML document and closes the stream
+with a compact index of the experiment, so that a report grows linearly and survives a crash.
+Connection: Written by the Reporter after every run and read back by the evaluation of reports.
+
+Append-only experiment report streams"""
+import logging
+import os
+from typing import Dict, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+INDEX_TRAILER = "# index at "
+"""Comment that closes a report with the byte offset of its index document"""
+
+
+class ReportStream:
+    """
+    Append-only stream of YAML documents that make up an experiment report
+
+    Every run is one document with its run key and its section of the report, written and synced to disk as
+    soon as the run is reported. The last document holds the top level data of the report and an index of the
+    byte range of every run, followed by a trailer comment with the offset of the index. A stream without an
+    index is the report of an experiment that did not finish, and still holds all runs that did.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        """Path of the report file"""
+        self.offset = 0
+        """Number of bytes written so far"""
+        self.index: Dict[str, dict] = {}
+        """Byte offset and length of every run document by run key"""
+        self.closed = False
+        """If the index was written"""
+
+    def __repr__(self):
+        return f"ReportStream(path={self.path}, runs={len(self.index)})"
+
+    def _append(self, document: dict) -> int:
+        contents = yaml.dump(document, sort_keys=False, explicit_start=True).encode("utf-8")
+        # an existing report at the same path is overwritten by the first document
+        with open(self.path, "ab" if self.offset else "wb") as fp:
+            fp.write(contents)
+            fp.flush()
+            os.fsync(fp.fileno())
+        offset = self.offset
+        self.offset += len(contents)
+        return offset
+
+    def append_run(self, run_key: str, run: dict) -> None:
+        """Append the report section of a finished run"""
+        assert not self.closed, "Cannot append runs to a closed report"
+        offset = self._append({"run_key": run_key, "run": run})
+        self.index[run_key] = {"offset": offset, "length": self.offset - offset}
+        logger.debug(f"Appended run {run_key} to report {self.path}")
+
+    def close(self, report: dict) -> None:
+        """Write the top level data of the report and the index of all runs"""
+        if self.closed:
+            return
+        offset = self._append({"report": {**report, "index": self.index}})
+        with open(self.path, "a") as fp:
+            fp.write(f"{INDEX_TRAILER}{offset}\n")
+        self.closed = True
+
+
+def read_index(path: str) -> Optional[dict]:
+    """Return the index document of a report without reading its runs, or None if the report was not closed"""
+    with open(path, "rb") as fp:
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+        fp.seek(max(size - 64, 0))
+        tail = fp.read().decode("utf-8").rstrip("\n").rsplit("\n", 1)[-1]
+        if not tail.startswith(INDEX_TRAILER):
+            return None
+        fp.seek(int(tail[len(INDEX_TRAILER):]))
+        return yaml.safe_load(fp.read().decode("utf-8"))["report"]
+
+
+def read_run(path: str, run_key: str) -> dict:
+    """Return the report section of a single run of a closed report"""
+    index = read_index(path)
+    if index is None or run_key not in index["index"]:
+        raise KeyError(f"Run {run_key} is not indexed in report {path}")
+    entry = index["index"][run_key]
+    with open(path, "rb") as fp:
+        fp.seek(entry["offset"])
+        return yaml.safe_load(fp.read(entry["length"]).decode("utf-8"))["run"]
+
+
+def read_report(path: str) -> dict:
+    """
+    Read a report into a single dict with all runs under report.runs
+
+    Reads both report streams and reports written as a single YAML document. If the experiment did not finish,
+    the report holds the runs that were written before, and a run that was cut off while writing is skipped.
+    """
+    report = {"report": {"runs": {}}}
+    with open(path, "r") as fp:
+        documents = yaml.safe_load_all(fp)
+        while True:
+            try:
+                document = next(documents)
+            except StopIteration:
+                break
+            except yaml.YAMLError as e:
+                logger.warning(f"Skipping the incomplete end of report {path}: {e}")
+                break
+            if not document:
+                continue
+            if "run_key" in document:
+                report["report"]["runs"][document["run_key"]] = document["run"]
+            elif "report" in document:
+                runs = document["report"].pop("runs", None) or {}
+                report["report"].update(document["report"])
+                report["report"]["runs"].update(runs)
+    return report
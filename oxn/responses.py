@@ -5,16 +5,19 @@ Connection: Used by the Observer to collect and process response variables durin
 
 Implementations of Response Variables"""
 import datetime
+from typing import Optional
 
 import numpy as np
 import pandas as pd
 
 from .models.orchestrator import Orchestrator
 import oxn.utils as utils
-from .errors import PrometheusException, JaegerException
+from .errors import OxnException, PrometheusException, JaegerException
 from .models.response import ResponseVariable
 from .jaeger import Jaeger
 from .prometheus import Prometheus
+from .sampler import ResourceSampler, STATISTICS as RESOURCE_STATISTICS
+from .telemetry import RequestTelemetry, STATISTICS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -392,3 +395,189 @@ class TraceResponseVariable(ResponseVariable):
             # TODO handle this better
             self.data = pd.DataFrame(columns=['start_time'])
             raise e
+
+
+class LoadgenResponseVariable(ResponseVariable):
+    """
+    Response variable for the requests of the load generation
+
+    Observes the requests per second, failures and response time percentiles per endpoint and second that
+    the load generator aggregated during the run, so no Prometheus has to scrape the load generator.
+    The column named like the response holds the statistic selected in the experiment spec.
+    Locust workers report every few seconds, so with distributed load generation the right window should
+    cover at least one report interval.
+    """
+
+    def __init__(
+            self,
+            telemetry: Optional[RequestTelemetry],
+            name: str,
+            experiment_start: float,
+            experiment_end: float,
+            right_window: str,
+            left_window: str,
+            description: dict,
+    ):
+        super().__init__(
+            experiment_start=experiment_start,
+            experiment_end=experiment_end,
+        )
+        self.telemetry = telemetry
+        """Aggregated requests of the load generator"""
+        self.name = name
+        """User-defined name of the response variable"""
+        self.description = description
+        """Description of the response from the experiment spec"""
+        self.statistic = description.get("statistic", "requests_per_second")
+        """Statistic to compare between treatment and control, e.g. requests_per_second or p99"""
+        self.endpoint = description.get("endpoint")
+        """Optional endpoint to observe, either the name of the request or verb and name, e.g. GET /api/cart"""
+        self.start = self.experiment_start - utils.time_string_to_seconds(
+            description["left_window"]
+        )
+        """Timestamp of the start of the observation period relative to experiment start"""
+        self.end = self.experiment_end + utils.time_string_to_seconds(
+            description["right_window"]
+        )
+        """Timestamp of the end of the observation period relative to experiment end"""
+        self.right_window = right_window
+        self.left_window = left_window
+
+    def __repr__(self):
+        return (
+            f"LoadgenResponse(name={self.name}, statistic={self.statistic}, "
+            f"start={utils.humanize_utc_timestamp(self.start)}, end={utils.humanize_utc_timestamp(self.end)})"
+        )
+
+    @property
+    def short_id(self) -> str:
+        return self.id[:8]
+
+    def label(
+            self,
+            treatment_start: float,
+            treatment_end: float,
+            label_column: str,
+            label: str,
+    ) -> None:
+        """Label intervals by their start, which is a timestamp in seconds"""
+        if self.data is None or self.data.empty:
+            # keep the value column and a column per treatment, so that the comparisons of the response are missing
+            columns = [] if self.data is None else list(self.data.columns)
+            self.data = pd.DataFrame(columns=list(dict.fromkeys(["timestamp", self.name, *columns, label_column])))
+            return
+
+        predicate = self.data["timestamp"].between(treatment_start, treatment_end)
+        self.data[label_column] = np.where(predicate, label, "NoTreatment")
+
+    def _matches(self, endpoint: str) -> bool:
+        return self.endpoint is None or endpoint == self.endpoint or endpoint.split(" ", 1)[-1] == self.endpoint
+
+    def observe(self) -> pd.DataFrame:
+        """Tabulate the aggregated requests of the observation period"""
+        if self.telemetry is None:
+            self.data = pd.DataFrame(columns=['timestamp'])
+            raise OxnException(
+                message=f"Can't observe {self.name}",
+                explanation="The load generator did not aggregate any requests",
+            )
+        rows = [row for row in self.telemetry.rows(start=self.start, end=self.end) if self._matches(row["endpoint"])]
+        for row in rows:
+            row[self.name] = row[self.statistic]
+        columns = ["timestamp", "endpoint", *STATISTICS, self.name]
+        dataframe = pd.DataFrame(columns=list(dict.fromkeys(columns)), data=rows)
+        dataframe.set_index(
+            pd.to_datetime(dataframe.timestamp, utc=True, unit="s"), inplace=True
+        )
+        self.data = dataframe
+        return dataframe
+
+
+class ResourceResponseVariable(ResponseVariable):
+    """
+    Response variable for the resource usage of the sue containers
+
+    Observes the cpu, memory, network and block io statistics per container that the resource sampler read
+    during the run. The column named like the response holds the statistic selected in the experiment spec.
+    """
+
+    def __init__(
+            self,
+            sampler: Optional[ResourceSampler],
+            name: str,
+            experiment_start: float,
+            experiment_end: float,
+            right_window: str,
+            left_window: str,
+            description: dict,
+    ):
+        super().__init__(
+            experiment_start=experiment_start,
+            experiment_end=experiment_end,
+        )
+        self.sampler = sampler
+        """Background sampler of the container resources"""
+        self.name = name
+        """User-defined name of the response variable"""
+        self.description = description
+        """Description of the response from the experiment spec"""
+        self.statistic = description.get("statistic", "cpu_cores")
+        """Statistic to compare between treatment and control, e.g. cpu_cores or memory_bytes"""
+        self.container = description.get("container")
+        """Optional container to observe. All sampled containers are observed by default"""
+        self.start = self.experiment_start - utils.time_string_to_seconds(
+            description["left_window"]
+        )
+        """Timestamp of the start of the observation period relative to experiment start"""
+        self.end = self.experiment_end + utils.time_string_to_seconds(
+            description["right_window"]
+        )
+        """Timestamp of the end of the observation period relative to experiment end"""
+        self.right_window = right_window
+        self.left_window = left_window
+
+    def __repr__(self):
+        return (
+            f"ResourceResponse(name={self.name}, statistic={self.statistic}, "
+            f"start={utils.humanize_utc_timestamp(self.start)}, end={utils.humanize_utc_timestamp(self.end)})"
+        )
+
+    @property
+    def short_id(self) -> str:
+        return self.id[:8]
+
+    def label(
+            self,
+            treatment_start: float,
+            treatment_end: float,
+            label_column: str,
+            label: str,
+    ) -> None:
+        """Label samples by their timestamp in seconds"""
+        if self.data is None or self.data.empty:
+            # keep the value column and a column per treatment, so that the comparisons of the response are missing
+            columns = [] if self.data is None else list(self.data.columns)
+            self.data = pd.DataFrame(columns=list(dict.fromkeys(["timestamp", self.name, *columns, label_column])))
+            return
+
+        predicate = self.data["timestamp"].between(treatment_start, treatment_end)
+        self.data[label_column] = np.where(predicate, label, "NoTreatment")
+
+    def observe(self) -> pd.DataFrame:
+        """Tabulate the resource samples of the observation period"""
+        if self.sampler is None:
+            self.data = pd.DataFrame(columns=['timestamp'])
+            raise OxnException(
+                message=f"Can't observe {self.name}",
+                explanation="No resources of sue containers were sampled, resource responses need docker compose",
+            )
+        rows = self.sampler.rows(start=self.start, end=self.end, container=self.container)
+        for row in rows:
+            row[self.name] = row[self.statistic]
+        columns = ["timestamp", "container", *RESOURCE_STATISTICS, self.name]
+        dataframe = pd.DataFrame(columns=list(dict.fromkeys(columns)), data=rows)
+        dataframe.set_index(
+            pd.to_datetime(dataframe.timestamp, utc=True, unit="s"), inplace=True
+        )
+        self.data = dataframe
+        return dataframe
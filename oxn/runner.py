@@ -10,7 +10,7 @@ import time
 import uuid
 import hashlib
 import datetime
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 import psutil
 
@@ -40,7 +40,10 @@ from .treatments import (
 )
 from . import utils
 from .observer import Observer
-from .pricing import Accountant
+from .pricing import Accountant, KubernetesAccountant
+from .sampler import ResourceSampler
+from .timeline import TreatmentTimeline
+from .timing import PhaseTimer, TREATMENTS
 from .utils import utc_timestamp
 from .models.treatment import Treatment
 from .models.orchestrator import Orchestrator
@@ -91,6 +94,10 @@ class ExperimentRunner:
             additional_treatments=None,
             random_treatment_order=False,
             accountant_names=None,
+            timer=None,
+            parameters=None,
+            telemetry=None,
+            accounting=False,
     ):
         self.orchestrator = orchestrator
         self.config = config
@@ -101,20 +108,39 @@ class ExperimentRunner:
         """Random and unique ID to identify runs"""
         self.treatments = {}  # since python 3.6 dict remembers order of insertion
         """Treatments to execute for this run"""
+        self.treatment_offsets = {}
+        """Start offsets in seconds for treatments that should run on a timeline"""
         self.experiment_start = None
         """Experiment start as UTC unix timestamp in seconds"""
         self.experiment_end = None
         """Experiment end as UTC unix timestamp in seconds"""
+        self.on_treatments_start: Optional[Callable[[float], None]] = None
+        """Called with the UTC unix timestamp at which the runtime treatments start, e.g. to align load stages"""
         self.random_treatment_order = random_treatment_order
         """If the treatments should be executed in random order"""
         self.additional_treatments = (
             additional_treatments if additional_treatments else []
         )
         """Additional user-supplied treatments"""
-        self.observer = Observer(orchestrator=self.orchestrator, config=self.config)
+        self.parameters = parameters if parameters else {}
+        """Matrix parameter values this run was rendered with"""
+        self.timer = timer if timer else PhaseTimer()
+        """Timer that records the durations of the phases of this run"""
+        self.sampler = self._build_sampler()
+        """Background sampler of the sue containers if a response observes their resources"""
+        self.observer = Observer(
+            orchestrator=self.orchestrator, config=self.config, telemetry=telemetry, sampler=self.sampler
+        )
         """Observer for response variables"""
         self.accountant = None
-        if accountant_names:
+        if accounting and self.orchestrator.get_orchestrator_type() == "kubernetes":
+            self.accountant = KubernetesAccountant(
+                orchestrator=self.orchestrator,
+                process=psutil.Process(),
+                namespaces=self.orchestrator.relevant_namespaces(),
+                sue_namespace=self.orchestrator.sue_namespace,
+            )
+        elif accountant_names:
             self.accountant = Accountant(
                 client=docker.from_env(),
                 container_names=accountant_names,
@@ -171,9 +197,25 @@ class ExperimentRunner:
             self.treatments[key] = self._build_treatment(
                 action=action, params=params, name=key, orchestrator=self.orchestrator
             )
+            if "start" in description:
+                offset = self._parse_offset(name=key, offset=description["start"])
+                if self.treatments[key].is_runtime():
+                    self.treatment_offsets[key] = offset
+                else:
+                    logger.warning("Ignoring start offset of compile time treatment %s", key)
             logger.debug("Successfully built treatment %s", self.treatments[key])
         logger.info("Built %s treatments: %s", len(self.treatments), self.treatments.keys())
 
+    @staticmethod
+    def _parse_offset(name, offset) -> float:
+        """Parse the start offset of a treatment into seconds"""
+        if not isinstance(offset, str) or not utils.validate_time_string(offset):
+            raise OxnException(
+                message=f"Error while building treatment {name}",
+                explanation=f"Start offset {offset} has to match {utils.time_string_format_regex}",
+            )
+        return utils.time_string_to_seconds(offset)
+
     def _build_treatment(self, action, params, name, orchestrator) -> Treatment:
         """Build a single treatment from a description"""
         treatment_class = self.treatment_keys.get(action)
@@ -207,48 +249,130 @@ class ExperimentRunner:
         logger.info("Starting compile time treatments")
         for treatment in self._get_compile_time_treatments():
             treatment.start = utc_timestamp()
-            treatment.inject()
+            with self.timer.phase("inject", category=TREATMENTS, target=treatment.name):
+                treatment.inject()
+
+    def adopt_compile_time_treatments(self, applied: Dict[str, Treatment]) -> None:
+        """Take over the compile time treatments that an earlier run left applied on a reused sue"""
+        for treatment in self._get_compile_time_treatments():
+            treatment.start = applied[treatment.name].start
+            treatment.applied = applied[treatment.name].applied
 
-    def clean_compile_time_treatments(self) -> None:
-        logger.info("Cleaning compile time treatments")
+    def clean_compile_time_treatments(self, keep=False, applied: Optional[Dict[str, Treatment]] = None) -> None:
+        """
+        Clean compile time treatments
+
+        If keep is set, the treatments stay applied for the next run and only their end is recorded.
+        If the treatments were injected by an earlier run, the applied instances of that run are cleaned,
+        since they hold the state needed to undo the treatment.
+        """
+        logger.info("Cleaning compile time treatments" if not keep else "Keeping compile time treatments applied")
         for treatment in self._get_compile_time_treatments():
             treatment.end = utc_timestamp()
-            treatment.clean()
+            if keep:
+                continue
+            target = applied.get(treatment.name, treatment) if applied else treatment
+            target.end = treatment.end
+            with self.timer.phase("clean", category=TREATMENTS, target=treatment.name):
+                target.clean()
+
+    def _build_sampler(self) -> Optional[ResourceSampler]:
+        """Build a resource sampler that samples as often as the most frequent resource response asks for"""
+        responses = [
+            response for response in self.config["experiment"].get("responses", []) if response["type"] == "resources"
+        ]
+        if not responses:
+            return None
+        if self.orchestrator.get_orchestrator_type() != "docker-compose":
+            logger.warning("Resource responses need docker compose orchestration, not sampling resources")
+            return None
+        interval = min(utils.time_string_to_seconds(response.get("interval", "1s")) for response in responses)
+        return ResourceSampler(containers={}, interval=interval)
+
+    def start_sampling(self) -> None:
+        """Start sampling the resources of the running sue containers"""
+        if not self.sampler:
+            return
+        containers = {}
+        for name in self.orchestrator.translate_compose_names(self.orchestrator.sue_service_names):
+            if not name:
+                continue
+            try:
+                containers[name] = self.orchestrator.get_container(name)
+            except docker.errors.NotFound:
+                logger.warning(f"Container {name} is not running, not sampling its resources")
+        self.sampler.containers = containers
+        self.sampler.start()
+
+    def stop_sampling(self) -> None:
+        if self.sampler:
+            self.sampler.stop()
 
     def execute_runtime_treatments(self) -> None:
         """
         Execute one run of the experiment
         A single experiment run is defined as one execution of all treatments and one observation of all responses
         """
+        self.start_sampling()
         if self.accountant:
-            self.accountant.read_all_containers()
-            self.accountant.read_oxn()
+            with self.timer.phase("accounting"):
+                self.accountant.read_all_containers()
+                self.accountant.read_oxn()
         ttw_left = self.observer.time_to_wait_left()
         logger.info(f"Sleeping for {ttw_left} seconds")
-        time.sleep(ttw_left)
+        with self.timer.phase("left_window"):
+            time.sleep(ttw_left)
         logger.info(f"Starting runtime treatments")
-        for treatment in self._get_runtime_treatments():
-            treatment.start = utc_timestamp()
-            treatment.inject()
-            treatment.clean()
-            treatment.end = utc_timestamp()
+        if self.on_treatments_start:
+            self.on_treatments_start(utc_timestamp())
+        if self.treatment_offsets:
+            with self.timer.phase("timeline"):
+                self._build_timeline().run()
+        else:
+            for treatment in self._get_runtime_treatments():
+                treatment.start = utc_timestamp()
+                with self.timer.phase("inject", category=TREATMENTS, target=treatment.name):
+                    treatment.inject()
+                with self.timer.phase("clean", category=TREATMENTS, target=treatment.name):
+                    treatment.clean()
+                treatment.end = utc_timestamp()
         logger.info(f"Injected treatments")
 
+    def _build_timeline(self) -> TreatmentTimeline:
+        """
+        Build a timeline from the runtime treatments
+
+        As soon as one treatment defines a start offset, all runtime treatments are placed on the timeline.
+        Treatments without a start offset start together with the timeline.
+        """
+        return TreatmentTimeline(
+            entries=[
+                (self.treatment_offsets.get(treatment.name, 0.0), treatment)
+                for treatment in self._get_runtime_treatments()
+            ],
+            timer=self.timer,
+        )
+
     def observe_response_variables(self) -> None:
         self.observer.initialize_variables()
         ttw_right = self.observer.time_to_wait_right()
         logger.info(f"Sleeping for {ttw_right} seconds")
-        time.sleep(ttw_right)
-        self.observer.observe()
+        with self.timer.phase("right_window"):
+            time.sleep(ttw_right)
+        self.stop_sampling()
+        with self.timer.phase("observe"):
+            self.observer.observe(timer=self.timer)
         logger.info("Observed response variables")
-        self._label()
+        with self.timer.phase("label"):
+            self._label()
         if self.accountant:
-            self.accountant.read_all_containers()
-            logger.debug(
-                f"Read container resource data for {self.accountant.container_names}"
-            )
-            self.accountant.read_oxn()
-            self.accountant.consolidate()
+            with self.timer.phase("accounting"):
+                self.accountant.read_all_containers()
+                logger.debug(
+                    f"Read container resource data for {self.accountant.container_names}"
+                )
+                self.accountant.read_oxn()
+                self.accountant.consolidate()
 
     def clear(self) -> None:
         """Clear the storage of the runner"""
@@ -258,11 +382,13 @@ class ExperimentRunner:
     def _label(self) -> None:
         """Label the observed data with information from the treatments"""
         for treatment in self.treatments.values():
+            # label from the moment the treatment took effect on all targets if the treatment knows it
+            treatment_start = treatment.applied or treatment.start
             for response_id, response_variable in self.observer.variables().items():
                 try:
                     response_variable.label(
                         treatment_end=treatment.end,
-                        treatment_start=treatment.start,
+                        treatment_start=treatment_start,
                         label_column=treatment.name,
                         label=treatment.name,
                     )
@@ -0,0 +1,258 @@
+"""
+Purpose: Samples the resource usage of the sue containers in the background.
+Functionality: Reads cpu, memory, network and block io of all containers at a fixed interval, straight from
+their cgroup v2 files where the host exposes them and from the docker stats api otherwise.
+Connection: Started by the Runner for the observation period and read by resource response variables, so that
+the cost of observability can be labeled per treatment window.
+
+Background resource sampling of sue containers"""
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import docker.errors
+import gevent
+from gevent.pool import Group
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+"""Mount point of the cgroup v2 hierarchy"""
+CGROUP_PATHS = ["system.slice/docker-{id}.scope", "docker/{id}"]
+"""Cgroups of docker containers with the systemd and the cgroupfs cgroup driver"""
+PROC_ROOT = "/proc"
+"""Mount point of procfs, which holds the network counters of the network namespace of a container"""
+
+COUNTERS = ["cpu_seconds", "network_rx_bytes", "network_tx_bytes", "block_read_bytes", "block_write_bytes"]
+"""Cumulative counters of a sample"""
+STATISTICS = [
+    "cpu_cores",
+    "memory_bytes",
+    "network_rx_bytes_per_second",
+    "network_tx_bytes_per_second",
+    "block_read_bytes_per_second",
+    "block_write_bytes_per_second",
+]
+"""Statistics computed for every container and pair of consecutive samples"""
+
+
+def cgroup_path(container_id: str, root: str = CGROUP_ROOT) -> Optional[str]:
+    """Return the cgroup v2 directory of a docker container, if the host exposes it"""
+    for candidate in CGROUP_PATHS:
+        path = os.path.join(root, candidate.format(id=container_id))
+        if os.path.isfile(os.path.join(path, "cpu.stat")):
+            return path
+    return None
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    with open(path) as keyed:
+        return {key: int(value) for key, value in (line.split() for line in keyed if line.strip())}
+
+
+def read_cgroup(path: str) -> dict:
+    """Read cpu, memory and block io of a cgroup v2 directory"""
+    cpu = _read_keyed(os.path.join(path, "cpu.stat"))
+    with open(os.path.join(path, "memory.current")) as memory:
+        memory_bytes = int(memory.read())
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(path, "io.stat")) as io:
+            for line in io:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+    except FileNotFoundError:
+        # the io controller is not enabled for the cgroup
+        pass
+    return {
+        "cpu_seconds": cpu["usage_usec"] / 10 ** 6,
+        "memory_bytes": memory_bytes,
+        "block_read_bytes": read_bytes,
+        "block_write_bytes": write_bytes,
+    }
+
+
+def read_network(pid: int, root: str = PROC_ROOT) -> dict:
+    """Read the received and transmitted bytes of all interfaces but loopback in the network namespace of a process"""
+    rx_bytes = tx_bytes = 0
+    with open(os.path.join(root, str(pid), "net", "dev")) as dev:
+        # the first two lines are headers
+        for line in list(dev)[2:]:
+            interface, _, counters = line.partition(":")
+            if interface.strip() == "lo":
+                continue
+            fields = counters.split()
+            rx_bytes += int(fields[0])
+            tx_bytes += int(fields[8])
+    return {"network_rx_bytes": rx_bytes, "network_tx_bytes": tx_bytes}
+
+
+def read_docker_stats(stats: dict) -> dict:
+    """Convert a reading of the docker stats api into a sample"""
+    networks = (stats.get("networks") or {}).values()
+    block_io = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    return {
+        "cpu_seconds": stats["cpu_stats"]["cpu_usage"]["total_usage"] / 10 ** 9,
+        "memory_bytes": (stats.get("memory_stats") or {}).get("usage", 0),
+        "network_rx_bytes": sum(network["rx_bytes"] for network in networks),
+        "network_tx_bytes": sum(network["tx_bytes"] for network in networks),
+        "block_read_bytes": sum(entry["value"] for entry in block_io if entry["op"].lower() == "read"),
+        "block_write_bytes": sum(entry["value"] for entry in block_io if entry["op"].lower() == "write"),
+    }
+
+
+class ResourceSampler:
+    """
+    Sample the resource usage of containers at a fixed interval
+
+    Every interval, all containers are read concurrently. Reading the cgroup files of a container takes
+    microseconds, while the docker stats api takes up to two seconds per container, so the docker fallback
+    only keeps up with intervals of a few seconds. Samples hold cumulative counters, the statistics are
+    computed from consecutive samples.
+    """
+
+    def __init__(
+            self,
+            containers: dict,
+            interval: float = 1.0,
+            cgroup_root: str = CGROUP_ROOT,
+            proc_root: str = PROC_ROOT,
+    ):
+        assert interval > 0, "Interval must be positive"
+        self.containers = containers
+        """Docker containers to sample by container name"""
+        self.interval = interval
+        """Time between two samples in seconds"""
+        self.cgroup_root = cgroup_root
+        """Mount point of the cgroup v2 hierarchy"""
+        self.proc_root = proc_root
+        """Mount point of procfs"""
+        self.samples: List[dict] = []
+        """Samples of all containers in the order they were taken"""
+        self.sources: Dict[str, str] = {}
+        """Where the samples of a container come from, cgroup or docker"""
+        self.greenlet: Optional[gevent.Greenlet] = None
+        """Greenlet that samples at every interval"""
+
+    def __repr__(self):
+        return f"ResourceSampler(containers={len(self.containers)}, interval={self.interval}, samples={len(self.samples)})"
+
+    def _read_cgroup(self, container) -> dict:
+        path = cgroup_path(container.id, root=self.cgroup_root)
+        if path is None:
+            raise FileNotFoundError(f"No cgroup for container {container.name}")
+        sample = read_cgroup(path)
+        try:
+            sample.update(read_network(container.attrs["State"]["Pid"], root=self.proc_root))
+        except OSError:
+            # the container was restarted with a new pid, read it for the next sample
+            container.reload()
+            sample.update({"network_rx_bytes": None, "network_tx_bytes": None})
+        return sample
+
+    @staticmethod
+    def _read_docker(container) -> dict:
+        try:
+            stats = container.stats(stream=False, one_shot=True)
+        except docker.errors.InvalidVersion:
+            stats = container.stats(stream=False)
+        return read_docker_stats(stats)
+
+    def _sample_container(self, name: str, container, timestamp: float) -> None:
+        source = self.sources.get(name)
+        try:
+            if source != "docker":
+                try:
+                    sample = self._read_cgroup(container)
+                    source = "cgroup"
+                except (OSError, KeyError, ValueError):
+                    if source == "cgroup":
+                        raise
+                    source = "docker"
+            if source == "docker":
+                sample = self._read_docker(container)
+        except (OSError, KeyError, ValueError, docker.errors.APIError) as e:
+            logger.warning(f"Could not sample the resources of {name}: {e}")
+            return
+        if name not in self.sources:
+            logger.info(f"Sampling resources of {name} from {source}")
+        self.sources[name] = source
+        self.samples.append({"timestamp": timestamp, "container": name, **sample})
+
+    def sample(self) -> None:
+        """Read all containers concurrently once"""
+        timestamp = time.time()
+        group = Group()
+        for name, container in self.containers.items():
+            group.spawn(self._sample_container, name, container, timestamp)
+        group.join()
+
+    def _run(self) -> None:
+        origin = time.monotonic()
+        ticks = 0
+        while True:
+            self.sample()
+            ticks += 1
+            # keep the grid of the first sample, skipping intervals that slow reads overran
+            delay = origin + ticks * self.interval - time.monotonic()
+            if delay < 0:
+                ticks += int(-delay // self.interval) + 1
+                delay = origin + ticks * self.interval - time.monotonic()
+            gevent.sleep(delay)
+
+    def start(self) -> None:
+        if self.greenlet is None:
+            self.greenlet = gevent.spawn(self._run)
+
+    def stop(self) -> None:
+        """Stop sampling and take a final sample"""
+        if self.greenlet is None:
+            return
+        self.greenlet.kill()
+        self.greenlet = None
+        self.sample()
+
+    def rows(self, start: float, end: float, container: Optional[str] = None) -> List[dict]:
+        """
+        Return the statistics of every container between consecutive samples that were taken within a window
+
+        Rates cover the time since the previous sample of the container and are timestamped with the later sample.
+        """
+        previous: Dict[str, dict] = {}
+        rows = []
+        for sample in self.samples:
+            name = sample["container"]
+            if container is not None and name != container:
+                continue
+            before = previous.get(name)
+            previous[name] = sample
+            if before is None or not start <= sample["timestamp"] <= end:
+                continue
+            elapsed = sample["timestamp"] - before["timestamp"]
+            if elapsed <= 0:
+                continue
+            rates = {}
+            for counter in COUNTERS:
+                # counters start over when a container restarts, so its rate across the restart is unknown
+                if sample[counter] is None or before[counter] is None or sample[counter] < before[counter]:
+                    rates[counter] = float("nan")
+                else:
+                    rates[counter] = (sample[counter] - before[counter]) / elapsed
+            rows.append(
+                {
+                    "timestamp": sample["timestamp"],
+                    "container": name,
+                    "cpu_cores": rates["cpu_seconds"],
+                    "memory_bytes": sample["memory_bytes"],
+                    "network_rx_bytes_per_second": rates["network_rx_bytes"],
+                    "network_tx_bytes_per_second": rates["network_tx_bytes"],
+                    "block_read_bytes_per_second": rates["block_read_bytes"],
+                    "block_write_bytes_per_second": rates["block_write_bytes"],
+                }
+            )
+        return rows
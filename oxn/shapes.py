@@ -0,0 +1,183 @@
+"""
+Purpose: Shapes the load of the locust file load generation over time.
+Functionality: Compiles ramp, step, spike and replay shapes into stages and changes the number of closed-loop
+users exactly at the stage boundaries, optionally relative to the start of the runtime treatments.
+Connection: Used by the LocustFileLoadgenerator for closed-loop stages and by the open-loop driver for rates.
+
+Load shapes of the load generation"""
+import csv
+import logging
+import time
+from typing import List, Optional, Union
+
+import gevent
+
+from .errors import LocustException
+from .utils import time_string_to_seconds
+
+logger = logging.getLogger(__name__)
+
+SHAPES = ["ramp", "step", "spike", "replay"]
+"""Supported load shapes"""
+ANCHORS = ["loadgen", "treatments"]
+"""Points in time the stages are relative to"""
+
+
+def _seconds(value: Union[str, int, float]) -> float:
+    """Return a duration in seconds from a time string like 30s or a number of seconds"""
+    if isinstance(value, str):
+        return time_string_to_seconds(value)
+    return float(value)
+
+
+def _ramp(shape: dict, key: str) -> List[dict]:
+    duration = _seconds(shape["duration"])
+    return [
+        {"duration": 0, key: shape.get("from", 0)},
+        {"duration": duration, key: shape["to"], "ramp": True},
+    ]
+
+
+def _step(shape: dict, key: str) -> List[dict]:
+    step_duration = _seconds(shape["step_duration"])
+    return [
+        {"duration": step_duration * (idx + 1), key: shape.get("from", 0) + shape["step"] * idx}
+        for idx in range(shape["steps"])
+    ]
+
+
+def _spike(shape: dict, key: str) -> List[dict]:
+    at = _seconds(shape["at"])
+    return [
+        {"duration": at, key: shape["base"]},
+        {"duration": at + _seconds(shape["duration"]), key: shape["peak"]},
+        {"duration": at + _seconds(shape["duration"]), key: shape["base"]},
+    ]
+
+
+def _replay(shape: dict, key: str) -> List[dict]:
+    """Read a recorded curve with one row per resolution seconds, e.g. the requests per second of production"""
+    column = shape.get("column", key)
+    resolution = _seconds(shape.get("resolution", 1))
+    scale = shape.get("scale", 1)
+    try:
+        with open(shape["path"], newline="") as recording:
+            values = [float(row[column]) * scale for row in csv.DictReader(recording)]
+    except (OSError, KeyError, ValueError) as e:
+        raise LocustException(
+            message=f"Could not replay the load recorded in {shape['path']}",
+            explanation=f"Expected a csv file with a numeric column {column}: {e}",
+        )
+    if not values:
+        raise LocustException(message=f"Recording {shape['path']} is empty", explanation="Nothing to replay")
+    if key == "users":
+        values = [round(value) for value in values]
+    return [{"duration": resolution * (idx + 1), key: value} for idx, value in enumerate(values)]
+
+
+def build_stages(shape: dict) -> List[dict]:
+    """
+    Compile a load shape into stages
+
+    Stages end at their duration in seconds since the start of the stages, like the stages of the legacy
+    load generator. A stage that ramps changes linearly from the level of the previous stage to its own level,
+    all other stages change immediately. The shape defines users by default, or rates for open-loop load if
+    its unit is rate. Replays always define rates unless their unit is users.
+    """
+    kind = shape.get("type")
+    if kind not in SHAPES:
+        raise LocustException(message=f"Unknown load shape {kind}", explanation=f"Use one of {SHAPES}")
+    key = shape.get("unit", "rate" if kind == "replay" else "users")
+    if key not in ("users", "rate"):
+        raise LocustException(message=f"Unknown load shape unit {key}", explanation="Use users or rate")
+    builders = {"ramp": _ramp, "step": _step, "spike": _spike, "replay": _replay}
+    stages = builders[kind](shape, key)
+    if key == "users" and "spawn_rate" in shape:
+        for stage in stages:
+            stage["spawn_rate"] = shape["spawn_rate"]
+    return stages
+
+
+def stage_index(stages: List[dict], offset: float) -> int:
+    """Return the index of the stage at an offset in seconds. The last stage lasts until the load generation stops"""
+    for idx, stage in enumerate(stages):
+        if offset < stage["duration"]:
+            return idx
+    return len(stages) - 1
+
+
+def level_at(stages: List[dict], key: str, offset: float) -> float:
+    """Return the number of users or the rate that the stages define at an offset in seconds"""
+    idx = stage_index(stages, offset)
+    stage = stages[idx]
+    if not stage.get("ramp"):
+        return stage[key]
+    previous_level = stages[idx - 1][key] if idx else 0
+    previous_end = stages[idx - 1]["duration"] if idx else 0
+    length = stage["duration"] - previous_end
+    fraction = min(max((offset - previous_end) / length, 0.0), 1.0) if length > 0 else 1.0
+    return previous_level + (stage[key] - previous_level) * fraction
+
+
+class StageScheduler:
+    """
+    Change the number of users of a locust runner at the boundaries of closed-loop stages
+
+    Unlike a locust LoadTestShape, which is polled once per second, every stage starts at its exact offset.
+    A stage that ramps spawns or stops its users at the rate that reaches its number of users at its end,
+    other stages use their spawn rate. Until the scheduler is anchored, the runner holds the users of the first
+    stage, and after the last stage it holds the users of the last stage until the load generation stops.
+    """
+
+    def __init__(self, runner, stages: List[dict], default_spawn_rate: float = 10):
+        self.runner = runner
+        """The locust runner whose users change"""
+        self.stages = stages
+        """Closed-loop stages with their end in seconds and their users"""
+        self.default_spawn_rate = default_spawn_rate
+        """Spawn rate of stages that change immediately and do not define a spawn rate"""
+        self.origin: Optional[float] = None
+        """Unix timestamp the stage offsets are relative to"""
+        self.greenlet: Optional[gevent.Greenlet] = None
+        """Greenlet that starts the stages"""
+
+    def _spawn_rate(self, idx: int) -> float:
+        stage = self.stages[idx]
+        previous_users = self.stages[idx - 1]["users"] if idx else 0
+        if stage.get("ramp"):
+            length = stage["duration"] - (self.stages[idx - 1]["duration"] if idx else 0)
+            change = abs(stage["users"] - previous_users)
+            if length > 0 and change:
+                return change / length
+        return stage.get("spawn_rate", self.default_spawn_rate)
+
+    def start(self, hold: bool = False) -> None:
+        """Start the stages now, or only start the users of the first stage until the scheduler is anchored"""
+        if hold:
+            self.runner.start(self.stages[0]["users"], self._spawn_rate(0))
+        else:
+            self.anchor(time.time())
+
+    def anchor(self, origin: float) -> None:
+        """Start the stages relative to a unix timestamp"""
+        if self.greenlet:
+            self.greenlet.kill()
+        self.origin = origin
+        self.greenlet = gevent.spawn(self._run)
+
+    def _run(self) -> None:
+        for idx, stage in enumerate(self.stages):
+            start = self.stages[idx - 1]["duration"] if idx else 0
+            delay = self.origin + start - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+            elif idx < len(self.stages) - 1 and self.origin + stage["duration"] <= time.time():
+                # the stage is already over, e.g. because the scheduler was anchored in the past
+                continue
+            logger.info(f"Starting load stage {idx} with {stage['users']} users")
+            self.runner.start(stage["users"], self._spawn_rate(idx))
+
+    def stop(self) -> None:
+        if self.greenlet:
+            self.greenlet.kill()
+            self.greenlet = None
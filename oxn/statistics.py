@@ -0,0 +1,279 @@
+"""
+Purpose: Compares response variables between treatment and control windows.
+Functionality: Splits every response into control and treatment samples once, computes Welch and Mann-Whitney U
+tests, Cohen's d, Cliff's delta and bootstrap confidence intervals for all treatments in one pass, corrects the
+p-values of a run for multiple testing, and compares large responses in worker processes.
+Connection: Used by the Reporter to compute the interaction data of a run, results are cached by store key until
+the run is assembled.
+
+Statistics of treatment and response interactions"""
+import logging
+import math
+import multiprocessing
+import os
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import mannwhitneyu, ttest_ind
+
+from .errors import OxnException
+
+logger = logging.getLogger(__name__)
+
+CONTROL_LABEL = "NoTreatment"
+"""Label of observations outside of a treatment window"""
+CORRECTIONS = ["holm", "fdr_bh", "none"]
+"""Corrections for multiple testing, Holm-Bonferroni and Benjamini-Hochberg"""
+BOOTSTRAP_RESAMPLES = 1000
+"""Number of resamples for the bootstrap confidence interval of the mean difference"""
+CONFIDENCE = 0.95
+"""Confidence level of the bootstrap confidence interval"""
+PROCESS_ROWS = 100_000
+"""Number of observations from which a response is compared in a worker process"""
+BOOTSTRAP_CHUNK = 10_000_000
+"""Maximum number of resampled observations held in memory at once"""
+
+
+def split_response(dataframe: pd.DataFrame, value_column: str, label_columns: List[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Return the values of a response and for every treatment whether an observation is treated
+
+    Observations without a value are dropped, like the nan_policy omit of scipy.
+    """
+    try:
+        values = dataframe[value_column].to_numpy(dtype=float)
+        labels = {column: (dataframe[column] != CONTROL_LABEL).to_numpy() for column in label_columns}
+    except (KeyError, AttributeError, ValueError, TypeError) as e:
+        raise OxnException(
+            message="Dataframe passed to statistics has wrong format",
+            explanation=str(e),
+        )
+    observed = ~np.isnan(values)
+    return values[observed], {column: treated[observed] for column, treated in labels.items()}
+
+
+def cohens_d(control: np.ndarray, treated: np.ndarray) -> float:
+    """Return the difference of the means of treated and control in units of their pooled standard deviation"""
+    if len(control) < 2 or len(treated) < 2:
+        return math.nan
+    pooled = ((len(control) - 1) * control.var(ddof=1) + (len(treated) - 1) * treated.var(ddof=1)) / (
+        len(control) + len(treated) - 2
+    )
+    if pooled == 0:
+        return math.nan
+    return float((treated.mean() - control.mean()) / math.sqrt(pooled))
+
+
+def cliffs_delta(u_statistic: float, n_control: int, n_treated: int) -> float:
+    """
+    Return the probability that a treated observation is larger than a control one minus the reverse
+
+    Cliff's delta follows from the Mann-Whitney U of the control sample, which counts the pairs where the
+    control observation is larger.
+    """
+    if not n_control or not n_treated:
+        return math.nan
+    return float(1 - 2 * u_statistic / (n_control * n_treated))
+
+
+def bootstrap_interval(
+        control: np.ndarray,
+        treated: np.ndarray,
+        resamples: int = BOOTSTRAP_RESAMPLES,
+        confidence: float = CONFIDENCE,
+        seed: int = 0,
+) -> Tuple[float, float]:
+    """Return a percentile bootstrap confidence interval of the difference of the means of treated and control"""
+    if not len(control) or not len(treated) or resamples <= 0:
+        return math.nan, math.nan
+    rng = np.random.default_rng(seed)
+    # resample in chunks, so that large responses do not hold resamples times their size in memory
+    chunk = max(BOOTSTRAP_CHUNK // (len(control) + len(treated)), 1)
+    differences = []
+    for start in range(0, resamples, chunk):
+        size = min(chunk, resamples - start)
+        control_means = rng.choice(control, size=(size, len(control))).mean(axis=1)
+        treated_means = rng.choice(treated, size=(size, len(treated))).mean(axis=1)
+        differences.append(treated_means - control_means)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(np.concatenate(differences), [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def compare_treatment(values: np.ndarray, treated: np.ndarray, resamples: int = BOOTSTRAP_RESAMPLES, seed: int = 0) -> dict:
+    """Compare the treated observations of a response with all other observations"""
+    control, experiment = values[~treated], values[treated]
+    # scipy warns about samples that are too small and returns nan, which the report keeps as missing
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        # treated observations come first, like in the welch t-test of the reporter
+        statistic, p_value = ttest_ind(experiment, control, equal_var=False)
+        try:
+            u_statistic, u_p_value = mannwhitneyu(control, experiment, alternative="two-sided")
+        except ValueError:
+            u_statistic = u_p_value = math.nan
+    ci_low, ci_high = bootstrap_interval(control, experiment, resamples=resamples, seed=seed)
+    return {
+        "test_statistic": float(statistic),
+        "p_value": float(p_value),
+        "mann_whitney_u": float(u_statistic),
+        "mann_whitney_p_value": float(u_p_value),
+        "cohens_d": cohens_d(control, experiment),
+        "cliffs_delta": cliffs_delta(u_statistic, len(control), len(experiment)),
+        "mean_difference_ci": [ci_low, ci_high],
+        "control_observations": int(len(control)),
+        "treatment_observations": int(len(experiment)),
+    }
+
+
+def compare_response(values: np.ndarray, labels: Dict[str, np.ndarray], resamples: int = BOOTSTRAP_RESAMPLES, seed: int = 0) -> Dict[str, dict]:
+    """Compare a split response for all treatments, runs in worker processes for large responses"""
+    return {
+        treatment: compare_treatment(values, treated, resamples=resamples, seed=seed)
+        for treatment, treated in labels.items()
+    }
+
+
+def _compare_in_process(connection, values: np.ndarray, labels: Dict[str, np.ndarray], resamples: int, seed: int) -> None:
+    """Compare a response in a worker process and send the comparisons or the error back to the parent"""
+    try:
+        connection.send(compare_response(values, labels, resamples=resamples, seed=seed))
+    except Exception as e:
+        connection.send(OxnException(message="Error while comparing a response in a worker process", explanation=str(e)))
+    finally:
+        connection.close()
+
+
+def adjust_pvalues(pvalues: List[float], method: str = "holm") -> List[float]:
+    """Correct a family of p-values for multiple testing. Missing p-values stay missing and are not counted"""
+    if method not in CORRECTIONS:
+        raise OxnException(message=f"Unknown multiple testing correction {method}", explanation=f"Use one of {CORRECTIONS}")
+    pvalues = np.asarray(pvalues, dtype=float)
+    adjusted = np.full(len(pvalues), np.nan)
+    tested = np.flatnonzero(~np.isnan(pvalues))
+    count = len(tested)
+    if not count or method == "none":
+        adjusted[tested] = pvalues[tested]
+        return adjusted.tolist()
+    order = tested[np.argsort(pvalues[tested])]
+    ranked = pvalues[order]
+    if method == "holm":
+        corrected = np.maximum.accumulate(ranked * (count - np.arange(count)))
+    else:
+        corrected = np.minimum.accumulate((ranked * count / np.arange(1, count + 1))[::-1])[::-1]
+    adjusted[order] = np.minimum(corrected, 1.0)
+    return adjusted.tolist()
+
+
+class StatisticsStage:
+    """
+    Compare all treatment and response pairs of a run
+
+    Every response is split into its values and treatment labels once, and all of its treatments are compared
+    on these arrays instead of filtering the dataframe for every pair. Responses with at least process_rows
+    observations, usually traces, are compared in worker processes while smaller responses are compared in the
+    calling thread. Results are cached by the store key of the response until the run is forgotten.
+
+    Workers are spawned processes that send their results through a pipe. A concurrent.futures process pool
+    would need threads of its own, which deadlock under gevent in the native threads of the post-processing.
+    """
+
+    def __init__(
+            self,
+            correction: str = "holm",
+            resamples: int = BOOTSTRAP_RESAMPLES,
+            process_rows: int = PROCESS_ROWS,
+            workers: Optional[int] = None,
+            seed: int = 0,
+    ):
+        assert correction in CORRECTIONS, f"Correction must be one of {CORRECTIONS}"
+        self.correction = correction
+        """Correction for multiple testing across all interactions of a run"""
+        self.resamples = resamples
+        """Number of bootstrap resamples"""
+        self.process_rows = process_rows
+        """Number of observations from which a response is compared in a worker process"""
+        self.workers = workers or os.cpu_count() or 1
+        """Maximum number of concurrent worker processes"""
+        self.seed = seed
+        """Seed of the bootstrap, so that reports can be reproduced"""
+        self.cache: Dict[str, Dict[str, dict]] = {}
+        """Comparisons by store key and treatment name"""
+
+    def __repr__(self):
+        return f"StatisticsStage(correction={self.correction}, resamples={self.resamples}, cached={len(self.cache)})"
+
+    def _compare_in_processes(self, jobs: Dict[str, tuple]) -> Dict[str, Dict[str, dict]]:
+        # spawned workers do not inherit the gevent hub and the sockets of the parent
+        context = multiprocessing.get_context("spawn")
+        results = {}
+        keys = list(jobs)
+        for start in range(0, len(keys), self.workers):
+            running = []
+            for store_key in keys[start:start + self.workers]:
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_compare_in_process,
+                    args=(sender, *jobs[store_key], self.resamples, self.seed),
+                    daemon=True,
+                )
+                process.start()
+                sender.close()
+                running.append((store_key, process, receiver))
+            for store_key, process, receiver in running:
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result = OxnException(
+                        message=f"Worker process comparing {store_key} died",
+                        explanation=f"Exit code {process.exitcode}",
+                    )
+                finally:
+                    receiver.close()
+                    process.join()
+                if isinstance(result, Exception):
+                    raise result
+                results[store_key] = result
+        return results
+
+    def compare(self, responses: Dict[str, Tuple[pd.DataFrame, str]], treatments: List[str]) -> Dict[str, Dict[str, dict]]:
+        """
+        Compare responses given as dataframe and value column by store key for all treatments
+
+        Returns the comparisons by store key and treatment, with p-values adjusted across all of them.
+        """
+        large = {}
+        for store_key, (dataframe, value_column) in responses.items():
+            cached = self.cache.setdefault(store_key, {})
+            missing = [treatment for treatment in treatments if treatment not in cached]
+            if not missing:
+                continue
+            values, labels = split_response(dataframe, value_column, missing)
+            if len(values) >= self.process_rows:
+                large[store_key] = (values, labels)
+            else:
+                cached.update(compare_response(values, labels, resamples=self.resamples, seed=self.seed))
+        if large:
+            logger.info(f"Comparing {len(large)} large responses in worker processes")
+            for store_key, comparisons in self._compare_in_processes(large).items():
+                self.cache[store_key].update(comparisons)
+        results = {
+            store_key: {treatment: dict(self.cache[store_key][treatment]) for treatment in treatments}
+            for store_key in responses
+        }
+        self._adjust(results)
+        return results
+
+    def forget(self, store_keys) -> None:
+        """Drop the cached comparisons of responses, their store keys include the run so they are not asked for again"""
+        for store_key in store_keys:
+            self.cache.pop(store_key, None)
+
+    def _adjust(self, results: Dict[str, Dict[str, dict]]) -> None:
+        comparisons = [comparison for by_treatment in results.values() for comparison in by_treatment.values()]
+        adjusted = adjust_pvalues([comparison["p_value"] for comparison in comparisons], method=self.correction)
+        for comparison, adjusted_p_value in zip(comparisons, adjusted):
+            comparison["adjusted_p_value"] = adjusted_p_value
+            comparison["correction"] = self.correction
@@ -13,6 +13,9 @@ import os
 from pathlib import Path
 import pandas as pd
 from typing import List, Dict
+
+from gevent import monkey
+
 from .settings import STORAGE_NAME, TRIE_NAME, STORAGE_DIR
 
 # silence warning that we cant use hex strings as key names
@@ -24,6 +27,10 @@ warnings.filterwarnings("ignore", category=NaturalNameWarning)
 # Global variable to store the configured output path
 _configured_path = None
 
+# Native lock that serializes writes to the hdf store and the trie, since concurrent experiments
+# and their post-processing threads share both files
+_write_lock = monkey.get_original("threading", "Lock")()
+
 def configure_output_path(path: str) -> None:
     """Configure the output path for HDF storage"""
     global _configured_path
@@ -127,7 +134,7 @@ def construct_key(experiment_key, run_key, response_key):
 def write_dataframe(dataframe, experiment_key, run_key, response_key) -> None:
     """Write a dataframe to the store"""
     store_path = _get_storage_path()
-    with pd.HDFStore(store_path) as store:
+    with _write_lock, pd.HDFStore(store_path) as store:
         key = construct_key(experiment_key, run_key, response_key)
         store.put(key=key, value=dataframe)
         trie = Trie()
@@ -0,0 +1,327 @@
+"""
+Purpose: Aggregates the requests of the load generation.
+Functionality: Counts requests, errors and high resolution response time histograms per endpoint and interval
+in memory and keeps a bounded random sample of individual requests.
+Connection: Attached to the locust events of the load generators and flushed to the report by the Engine.
+Locust workers ship their aggregates to the master with their regular stats reports.
+
+Aggregated load generation telemetry"""
+import hashlib
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+WORKER_REPORT_KEY = "oxn_telemetry"
+"""Key of the aggregates in the stats reports locust workers send to the master"""
+NO_TREATMENT = "NoTreatment"
+"""Window of the requests outside of all treatments, named like the label of untreated observations"""
+ALL_REQUESTS = "all"
+"""Window of all requests of a run"""
+
+
+STATISTICS = [
+    "requests_per_second",
+    "failures_per_second",
+    "failure_rate",
+    "p50",
+    "p90",
+    "p95",
+    "p99",
+    "queueing_p50",
+    "queueing_p99",
+]
+"""Statistics computed for every endpoint and interval. Queueing delays cover all open-loop arrivals of an interval"""
+
+
+def quantile_ms(histogram: Optional[LatencyHistogram], quantile: float) -> float:
+    """Return a latency quantile of a high resolution histogram in milliseconds, nan if nothing was recorded"""
+    if histogram is None:
+        return float("nan")
+    return histogram.value_at_quantile(quantile) / 1000
+
+
+def endpoint_id(endpoint: str) -> str:
+    """Return an identifier of an endpoint that is the same in every run and report"""
+    return hashlib.sha1(endpoint.encode()).hexdigest()[:16]
+
+
+class IntervalAggregate:
+    """Requests of one endpoint within one interval"""
+
+    __slots__ = ("requests", "errors", "latencies")
+
+    def __init__(self):
+        self.requests = 0
+        """Number of requests"""
+        self.errors = 0
+        """Number of failed requests"""
+        self.latencies = LatencyHistogram()
+        """High resolution response times, or queueing delays of open-loop arrivals"""
+
+
+class RequestTelemetry:
+    """
+    In-memory aggregation of the requests of a load generator
+
+    The request hook is called for every single request on the gevent loop that also generates the load,
+    so it only updates counters. Individual requests are only kept for a random sample of sample_rate of
+    all requests, and at most max_samples of them.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, interval: float = 1.0, max_samples: int = 1000):
+        assert 0 <= sample_rate <= 1, "Sample rate must be between 0 and 1"
+        assert interval > 0, "Interval must be positive"
+        self.sample_rate = sample_rate
+        """Share of individual requests to keep"""
+        self.interval = interval
+        """Length of an aggregation interval in seconds"""
+        self.max_samples = max_samples
+        """Maximum number of individual requests to keep"""
+        self.aggregates: Dict[Tuple[str, int], IntervalAggregate] = {}
+        """Aggregated requests by endpoint and interval index"""
+        self.queueing: Dict[int, IntervalAggregate] = {}
+        """Queueing delays of open-loop arrivals by interval index of their scheduled time"""
+        self.samples: List[dict] = []
+        """Sampled individual requests"""
+        self.events = None
+        """The locust events the telemetry is attached to"""
+
+    def __repr__(self):
+        return f"RequestTelemetry(endpoints={len(self.endpoints())}, sample_rate={self.sample_rate})"
+
+    def attach(self, events) -> None:
+        """Start aggregating the requests reported to the request event of a locust environment"""
+        self.events = events
+        events.request.add_listener(self.on_request)
+
+    def attach_worker(self, events) -> None:
+        """Aggregate the requests of a locust worker and ship the aggregates with every report to the master"""
+        self.attach(events)
+        events.report_to_master.add_listener(self.on_report_to_master)
+
+    def attach_master(self, events) -> None:
+        """Merge the aggregates shipped by locust workers"""
+        self.events = events
+        events.worker_report.add_listener(self.on_worker_report)
+
+    def detach(self) -> None:
+        """Stop aggregating requests"""
+        if self.events is None:
+            return
+        for hook, listener in (
+            (self.events.request, self.on_request),
+            (self.events.report_to_master, self.on_report_to_master),
+            (self.events.worker_report, self.on_worker_report),
+        ):
+            try:
+                hook.remove_listener(listener)
+            except ValueError:
+                pass
+        self.events = None
+
+    def on_report_to_master(self, client_id, data, **kwargs):
+        """Locust worker hook that adds the aggregates since the last report to a stats report"""
+        data[WORKER_REPORT_KEY] = self.drain()
+
+    def on_worker_report(self, client_id, data, **kwargs):
+        """Locust master hook that merges the aggregates of a stats report of a worker"""
+        self.merge(data.get(WORKER_REPORT_KEY))
+
+    def drain(self) -> dict:
+        """Return the aggregates and samples collected since the last drain and reset them"""
+        snapshot = {
+            "aggregates": [
+                [endpoint, index, aggregate.requests, aggregate.errors, aggregate.latencies.to_dict()]
+                for (endpoint, index), aggregate in self.aggregates.items()
+            ],
+            "queueing": [
+                [index, aggregate.requests, aggregate.latencies.to_dict()] for index, aggregate in self.queueing.items()
+            ],
+            "samples": self.samples,
+        }
+        self.aggregates = {}
+        self.queueing = {}
+        self.samples = []
+        return snapshot
+
+    def merge(self, snapshot: Optional[dict]) -> None:
+        """Add drained aggregates and samples, e.g. of a worker, to these aggregates"""
+        if not snapshot:
+            return
+        for endpoint, index, requests, errors, latencies in snapshot["aggregates"]:
+            key = (endpoint, index)
+            aggregate = self.aggregates.get(key)
+            if aggregate is None:
+                aggregate = self.aggregates[key] = IntervalAggregate()
+            aggregate.requests += requests
+            aggregate.errors += errors
+            aggregate.latencies.merge(LatencyHistogram.from_dict(latencies))
+        for index, arrivals, delays in snapshot.get("queueing", []):
+            aggregate = self.queueing.get(index)
+            if aggregate is None:
+                aggregate = self.queueing[index] = IntervalAggregate()
+            aggregate.requests += arrivals
+            aggregate.latencies.merge(LatencyHistogram.from_dict(delays))
+        self.samples.extend(snapshot["samples"][: max(self.max_samples - len(self.samples), 0)])
+
+    def on_request(
+            self,
+            request_type,
+            name,
+            response_time,
+            response_length=0,
+            response=None,
+            context=None,
+            exception=None,
+            start_time=None,
+            url=None,
+            **kwargs,
+    ):
+        """Locust request event hook"""
+        started = start_time if start_time else time.time()
+        key = (f"{request_type} {name}", int(started // self.interval))
+        aggregate = self.aggregates.get(key)
+        if aggregate is None:
+            aggregate = self.aggregates[key] = IntervalAggregate()
+        aggregate.requests += 1
+        if exception:
+            aggregate.errors += 1
+        aggregate.latencies.record_milliseconds(response_time or 0)
+        if self.sample_rate and len(self.samples) < self.max_samples and random.random() < self.sample_rate:
+            self._sample(request_type, name, response_time, response, exception, started, url)
+
+    def on_arrival(self, scheduled: float, delay: float) -> None:
+        """
+        Record how long an open-loop arrival waited for a free user
+
+        Scheduled is the unix timestamp the arrival was scheduled for and delay the time in milliseconds
+        until its task actually started.
+        """
+        index = int(scheduled // self.interval)
+        aggregate = self.queueing.get(index)
+        if aggregate is None:
+            aggregate = self.queueing[index] = IntervalAggregate()
+        aggregate.requests += 1
+        aggregate.latencies.record_milliseconds(delay)
+
+    def _sample(self, request_type, name, response_time, response, exception, started, url):
+        sample = {
+            "timestamp": started,
+            "verb": request_type,
+            "name": name,
+            "url": url,
+            "status_code": getattr(response, "status_code", None),
+            "response_time": response_time,
+        }
+        if exception:
+            sample["exception"] = str(exception)
+        self.samples.append(sample)
+        logger.debug(f"Sampled request {sample}")
+
+    def endpoints(self) -> List[str]:
+        """Return the endpoints that received requests"""
+        return sorted({endpoint for endpoint, _ in self.aggregates})
+
+    def totals(self) -> Dict[str, dict]:
+        """Return the number of requests and errors per endpoint"""
+        totals: Dict[str, dict] = {}
+        for (endpoint, _), aggregate in self.aggregates.items():
+            total = totals.setdefault(endpoint, {"requests": 0, "errors": 0})
+            total["requests"] += aggregate.requests
+            total["errors"] += aggregate.errors
+        return totals
+
+    def rows(self, start: float, end: float) -> List[dict]:
+        """
+        Return the statistics of every endpoint and interval that starts within a time window
+
+        Percentiles come from the high resolution histograms, so they agree with the latencies of the report.
+        """
+        rows = []
+        for (endpoint, index), aggregate in sorted(self.aggregates.items(), key=lambda item: (item[0][1], item[0][0])):
+            interval_start = index * self.interval
+            if not start <= interval_start <= end:
+                continue
+            queueing = self.queueing.get(index)
+            queueing_latencies = queueing.latencies if queueing else None
+            rows.append(
+                {
+                    "timestamp": interval_start,
+                    "endpoint": endpoint,
+                    "requests_per_second": aggregate.requests / self.interval,
+                    "failures_per_second": aggregate.errors / self.interval,
+                    "failure_rate": aggregate.errors / aggregate.requests,
+                    "p50": quantile_ms(aggregate.latencies, 0.5),
+                    "p90": quantile_ms(aggregate.latencies, 0.9),
+                    "p95": quantile_ms(aggregate.latencies, 0.95),
+                    "p99": quantile_ms(aggregate.latencies, 0.99),
+                    "queueing_p50": quantile_ms(queueing_latencies, 0.5),
+                    "queueing_p99": quantile_ms(queueing_latencies, 0.99),
+                }
+            )
+        return rows
+
+    def latency_report(self, windows: Dict[str, Tuple[float, float]]) -> Dict[str, dict]:
+        """
+        Return the response time percentiles and histograms of every endpoint per window, by endpoint id
+
+        Windows map names, e.g. of treatments, to their start and end as unix timestamps. Like the loadgen
+        response variables, an interval belongs to a window if it starts within the window. Intervals outside
+        of all windows belong to the NoTreatment window and every interval belongs to the all window.
+        """
+        merged: Dict[str, Dict[str, LatencyHistogram]] = {}
+        for (endpoint, index), aggregate in self.aggregates.items():
+            interval_start = index * self.interval
+            names = [name for name, (start, end) in windows.items() if start <= interval_start <= end]
+            histograms = merged.setdefault(endpoint, {})
+            for name in (names or [NO_TREATMENT]) + [ALL_REQUESTS]:
+                histograms.setdefault(name, LatencyHistogram()).merge(aggregate.latencies)
+        return {
+            endpoint_id(endpoint): {
+                "endpoint": endpoint,
+                "windows": {
+                    name: {**histogram.summary(), "histogram": histogram.to_dict()}
+                    for name, histogram in sorted(histograms.items())
+                },
+            }
+            for endpoint, histograms in sorted(merged.items())
+        }
+
+    def to_report(self) -> dict:
+        """
+        Return the aggregated requests for the report
+
+        Every endpoint lists its intervals in time order with the start of the interval as unix timestamp.
+        Queueing lists the percentiles of the queueing delays of open-loop arrivals per interval. Response times
+        are reported per window in the latencies of the loadgen section.
+        """
+        endpoints: Dict[str, list] = {}
+        for (endpoint, index), aggregate in sorted(self.aggregates.items()):
+            endpoints.setdefault(endpoint, []).append(
+                {
+                    "start": index * self.interval,
+                    "requests": aggregate.requests,
+                    "errors": aggregate.errors,
+                }
+            )
+        return {
+            "interval": self.interval,
+            "endpoints": endpoints,
+            "queueing": [
+                {
+                    "start": index * self.interval,
+                    "arrivals": aggregate.requests,
+                    "delay_ms": {
+                        name: value for name, value in aggregate.latencies.summary().items() if name != "count"
+                    },
+                }
+                for index, aggregate in sorted(self.queueing.items())
+            ],
+            "sample_rate": self.sample_rate,
+            "samples": list(self.samples),
+        }
@@ -0,0 +1,56 @@
+"""Test the engine overhead benchmarks"""
+import unittest
+
+from oxn.benchmarks.standins import jaeger_payload, prometheus_payload
+from oxn.benchmarks.suite import BenchmarkCase, compare_results, run_case
+
+
+def result(name="small", spans_per_second=1000.0, samples_per_second=5000.0, peak_rss_bytes=100):
+    return {
+        "name": name,
+        "spans_per_second": spans_per_second,
+        "samples_per_second": samples_per_second,
+        "peak_rss_bytes": peak_rss_bytes,
+    }
+
+
+class StandinPayloadTest(unittest.TestCase):
+    def test_it_spreads_samples_over_the_window(self):
+        payload = prometheus_payload(series=3, samples=5, start=100.0, end=104.0)
+        series = payload["data"]["result"]
+        self.assertEqual(len(series), 3)
+        self.assertEqual([timestamp for timestamp, _ in series[0]["values"]], [100.0, 101.0, 102.0, 103.0, 104.0])
+
+    def test_it_builds_traces_of_the_requested_size(self):
+        payload = jaeger_payload(traces=4, spans=3, start=0, end=4_000_000)
+        self.assertEqual(len(payload["data"]), 4)
+        self.assertEqual(sum(len(trace["spans"]) for trace in payload["data"]), 12)
+        self.assertEqual(payload["data"][1]["spans"][0]["startTime"], 1_000_000)
+
+
+class CompareResultsTest(unittest.TestCase):
+    def test_it_reports_throughput_and_memory_regressions(self):
+        baseline = {"cases": [result()]}
+        results = {"cases": [result(spans_per_second=700.0, samples_per_second=4500.0, peak_rss_bytes=130)]}
+        regressions = compare_results(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("spans_per_second", regressions[0])
+        self.assertIn("peak_rss_bytes", regressions[1])
+
+    def test_it_ignores_cases_without_baseline(self):
+        self.assertEqual(compare_results({"cases": [result(name="large")]}, {"cases": [result()]}), [])
+
+
+class RunCaseTest(unittest.TestCase):
+    def test_it_runs_the_engine_against_the_standins(self):
+        case = BenchmarkCase(name="tiny", series=2, samples=10, traces=3, spans=4, duration="1s")
+        results = run_case(case, address="127.0.0.3", frontend_port=8090)
+        self.assertEqual(results["spans"], 12)
+        self.assertEqual(results["samples"], 20)
+        self.assertGreater(results["spans_per_second"], 0)
+        self.assertGreater(results["peak_rss_bytes"], 0)
+        run_timings = results["timings"]["runs"][0]
+        self.assertIn("observe", run_timings["responses"]["benchmark_traces"])
+        self.assertIn("store", run_timings["responses"]["benchmark_samples"])
+        self.assertIn("store", run_timings["responses"]["benchmark_requests"])
+        self.assertIn("report", results["timings"]["experiment"]["phases"])
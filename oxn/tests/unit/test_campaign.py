@@ -0,0 +1,119 @@
+"""Test namespace-sharded experiment campaigns"""
+import time
+import unittest
+from unittest import mock
+
+from oxn.campaign import Campaign, shard_spec
+from oxn.errors import OxnException
+
+
+def kubernetes_spec(capacity=None):
+    spec = {
+        "experiment": {
+            "orchestrator": "kubernetes",
+            "services": {
+                "jaeger": {"name": "jaeger-query", "namespace": "system-under-evaluation"},
+                "prometheus": [
+                    {"name": "prometheus-server", "namespace": "system-under-evaluation", "target": "sue"},
+                    {"name": "kube-prometheus", "namespace": "oxn-external-monitoring", "target": "oxn"},
+                ],
+            },
+            "responses": [
+                {
+                    "name": "cpu",
+                    "metric_name": 'sum(rate(container_cpu_usage_seconds_total{namespace="system-under-evaluation"}[1m]))',
+                }
+            ],
+            "sue": {"required": [{"namespace": "system-under-evaluation-shared", "name": "prometheus-server"}]},
+            "loadgen": {"target": {"name": "frontendproxy", "namespace": "system-under-evaluation"}},
+        }
+    }
+    if capacity is not None:
+        spec["experiment"]["sue"]["capacity"] = capacity
+    return spec
+
+
+class FakeEngine:
+    """Engine stand-in that blocks in run like an experiment would"""
+
+    running = []
+    peak = 0
+
+    def __init__(self, configuration_path, **kwargs):
+        self.configuration_path = configuration_path
+        self.report_path = kwargs["report_path"]
+        self.spec = None
+        self.namespace = None
+
+    def read_experiment_specification(self):
+        self.spec = kubernetes_spec(capacity=2 if "large" in self.configuration_path else None)
+
+    def validate_syntax(self):
+        pass
+
+    def run(self, **options):
+        self.namespace = self.spec["experiment"]["sue"]["namespace"]
+        FakeEngine.running.append(self.namespace)
+        FakeEngine.peak = max(FakeEngine.peak, len(FakeEngine.running))
+        time.sleep(0.1)
+        FakeEngine.running.remove(self.namespace)
+        if "broken" in self.configuration_path:
+            raise OxnException(message="broken", explanation="broken")
+
+    def shutdown(self):
+        pass
+
+    def write_trace(self):
+        pass
+
+
+class ShardSpecTest(unittest.TestCase):
+    def test_it_moves_the_sue_services_to_the_namespace(self):
+        sharded = shard_spec(kubernetes_spec(), namespace="sue-2")
+        experiment = sharded["experiment"]
+        self.assertEqual(experiment["sue"]["namespace"], "sue-2")
+        self.assertEqual(experiment["services"]["jaeger"]["namespace"], "sue-2")
+        self.assertEqual(experiment["services"]["prometheus"][0]["namespace"], "sue-2")
+        self.assertEqual(experiment["loadgen"]["target"]["namespace"], "sue-2")
+        self.assertIn('namespace="sue-2"', experiment["responses"][0]["metric_name"])
+        # shared services and namespaces that only start with the sue namespace stay untouched
+        self.assertEqual(experiment["services"]["prometheus"][1]["namespace"], "oxn-external-monitoring")
+        self.assertEqual(experiment["sue"]["required"][0]["namespace"], "system-under-evaluation-shared")
+        self.assertNotIn("namespace", kubernetes_spec()["experiment"]["sue"])
+
+
+@mock.patch("oxn.campaign.Engine", FakeEngine)
+class CampaignTest(unittest.TestCase):
+    def setUp(self) -> None:
+        FakeEngine.running = []
+        FakeEngine.peak = 0
+
+    def test_it_runs_experiments_concurrently_in_separate_namespaces(self):
+        campaign = Campaign(spec_paths=[f"exp{i}.yml" for i in range(6)], namespaces=["sue-1", "sue-2", "sue-3"], report_path="reports/")
+        started = time.monotonic()
+        experiments = campaign.run(runs=1)
+        # 6 experiments on 3 namespaces take about 2 experiment durations
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(FakeEngine.peak, 3)
+        self.assertEqual({experiment.namespace for experiment in experiments}, {"sue-1", "sue-2", "sue-3"})
+        self.assertEqual(experiments[1].engine.report_path, "reports/1_exp1_")
+
+    def test_it_respects_the_capacity_budget(self):
+        campaign = Campaign(
+            spec_paths=["large.yml", "small.yml", "small.yml"], namespaces=["sue-1", "sue-2", "sue-3"], capacity=2
+        )
+        campaign.run(runs=1)
+        self.assertEqual(FakeEngine.peak, 2)
+
+    def test_it_rejects_experiments_larger_than_the_budget(self):
+        campaign = Campaign(spec_paths=["large.yml"], namespaces=["sue-1"], capacity=1)
+        with self.assertRaises(OxnException):
+            campaign.run(runs=1)
+
+    def test_it_finishes_the_campaign_when_experiments_fail(self):
+        campaign = Campaign(spec_paths=["broken.yml", "exp.yml", "exp.yml"], namespaces=["sue-1", "sue-2"])
+        with self.assertRaises(OxnException) as context:
+            campaign.run(runs=1)
+        self.assertIn("broken.yml", context.exception.explanation)
+        self.assertTrue(all(experiment.finished for experiment in campaign.experiments))
+        self.assertEqual(sorted(campaign.free_namespaces), ["sue-1", "sue-2"])
@@ -139,3 +139,36 @@ class CommandLineTests(unittest.TestCase):
         test_args = [self.experiment_spec_mock]
         parsed = parser.parse_args(test_args)
         self.assertTrue(parsed.times == 1)
+
+    @mock.patch("os.path.exists")
+    def test_it_has_default_reuse_sue(self, mock_exists):
+        mock_exists.return_value = True
+        test_args = [self.experiment_spec_mock]
+        parsed = parser.parse_args(test_args)
+        self.assertFalse(parsed.reuse_sue)
+        self.assertTrue(parsed.settle == 0)
+
+    @mock.patch("os.path.exists")
+    def test_it_accepts_reuse_sue_with_settle(self, mock_exists):
+        mock_exists.return_value = True
+        test_args = [self.experiment_spec_mock, "--reuse-sue", "--settle", "30s"]
+        parsed = parser.parse_args(test_args)
+        self.assertTrue(parsed.reuse_sue)
+        self.assertTrue(parsed.settle == 30)
+
+    @mock.patch("os.path.exists")
+    def test_it_accepts_several_specs_with_namespaces(self, mock_exists):
+        mock_exists.return_value = True
+        test_args = [self.experiment_spec_mock, "other_spec.yaml", "--namespaces", "sue-1,sue-2", "--capacity", "1.5"]
+        parsed = parse_oxn_args(args=test_args)
+        self.assertEqual(parsed.spec, [self.experiment_spec_mock, "other_spec.yaml"])
+        self.assertEqual(parsed.namespaces, ["sue-1", "sue-2"])
+        self.assertEqual(parsed.capacity, 1.5)
+
+    @mock.patch("os.path.exists")
+    @mock.patch("argparse.ArgumentParser._print_message", mock.MagicMock)
+    def test_it_throws_on_several_specs_without_namespaces(self, mock_exists):
+        mock_exists.return_value = True
+        test_args = [self.experiment_spec_mock, "other_spec.yaml"]
+        with self.assertRaises(SystemExit):
+            parse_oxn_args(args=test_args)
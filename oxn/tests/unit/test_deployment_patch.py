@@ -0,0 +1,56 @@
+"""Test batched deployment patches of the kubernetes orchestrator"""
+import unittest
+from unittest import mock
+
+from kubernetes import client
+
+from oxn.errors import OrchestratorException
+from oxn.kubernetes_orchestrator import DeploymentPatch, KubernetesOrchestrator
+
+
+def fake_deployment(name):
+    return client.V1Deployment(
+        metadata=client.V1ObjectMeta(name=name, namespace="sue", generation=2),
+        spec=client.V1DeploymentSpec(
+            selector=client.V1LabelSelector(match_labels={"app": name}),
+            template=client.V1PodTemplateSpec(
+                spec=client.V1PodSpec(containers=[client.V1Container(name=f"{name}-container")])
+            ),
+        ),
+    )
+
+
+class DeploymentPatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orc = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+        self.orc.cache = mock.Mock()
+        self.orc.api_client = mock.Mock()
+        self.orc.api_client.patch_namespaced_deployment.side_effect = lambda name, namespace, body: fake_deployment(name)
+
+    def test_it_patches_all_changes_of_a_deployment_in_one_call(self):
+        patch = DeploymentPatch(
+            deployment=fake_deployment("cart"),
+            env={"OTEL_METRIC_EXPORT_INTERVAL": "1000", "OLD_VARIABLE": None},
+            resources={"limits": {"cpu": "500m"}},
+            template_annotations={"oxn/treatment": "interval"},
+        )
+        self.orc.patch_deployments([patch], wait=False)
+        self.orc.api_client.patch_namespaced_deployment.assert_called_once()
+        body = self.orc.api_client.patch_namespaced_deployment.call_args.kwargs["body"]
+        container = body["spec"]["template"]["spec"]["containers"][0]
+        self.assertEqual(container["name"], "cart-container")
+        self.assertEqual(
+            container["env"],
+            [{"name": "OTEL_METRIC_EXPORT_INTERVAL", "value": "1000"}, {"name": "OLD_VARIABLE", "$patch": "delete"}],
+        )
+        self.assertEqual(container["resources"], {"limits": {"cpu": "500m"}})
+        self.assertEqual(body["spec"]["template"]["metadata"]["annotations"], {"oxn/treatment": "interval"})
+        self.assertNotIn("resourceVersion", str(body))
+
+    def test_it_waits_for_all_rollouts(self):
+        self.orc.wait_for_rollout = mock.Mock(side_effect=[True, False])
+        patches = [DeploymentPatch(deployment=fake_deployment(name), env={"A": "1"}) for name in ["cart", "ad"]]
+        with self.assertRaises(OrchestratorException) as context:
+            self.orc.patch_deployments(patches, timeout=1)
+        self.assertEqual(self.orc.api_client.patch_namespaced_deployment.call_count, 2)
+        self.assertIn("ad", context.exception.explanation)
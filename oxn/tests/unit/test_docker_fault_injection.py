@@ -0,0 +1,84 @@
+"""Test concurrent fault injection into several docker containers"""
+import time
+import unittest
+from unittest import mock
+
+from oxn.docker_orchestration import DockerComposeOrchestrator
+from oxn.treatments import StressTreatment, _exec_on_containers
+from oxn.utils import utc_timestamp
+
+
+def fake_container(exit_code=0, delay=0.1):
+    container = mock.Mock()
+
+    def exec_run(cmd):
+        time.sleep(delay)
+        return exit_code, b"output"
+
+    container.exec_run.side_effect = exec_run
+    return container
+
+
+class DockerStressTreatment(StressTreatment):
+    """Stress treatment that accepts any orchestrator"""
+
+    def _validate_orchestrator(self) -> bool:
+        return True
+
+
+class DockerFaultInjectionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orc = DockerComposeOrchestrator.__new__(DockerComposeOrchestrator)
+        self.orc.sue_service_names = ["cartservice", "adservice", "frontend"]
+        self.orc.service_container_map = {
+            "cartservice": "cart-service",
+            "adservice": "ad-service",
+            "frontend": "frontend",
+        }
+        self.orc.containers = {
+            "cart-service": fake_container(),
+            "ad-service": fake_container(exit_code=1),
+            "frontend": fake_container(),
+        }
+
+    def test_it_resolves_lists_and_patterns(self):
+        self.assertEqual(self.orc.resolve_containers("*service"), ["ad-service", "cart-service"])
+        self.assertEqual(self.orc.resolve_containers(["frontend", "cart*", "frontend"]), ["frontend", "cart-service"])
+        self.assertEqual(self.orc.resolve_containers("otel-col"), ["otel-col"])
+
+    def test_it_executes_in_all_containers_concurrently(self):
+        started = time.monotonic()
+        results = self.orc.exec_in_containers(["cart-service", "ad-service", "frontend"], ["tc"])
+        self.assertLess(time.monotonic() - started, 0.25)
+        self.assertEqual([result.exit_code for result in results], [0, 1, 0])
+        self.assertEqual(results[0].output, "output")
+
+    def test_it_rolls_back_partial_failures(self):
+        treatment = mock.Mock(orchestrator=self.orc, config={"service_name": ["cartservice", "adservice"]})
+        self.assertFalse(
+            _exec_on_containers(treatment, command=["tc", "add"], rollback_command=["tc", "del"], mark_applied=True)
+        )
+        treatment.mark_applied.assert_not_called()
+        self.orc.containers["cart-service"].exec_run.assert_called_with(cmd=["tc", "del"])
+        self.orc.containers["ad-service"].exec_run.assert_called_once_with(cmd=["tc", "add"])
+
+    def stress_treatment(self, service_name):
+        treatment = DockerStressTreatment.__new__(DockerStressTreatment)
+        treatment.name, treatment.orchestrator = "stress", self.orc
+        treatment.config = {"service_name": service_name, "duration": "1s"}
+        treatment.stressors = {"--cpu": "1"}
+        treatment.start = treatment.applied = None
+        return treatment
+
+    def test_stress_is_applied_when_stress_ng_started(self):
+        treatment = self.stress_treatment(["cartservice", "frontend"])
+        before = utc_timestamp()
+        treatment.inject()
+        # stress-ng only returns after its timeout, which is when the stress ends
+        self.assertGreaterEqual(treatment.applied, before)
+        self.assertLess(treatment.applied, min(result.finished for result in treatment.container_results) - 0.05)
+
+    def test_failed_stress_is_not_applied(self):
+        treatment = self.stress_treatment(["cartservice", "adservice"])
+        treatment.inject()
+        self.assertIsNone(treatment.applied)
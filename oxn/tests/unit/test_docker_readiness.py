@@ -0,0 +1,129 @@
+"""Test event-driven readiness of the docker compose orchestrator"""
+import time
+import unittest
+from unittest import mock
+
+from oxn.docker_orchestration import DockerComposeOrchestrator
+from oxn.errors import OrchestrationException
+
+
+def fake_container(name, status="running", health=None):
+    container = mock.Mock()
+    container.name = name
+    container.attrs = {"State": {"Status": status}}
+    if health:
+        container.attrs["State"]["Health"] = {"Status": health}
+    return container
+
+
+class DockerReadinessTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orc = DockerComposeOrchestrator.__new__(DockerComposeOrchestrator)
+        self.orc.experiment_config = None
+        self.orc.sue_service_names = ["frontend", "cart"]
+        self.orc.service_container_map = {"frontend": "frontend-1", "cart": "cart-1"}
+        self.orc.readiness_latencies = {}
+        self.orc.containers = {}
+        self.orc.docker_client = mock.Mock()
+
+    def test_it_is_ready_from_a_single_snapshot(self):
+        self.orc.docker_client.containers.list.return_value = [
+            fake_container("frontend-1"),
+            fake_container("cart-1", health="healthy"),
+        ]
+        self.assertTrue(self.orc.ready(timeout=1))
+        self.orc.docker_client.containers.list.assert_called_once()
+        self.orc.docker_client.events.assert_not_called()
+        self.assertEqual(set(self.orc.readiness_latencies), {"frontend", "cart"})
+        # the snapshot seeds the container cache used by treatments
+        self.assertIs(self.orc.get_container("cart-1"), self.orc.docker_client.containers.list.return_value[1])
+        self.orc.docker_client.containers.get.assert_not_called()
+
+    def test_it_caches_container_handles(self):
+        self.orc.docker_client.containers.get.return_value = fake_container("cart-1")
+        first = self.orc.get_container("cart-1")
+        second = self.orc.get_container("cart-1", refresh=True)
+        self.assertIs(first, second)
+        self.orc.docker_client.containers.get.assert_called_once_with(container_id="cart-1")
+        first.reload.assert_called_once()
+
+    def test_it_waits_for_health_events(self):
+        self.orc.docker_client.containers.list.return_value = [
+            fake_container("frontend-1"),
+            fake_container("cart-1", health="starting"),
+        ]
+        self.orc.docker_client.events.return_value = mock.MagicMock(
+            __iter__=lambda _: iter(
+                [
+                    {"Action": "exec_start", "Actor": {"Attributes": {"name": "cart-1"}}},
+                    {"Action": "health_status: healthy", "Actor": {"Attributes": {"name": "cart-1"}}},
+                ]
+            )
+        )
+        self.orc.docker_client.containers.get.return_value = fake_container("cart-1", health="healthy")
+        self.assertTrue(self.orc.ready(timeout=1))
+        self.orc.docker_client.containers.get.assert_called_once_with(container_id="cart-1")
+        self.assertIn("cart", self.orc.readiness_latencies)
+
+    def test_it_is_not_ready_without_events(self):
+        self.orc.docker_client.containers.list.return_value = [
+            fake_container("frontend-1"),
+            fake_container("cart-1", status="created"),
+        ]
+        self.orc.docker_client.events.return_value = mock.MagicMock(__iter__=lambda _: iter([]))
+        self.assertFalse(self.orc.ready(timeout=1))
+        self.assertNotIn("cart", self.orc.readiness_latencies)
+
+    def test_it_stops_waiting_at_the_deadline_without_events(self):
+        self.orc.docker_client.containers.list.return_value = [
+            fake_container("frontend-1"),
+            fake_container("cart-1", health="starting"),
+        ]
+
+        def silent_stream():
+            time.sleep(10)
+            yield {"Action": "health_status: healthy", "Actor": {"Attributes": {"name": "cart-1"}}}
+
+        self.orc.docker_client.events.return_value = mock.MagicMock(__iter__=lambda _: silent_stream())
+        started = time.monotonic()
+        self.assertFalse(self.orc.ready(timeout=0.3))
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_it_raises_when_a_container_dies(self):
+        cart = fake_container("cart-1", status="created")
+        cart.id = "cart-id"
+        self.orc.docker_client.containers.list.return_value = [fake_container("frontend-1"), cart]
+        self.orc.docker_client.events.return_value = mock.MagicMock(
+            __iter__=lambda _: iter(
+                [
+                    # a replaced container of the same name died before the snapshot
+                    {"Action": "die", "id": "old-cart-id", "Actor": {"Attributes": {"name": "cart-1"}}},
+                    {"Action": "oom", "id": "cart-id", "Actor": {"Attributes": {"name": "cart-1"}}},
+                ]
+            )
+        )
+        with self.assertRaises(OrchestrationException) as context:
+            self.orc.ready(timeout=5)
+        self.assertIn("oom", context.exception.explanation)
+
+    def test_probes_record_their_own_latency(self):
+        self.orc.experiment_config = {
+            "experiment": {
+                "sue": {"probes": {"frontend": {"http": "http://frontend/"}, "cart": {"tcp": "cart:7070"}}}
+            }
+        }
+        self.orc.docker_client.containers.list.return_value = [fake_container("frontend-1"), fake_container("cart-1")]
+
+        def probe(description, deadline):
+            time.sleep(0.05 if "http" in description else 0.4)
+            return True
+
+        with mock.patch.object(DockerComposeOrchestrator, "_probe", side_effect=probe):
+            self.assertTrue(self.orc.ready(timeout=2))
+        self.assertLess(self.orc.readiness_latencies["frontend"], 0.3)
+        self.assertGreaterEqual(self.orc.readiness_latencies["cart"], 0.4)
+
+    def test_it_raises_on_missing_containers(self):
+        self.orc.docker_client.containers.list.return_value = [fake_container("frontend-1")]
+        with self.assertRaises(OrchestrationException):
+            self.orc.ready(timeout=1)
@@ -0,0 +1,56 @@
+"""Test the latency histograms"""
+import math
+import unittest
+
+from oxn.histogram import LatencyHistogram
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_it_records_small_values_exactly(self):
+        histogram = LatencyHistogram()
+        for value in (0, 1, 199):
+            histogram.record(value)
+        self.assertEqual(histogram.value_at_quantile(0.0), 0)
+        self.assertEqual(histogram.value_at_quantile(0.5), 1)
+        self.assertEqual(histogram.value_at_quantile(1.0), 199)
+
+    def test_it_keeps_the_relative_error_below_the_precision(self):
+        histogram = LatencyHistogram(significant_digits=2)
+        for value in (250, 12_345, 987_654, 3_600_000_000):
+            reported = histogram._highest_equivalent_value(histogram._index(value))
+            self.assertGreaterEqual(reported, value)
+            self.assertLess((reported - value) / value, 0.01)
+
+    def test_it_reports_percentiles_in_milliseconds(self):
+        histogram = LatencyHistogram()
+        for millisecond in range(1, 1001):
+            histogram.record_milliseconds(millisecond)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["p50"], 500, delta=5)
+        self.assertAlmostEqual(summary["p99"], 990, delta=10)
+        self.assertAlmostEqual(summary["p99.9"], 999, delta=10)
+
+    def test_empty_histograms_have_no_percentiles(self):
+        self.assertTrue(math.isnan(LatencyHistogram().value_at_quantile(0.5)))
+
+    def test_it_merges_like_recording_all_values(self):
+        first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(0, 100_000, 37):
+            (first if value % 2 else second).record(value)
+            both.record(value)
+        self.assertEqual(LatencyHistogram.merged([first, second]), both)
+        with self.assertRaises(ValueError):
+            first.merge(LatencyHistogram(significant_digits=3))
+
+    def test_it_survives_serialization(self):
+        histogram = LatencyHistogram(significant_digits=3)
+        histogram.record(42)
+        histogram.record(4_200_000, count=3)
+        data = histogram.to_dict()
+        self.assertEqual(data["unit"], "us")
+        self.assertEqual(LatencyHistogram.from_dict(data), histogram)
+
+
+if __name__ == "__main__":
+    unittest.main()
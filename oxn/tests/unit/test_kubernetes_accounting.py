@@ -0,0 +1,89 @@
+"""Test the accounting of sue and observability pods on kubernetes"""
+import unittest
+from unittest import mock
+
+from oxn.errors import PrometheusException
+from oxn.pricing import KubernetesAccountant
+from oxn.report import Reporter
+
+
+def vector(*samples):
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {"metric": {"namespace": namespace, "pod": pod}, "value": [200.0, str(value)]}
+                for namespace, pod, value in samples
+            ],
+        },
+    }
+
+
+class FakePrometheus:
+    """Answer the bulk queries of the accountant by the metric they ask for"""
+
+    def __init__(self, energy=True):
+        self.energy = energy
+        self.queries = []
+
+    def instant_query(self, query, time=None, timeout=None):
+        self.queries.append((query, time))
+        if "container_cpu_usage_seconds_total" in query:
+            return vector(("system-under-evaluation", "frontend-1", 12.5), ("oxn-observability", "prometheus-0", 3))
+        if "container_memory_working_set_bytes" in query:
+            return vector(("system-under-evaluation", "frontend-1", 2048))
+        if "kepler_container_joules_total" in query:
+            if not self.energy:
+                raise PrometheusException(message="No kepler", explanation="Kepler is not installed")
+            return vector(("system-under-evaluation", "frontend-1", 40))
+        return vector()
+
+
+class KubernetesAccountantTest(unittest.TestCase):
+    def setUp(self) -> None:
+        process = mock.Mock()
+        process.cpu_times.return_value = mock.Mock(user=1, system=1, children_user=0, children_system=0)
+        self.accountant = KubernetesAccountant(
+            orchestrator=mock.Mock(),
+            process=process,
+            namespaces=["system-under-evaluation", "oxn-observability"],
+            sue_namespace="system-under-evaluation",
+        )
+        self.accountant.reads = [100.0, 200.0]
+
+    def test_it_tells_sue_from_observability_pods(self):
+        self.assertEqual(self.accountant.role("system-under-evaluation", "frontend-1"), "sue")
+        self.assertEqual(self.accountant.role("system-under-evaluation", "otel-collector-0"), "observability")
+        self.assertEqual(self.accountant.role("oxn-observability", "prometheus-0"), "observability")
+
+    def test_it_queries_all_pods_in_bulk(self):
+        prometheus = FakePrometheus()
+        pods = self.accountant.query_pods(prometheus, start=100.0, end=200.0)
+        # one query per resource, regardless of the number of pods
+        self.assertEqual(len(prometheus.queries), 5)
+        self.assertTrue(all("[100s]" in query and time == 200.0 for query, time in prometheus.queries))
+        frontend = pods["system-under-evaluation/frontend-1"]
+        self.assertEqual(frontend["total_cpu_usage"], 12.5)
+        self.assertEqual(frontend["memory_bytes"], 2048)
+        self.assertEqual(frontend["energy_joules"], 40)
+        self.assertEqual(pods["oxn-observability/prometheus-0"]["role"], "observability")
+
+    def test_it_reports_pods_without_energy_if_kepler_is_missing(self):
+        with mock.patch.object(KubernetesAccountant, "_prometheus", return_value=FakePrometheus(energy=False)):
+            self.accountant.consolidate()
+        frontend = self.accountant.consolidated_data["system-under-evaluation/frontend-1"]
+        self.assertNotIn("energy_joules", frontend)
+        reporter = Reporter(report_path="/tmp")
+        reporter.report_data["report"]["runs"]["run"] = {}
+        reporter.add_accountant_data(runner=mock.Mock(short_id="run", accountant=self.accountant))
+        accounting = reporter.report_data["report"]["runs"]["run"]["accounting"]
+        self.assertEqual(
+            accounting["system-under-evaluation/frontend-1"],
+            {"cpu_seconds": 12.5, "namespace": "system-under-evaluation", "role": "sue", "memory_bytes": 2048},
+        )
+        self.assertEqual(accounting["oxn-observability/prometheus-0"]["cpu_seconds"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Test the watch-based kubernetes resource cache"""
+import unittest
+from unittest import mock
+
+import gevent
+from kubernetes import client
+
+from oxn.kubernetes_cache import Informer, KubernetesCache
+
+
+def fake_pod(name, labels, resource_version="1"):
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(
+            name=name, namespace="sue", labels=labels, resource_version=resource_version
+        )
+    )
+
+
+class InformerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.list_function = mock.Mock(
+            return_value=client.V1PodList(
+                items=[
+                    fake_pod("frontend-1", {"app": "frontend", "tier": "web"}),
+                    fake_pod("cart-1", {"app": "cart"}),
+                ],
+                metadata=client.V1ListMeta(resource_version="10"),
+            )
+        )
+        self.informer = Informer(
+            kind="pods", list_function=self.list_function, namespace="sue", on_change=mock.Mock()
+        )
+        self.informer.relist()
+
+    def test_it_lists_once_and_serves_lookups_from_memory(self):
+        self.assertEqual(self.informer.get("cart-1").metadata.name, "cart-1")
+        self.assertEqual([pod.metadata.name for pod in self.informer.list("app=frontend,tier=web")], ["frontend-1"])
+        self.assertEqual(self.informer.list("app=unknown"), [])
+        self.assertEqual(self.informer.resource_version, "10")
+        self.list_function.assert_called_once()
+
+    def test_it_applies_watch_events_to_the_label_index(self):
+        self.informer.apply("MODIFIED", fake_pod("cart-1", {"app": "checkout"}, resource_version="11"))
+        self.informer.apply("DELETED", fake_pod("frontend-1", {"app": "frontend"}, resource_version="12"))
+        self.assertEqual(self.informer.list("app=cart"), [])
+        self.assertEqual([pod.metadata.name for pod in self.informer.list("app=checkout")], ["cart-1"])
+        self.assertIsNone(self.informer.get("frontend-1"))
+        self.assertEqual(self.informer.resource_version, "12")
+
+    def test_it_ignores_older_versions(self):
+        self.informer.update(fake_pod("cart-1", {"app": "cart", "version": "new"}, resource_version="20"))
+        self.informer.update(fake_pod("cart-1", {"app": "cart", "version": "old"}, resource_version="15"))
+        self.assertEqual(self.informer.get("cart-1").metadata.labels["version"], "new")
+
+
+class KubernetesCacheTest(unittest.TestCase):
+    def test_it_waits_for_watch_events(self):
+        cache = KubernetesCache(core_api=mock.Mock(), apps_api=mock.Mock())
+        informer = Informer(
+            kind="pods",
+            list_function=mock.Mock(
+                return_value=client.V1PodList(items=[], metadata=client.V1ListMeta(resource_version="1"))
+            ),
+            namespace="sue",
+            on_change=cache._notify,
+        )
+        informer.relist()
+        cache.informers[("pods", "sue")] = informer
+        gevent.spawn_later(0.05, informer.apply, "ADDED", fake_pod("cart-1", {"app": "cart"}))
+        self.assertTrue(cache.wait_for(lambda: bool(cache.list("pods", "sue", "app=cart")), timeout=1))
+        self.assertFalse(cache.wait_for(lambda: bool(cache.list("pods", "sue", "app=frontend")), timeout=0.05))
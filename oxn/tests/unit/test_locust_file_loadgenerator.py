@@ -0,0 +1,75 @@
+"""Test the locust file load generator"""
+import os
+import time
+import unittest
+
+from oxn.benchmarks.locustfile import FRONTEND_URL_VARIABLE
+from oxn.benchmarks.standins import Standins
+from oxn.benchmarks.suite import LOCUSTFILE, BenchmarkOrchestrator
+from oxn.errors import LocustException
+from oxn.locust_file_loadgenerator import LocustFileLoadgenerator, load_user_classes
+
+
+def loadgen_spec(workers=0, stages=None):
+    spec = {
+        "experiment": {
+            "loadgen": {
+                "run_time": "2s",
+                "max_users": 4,
+                "spawn_rate": 4,
+                "locust_files": [LOCUSTFILE],
+                "workers": workers,
+            }
+        }
+    }
+    if stages:
+        spec["experiment"]["loadgen"]["stages"] = stages
+    return spec
+
+
+class LocustFileLoadgeneratorTest(unittest.TestCase):
+    def test_it_loads_the_user_classes(self):
+        self.assertEqual([user.__name__ for user in load_user_classes([{"path": LOCUSTFILE}])], ["BenchmarkUser"])
+
+    def test_it_starts_one_worker_per_core_on_auto(self):
+        self.assertEqual(LocustFileLoadgenerator._worker_count("auto"), os.cpu_count())
+        self.assertEqual(LocustFileLoadgenerator._worker_count(0), 0)
+
+    def test_it_merges_the_stats_of_local_workers(self):
+        orchestrator = BenchmarkOrchestrator(experiment_config={}, address="127.0.0.5")
+        with Standins(address="127.0.0.5", series=1, samples=1, traces=1, spans=1, frontend_port=8091) as standins:
+            os.environ[FRONTEND_URL_VARIABLE] = standins.frontend_url
+            generator = LocustFileLoadgenerator(orchestrator=orchestrator, config=loadgen_spec(workers=2))
+            try:
+                generator.start()
+                self.assertEqual(generator.env.runner.worker_count, 2)
+                time.sleep(1)
+            finally:
+                generator.stop()
+        self.assertGreater(generator.env.stats.num_requests, 0)
+        self.assertEqual(generator.telemetry.totals()["GET /"]["requests"], generator.env.stats.num_requests)
+        self.assertEqual(generator.worker_processes, [])
+
+    def test_it_issues_open_loop_requests_at_the_stage_rate(self):
+        orchestrator = BenchmarkOrchestrator(experiment_config={}, address="127.0.0.5")
+        with Standins(address="127.0.0.5", series=1, samples=1, traces=1, spans=1, frontend_port=8091) as standins:
+            os.environ[FRONTEND_URL_VARIABLE] = standins.frontend_url
+            generator = LocustFileLoadgenerator(
+                orchestrator=orchestrator, config=loadgen_spec(stages=[{"duration": 2, "rate": 50}])
+            )
+            try:
+                generator.start()
+                time.sleep(1)
+            finally:
+                generator.stop()
+        # closed-loop users of the locust file would wait 0.1s between requests, 40 requests at most
+        self.assertGreater(generator.env.stats.num_requests, 40)
+        self.assertEqual(generator.env.runner.user_count, 0)
+        self.assertTrue(generator.telemetry.queueing)
+
+    def test_it_refuses_to_distribute_open_loop_load(self):
+        orchestrator = BenchmarkOrchestrator(experiment_config={}, address="127.0.0.5")
+        with self.assertRaises(LocustException):
+            LocustFileLoadgenerator(
+                orchestrator=orchestrator, config=loadgen_spec(workers=2, stages=[{"duration": 2, "rate": 50}])
+            )
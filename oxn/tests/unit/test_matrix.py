@@ -0,0 +1,144 @@
+"""Test the expansion and planning of parameter sweeps"""
+import unittest
+from unittest import mock
+
+from jsonschema import validate
+
+from oxn.engine import Engine
+from oxn.errors import OxnException
+from oxn.matrix import expand_matrix, plan_runs, shares_sue
+from oxn.report import Reporter
+from oxn.runner import ExperimentRunner
+from oxn.treatments import KubernetesMetricsExportIntervalTreatment, KubernetesNetworkDelayTreatment
+from oxn.validation import load_schema
+
+
+def sweep_spec():
+    return {
+        "experiment": {
+            "name": "sweep",
+            "version": "0.0.1",
+            "orchestrator": "kubernetes",
+            "matrix": {"delay_time": ["10ms", "50ms"], "interval": [1000, 5000]},
+            "responses": [
+                {"name": "latency", "type": "metric", "metric_name": "up", "left_window": "10s", "right_window": "10s",
+                 "step": 1, "target": "sue"}
+            ],
+            "treatments": [
+                {
+                    "delay": {
+                        "action": "delay",
+                        "params": {"delay_time": "${delay_time}", "duration": "1m", "delay_jitter": "${delay_time}/2"},
+                    }
+                },
+                {
+                    "otel_interval": {
+                        "action": "kubernetes_otel_metrics_interval",
+                        "params": {"label": "app", "label_selector": "cart", "interval": "${interval}"},
+                    }
+                },
+            ],
+            "sue": {"compose": "opentelemetry-demo/docker-compose.yml"},
+            "loadgen": {"run_time": "2m"},
+        }
+    }
+
+
+treatment_keys = {
+    "delay": KubernetesNetworkDelayTreatment,
+    "kubernetes_otel_metrics_interval": KubernetesMetricsExportIntervalTreatment,
+}
+
+
+class MatrixTest(unittest.TestCase):
+    def test_it_expands_all_combinations(self):
+        planned = expand_matrix(sweep_spec())
+        self.assertEqual(len(planned), 4)
+        self.assertEqual(planned[1].cell, "delay_time=10ms,interval=5000")
+        delay, interval = planned[1].spec["experiment"]["treatments"]
+        self.assertEqual(delay["delay"]["params"]["delay_time"], "10ms")
+        self.assertEqual(delay["delay"]["params"]["delay_jitter"], "10ms/2")
+        # lone placeholders keep the type of the matrix value
+        self.assertEqual(interval["otel_interval"]["params"]["interval"], 5000)
+        self.assertNotIn("matrix", planned[1].spec["experiment"])
+
+    def test_it_raises_on_undefined_placeholders(self):
+        spec = sweep_spec()
+        spec["experiment"]["matrix"] = {"delay_time": ["10ms"]}
+        with self.assertRaises(OxnException):
+            expand_matrix(spec)
+
+    def test_it_expands_specs_without_matrix_into_a_single_run(self):
+        spec = sweep_spec()
+        del spec["experiment"]["matrix"]
+        spec["experiment"]["treatments"] = spec["experiment"]["treatments"][:1]
+        plan = plan_runs(spec, runs=3, treatment_keys=treatment_keys)
+        self.assertEqual(len(plan), 3)
+        self.assertTrue(all(shares_sue(planned, following) for planned, following in zip(plan, plan[1:])))
+
+    def test_it_groups_runs_by_compile_time_treatments(self):
+        plan = plan_runs(sweep_spec(), runs=2, treatment_keys=treatment_keys)
+        self.assertEqual(
+            [planned.cell for planned in plan],
+            [
+                "delay_time=10ms,interval=1000",
+                "delay_time=10ms,interval=1000",
+                "delay_time=50ms,interval=1000",
+                "delay_time=50ms,interval=1000",
+                "delay_time=10ms,interval=5000",
+                "delay_time=10ms,interval=5000",
+                "delay_time=50ms,interval=5000",
+                "delay_time=50ms,interval=5000",
+            ],
+        )
+        restarts = [idx for idx, planned in enumerate(plan[:-1]) if not shares_sue(planned, plan[idx + 1])]
+        self.assertEqual(restarts, [3])
+
+    def test_it_validates_against_the_schema(self):
+        validate(instance=sweep_spec(), schema=load_schema())
+
+    def test_it_validates_placeholders_in_non_string_fields_after_expansion(self):
+        spec = sweep_spec()
+        spec["experiment"]["matrix"]["step"] = [1, 5]
+        spec["experiment"]["responses"][0]["step"] = "${step}"
+        engine = Engine(configuration_path="sweep.yml", report_path="/tmp/")
+        engine.spec = spec
+        engine.validate_syntax()
+        spec["experiment"]["matrix"]["step"] = [1, "5s"]
+        with self.assertRaises(OxnException):
+            engine.validate_syntax()
+
+
+class CompileTimeReuseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.runner = ExperimentRunner.__new__(ExperimentRunner)
+        self.runner.timer = mock.MagicMock()
+        self.applied = mock.Mock(start=1.0, applied=2.0)
+        self.applied.name = "otel_interval"
+        self.current = mock.Mock(start=None, applied=None)
+        self.current.name = "otel_interval"
+        self.current.is_runtime.return_value = False
+        self.runner.treatments = {"otel_interval": self.current}
+
+    def test_it_keeps_adopted_treatments_applied(self):
+        self.runner.adopt_compile_time_treatments(applied={"otel_interval": self.applied})
+        self.assertEqual((self.current.start, self.current.applied), (1.0, 2.0))
+        self.runner.clean_compile_time_treatments(keep=True, applied={"otel_interval": self.applied})
+        self.assertIsNotNone(self.current.end)
+        self.applied.clean.assert_not_called()
+        self.current.clean.assert_not_called()
+
+    def test_it_cleans_the_applied_instances(self):
+        self.runner.clean_compile_time_treatments(applied={"otel_interval": self.applied})
+        self.applied.clean.assert_called_once()
+        self.current.clean.assert_not_called()
+        self.assertEqual(self.applied.end, self.current.end)
+
+    def test_it_indexes_the_report_by_parameters(self):
+        reporter = Reporter(report_path="/tmp/")
+        for short_id in ["a", "b"]:
+            runner = mock.Mock(short_id=short_id, parameters={"delay_time": "10ms"})
+            reporter.report_data["report"]["runs"][short_id] = {}
+            reporter.add_parameter_data(runner=runner)
+        self.assertEqual(reporter.report_data["report"]["matrix"]["delay_time=10ms"]["runs"], ["a", "b"])
+        self.assertEqual(reporter.report_data["report"]["runs"]["a"]["parameters"], {"delay_time": "10ms"})
@@ -0,0 +1,95 @@
+"""Test the open-loop load generation"""
+import random
+import unittest
+
+import gevent
+from locust import User, task
+from locust.env import Environment
+
+from oxn.errors import LocustException
+from oxn.open_loop import OpenLoopDriver, arrival_offsets, is_open_loop
+from oxn.telemetry import RequestTelemetry
+
+
+class SlowUser(User):
+    tasks_run = 0
+
+    @task
+    def slow(self):
+        SlowUser.tasks_run += 1
+        gevent.sleep(0.2)
+
+
+def first_offsets(stages, count, arrival="uniform"):
+    offsets = arrival_offsets(stages, arrival, rng=random.Random(42))
+    return [next(offsets) for _ in range(count)]
+
+
+class ArrivalScheduleTest(unittest.TestCase):
+    def test_it_detects_open_loop_stages(self):
+        self.assertFalse(is_open_loop(None))
+        self.assertFalse(is_open_loop([{"duration": 10, "users": 5, "spawn_rate": 1}]))
+        self.assertTrue(is_open_loop([{"duration": 10, "rate": 5}]))
+        with self.assertRaises(LocustException):
+            is_open_loop([{"duration": 10, "rate": 5}, {"duration": 20, "users": 5, "spawn_rate": 1}])
+
+    def test_it_spaces_uniform_arrivals_by_the_stage_rate(self):
+        offsets = first_offsets([{"duration": 1, "rate": 4}, {"duration": 2, "rate": 2}], 6)
+        self.assertEqual(offsets, [0.25, 0.5, 0.75, 1.5, 2.0, 2.5])
+
+    def test_it_skips_idle_stages(self):
+        offsets = first_offsets([{"duration": 2, "rate": 0}, {"duration": 3, "rate": 1}], 2)
+        self.assertEqual(offsets, [3.0, 4.0])
+
+    def test_poisson_arrivals_match_the_rate_on_average(self):
+        offsets = first_offsets([{"duration": 10, "rate": 100}], 1000, arrival="poisson")
+        self.assertAlmostEqual(offsets[-1], 10, delta=1)
+        self.assertTrue(all(later > earlier for earlier, later in zip(offsets, offsets[1:])))
+
+    def test_ramped_rates_issue_the_integral_of_the_rate(self):
+        offsets = first_offsets([{"duration": 0, "rate": 0}, {"duration": 10, "rate": 10, "ramp": True}], 60)
+        # a linear ramp from 0 to 10 arrivals per second issues 50 arrivals within its 10s
+        self.assertEqual(len([offset for offset in offsets if offset < 10]), 50)
+        self.assertAlmostEqual(offsets[0], 2 ** 0.5, delta=0.01)
+
+    def test_it_rejects_unknown_arrivals(self):
+        with self.assertRaises(LocustException):
+            first_offsets([{"duration": 1, "rate": 1}], 1, arrival="bursty")
+
+
+class OpenLoopDriverTest(unittest.TestCase):
+    def run_driver(self, max_in_flight):
+        SlowUser.tasks_run = 0
+        telemetry = RequestTelemetry()
+        driver = OpenLoopDriver(
+            environment=Environment(user_classes=[SlowUser]),
+            user_classes=[SlowUser],
+            stages=[{"duration": 1, "rate": 20}],
+            max_in_flight=max_in_flight,
+            telemetry=telemetry,
+        )
+        driver.start()
+        gevent.sleep(1)
+        driver.stop()
+        return driver, telemetry
+
+    def test_arrivals_do_not_wait_for_slow_tasks(self):
+        driver, telemetry = self.run_driver(max_in_flight=100)
+        # a closed-loop user would only run 5 tasks of 0.2s within a second
+        self.assertGreaterEqual(driver.arrivals, 18)
+        self.assertGreaterEqual(SlowUser.tasks_run, 18)
+        # every concurrently running task needs its own user
+        self.assertGreaterEqual(driver.user_count, 4)
+        arrivals = sum(aggregate.requests for aggregate in telemetry.queueing.values())
+        self.assertEqual(arrivals, driver.arrivals)
+
+    def test_it_measures_queueing_when_all_users_are_busy(self):
+        driver, telemetry = self.run_driver(max_in_flight=1)
+        self.assertEqual(driver.user_count, 1)
+        longest = max(aggregate.latencies.value_at_quantile(1.0) for aggregate in telemetry.queueing.values())
+        # queued arrivals wait up to the 0.2s response time of the task in front of them
+        self.assertGreater(longest, 100_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Test the background post-processing pipeline"""
+import time
+import unittest
+
+from oxn.errors import OxnException
+from oxn.pipeline import PostProcessingPipeline, RunResult
+
+
+class PostProcessingPipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.processed = []
+
+    def _handler(self, result):
+        time.sleep(0.01)
+        self.processed.append(result.runner)
+
+    def test_it_processes_all_runs_in_order(self):
+        pipeline = PostProcessingPipeline(handler=self._handler, depth=2)
+        for run in range(5):
+            pipeline.submit(RunResult(runner=run, request_stats=None))
+        pipeline.join()
+        pipeline.close()
+        self.assertEqual(self.processed, [0, 1, 2, 3, 4])
+
+    def test_it_bounds_the_queue(self):
+        pipeline = PostProcessingPipeline(handler=self._handler, depth=1)
+        for run in range(3):
+            pipeline.submit(RunResult(runner=run, request_stats=None))
+            self.assertLessEqual(pipeline.queue.qsize(), 1)
+        pipeline.join()
+        pipeline.close()
+
+    def test_it_raises_on_failed_runs(self):
+        def failing_handler(result):
+            raise ValueError("cannot write to store")
+
+        pipeline = PostProcessingPipeline(handler=failing_handler, depth=1)
+        pipeline.submit(RunResult(runner=0, request_stats=None))
+        with self.assertRaises(OxnException) as context:
+            pipeline.join()
+        pipeline.close()
+        self.assertIn("cannot write to store", context.exception.explanation)
+
+    def test_it_fails_fast_on_the_next_submit(self):
+        def failing_handler(result):
+            raise ValueError("cannot write to store")
+
+        pipeline = PostProcessingPipeline(handler=failing_handler, depth=1)
+        pipeline.submit(RunResult(runner=0, request_stats=None))
+        pipeline.queue.join()
+        with self.assertRaises(OxnException):
+            pipeline.submit(RunResult(runner=1, request_stats=None))
+        pipeline.close()
+
+    def test_closing_drains_the_queue(self):
+        pipeline = PostProcessingPipeline(handler=self._handler, depth=3)
+        for run in range(3):
+            pipeline.submit(RunResult(runner=run, request_stats=None))
+        pipeline.close()
+        self.assertEqual(self.processed, [0, 1, 2])
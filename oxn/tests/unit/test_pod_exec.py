@@ -0,0 +1,59 @@
+"""Test the concurrent exec fan-out of the kubernetes orchestrator"""
+import time
+import unittest
+from unittest import mock
+
+from kubernetes import client
+
+from oxn.kubernetes_orchestrator import KubernetesOrchestrator
+
+
+def fake_pod(name):
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name=name, namespace="sue", labels={"app": "cart"}),
+        spec=client.V1PodSpec(containers=[client.V1Container(name="cart")]),
+    )
+
+
+def fake_stream(delays):
+    def _stream(_, name, **kwargs):
+        time.sleep(delays.get(name, 0.1))
+        return "1\n" if name == "cart-2" else "0\n"
+    return _stream
+
+
+class PodExecFanOutTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orc = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+        self.orc.kube_client = mock.Mock()
+        self.orc.cache = mock.Mock()
+        self.orc.cache.list.return_value = [fake_pod(f"cart-{i}") for i in range(5)]
+        self.orc.exec_parallelism = 16
+        self.orc.exec_timeout = 30
+
+    def test_it_executes_on_all_pods_concurrently(self):
+        with mock.patch("oxn.kubernetes_orchestrator.stream", fake_stream({})):
+            started = time.monotonic()
+            results = self.orc.fan_out_console_command("app", "cart", "sue", ["tc", "qdisc"])
+            elapsed = time.monotonic() - started
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual([result.pod for result in results], [f"cart-{i}" for i in range(5)])
+        self.assertEqual([result.exit_code for result in results], [0, 0, 1, 0, 0])
+
+    def test_it_bounds_the_fan_out(self):
+        with mock.patch("oxn.kubernetes_orchestrator.stream", fake_stream({})):
+            started = time.monotonic()
+            self.orc.fan_out_console_command("app", "cart", "sue", ["tc"], max_parallel=1)
+            self.assertGreaterEqual(time.monotonic() - started, 0.5)
+
+    def test_it_times_out_single_pods(self):
+        with mock.patch("oxn.kubernetes_orchestrator.stream", fake_stream({"cart-4": 1.0})):
+            results = self.orc.fan_out_console_command("app", "cart", "sue", ["tc"], timeout=0.2)
+        self.assertEqual(results[4].exit_code, -1)
+        self.assertEqual(results[0].exit_code, 0)
+
+    def test_it_aggregates_the_first_failure(self):
+        with mock.patch("oxn.kubernetes_orchestrator.stream", fake_stream({})):
+            status_code, output = self.orc.execute_console_command_on_all_matching_pods("app", "cart", "sue", ["tc"])
+        self.assertEqual(status_code, 1)
+        self.assertIn("cart-2", output)
@@ -3,6 +3,7 @@ import unittest
 
 import requests
 from requests import Session
+from unittest import mock
 from unittest.mock import patch
 
 from oxn.errors import PrometheusException
@@ -73,3 +74,40 @@ class PrometheusTests(unittest.TestCase):
             query=query, start=a_minute_ago, end=now, step="5s"
         )
         self.assertTrue(result == {"data": "mock_data"})
+
+
+class PrometheusReloadTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.api = Prometheus.__new__(Prometheus)
+        self.api.session = mock.Mock()
+        self.api.server_url = "http://prometheus:9090/"
+        self.api.base_url = "http://prometheus:9090/api/v1/"
+        self.api.endpoints = {"config": "status/config", "runtimeinfo": "status/runtimeinfo", "reload": "-/reload"}
+        self.runtimeinfo = [
+            {"data": {"lastConfigTime": "t0", "reloadConfigSuccess": True}},
+            {"data": {"lastConfigTime": "t1", "reloadConfigSuccess": True}},
+            {"data": {"lastConfigTime": "t2", "reloadConfigSuccess": True}},
+        ]
+        self.configs = [
+            {"data": {"yaml": "global:\n  scrape_interval: 15s\n"}},
+            {"data": {"yaml": "global:\n  scrape_interval: 1m\n"}},
+        ]
+
+        def get(url):
+            response = mock.Mock()
+            response.json.return_value = (
+                self.runtimeinfo.pop(0) if url.endswith("runtimeinfo") else self.configs.pop(0)
+            )
+            return response
+
+        self.api.session.get.side_effect = get
+        self.api.session.post.return_value.status_code = 200
+
+    def test_it_reloads_until_the_expected_config_is_loaded(self):
+        self.assertTrue(self.api.reload(expected_global={"scrape_interval": "60s"}, timeout=1, interval=0))
+        self.assertEqual(self.api.session.post.call_count, 2)
+        self.api.session.post.assert_called_with(url="http://prometheus:9090/-/reload")
+
+    def test_it_reports_disabled_lifecycle_api(self):
+        self.api.session.post.return_value.status_code = 403
+        self.assertFalse(self.api.reload(expected_global={"scrape_interval": "60s"}, timeout=1, interval=0))
@@ -0,0 +1,90 @@
+"""Test the streaming of experiment reports"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from oxn.report import Reporter
+from oxn.report_stream import ReportStream, read_index, read_report, read_run
+
+
+class ReportStreamTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "report.yaml")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_it_reads_runs_of_unfinished_experiments(self):
+        stream = ReportStream(path=self.path)
+        stream.append_run("a", {"interactions": {}})
+        stream.append_run("b", {"interactions": {"interaction_0": {"p_value": "0.1"}}})
+        self.assertIsNone(read_index(self.path))
+        self.assertEqual(list(read_report(self.path)["report"]["runs"]), ["a", "b"])
+        # a run that was cut off while writing is skipped
+        with open(self.path, "a") as fp:
+            fp.write("---\nrun_key: c\nrun: {interactions: [\n")
+        self.assertEqual(list(read_report(self.path)["report"]["runs"]), ["a", "b"])
+
+    def test_the_index_points_to_every_run(self):
+        stream = ReportStream(path=self.path)
+        stream.append_run("a", {"loadgen": {"loadgen_total_requests": 1}})
+        stream.append_run("b", {"loadgen": {"loadgen_total_requests": 2}})
+        stream.close(report={"experiment_key": "abc"})
+        index = read_index(self.path)
+        self.assertEqual(index["experiment_key"], "abc")
+        self.assertEqual(list(index["index"]), ["a", "b"])
+        self.assertEqual(read_run(self.path, "b"), {"loadgen": {"loadgen_total_requests": 2}})
+        report = read_report(self.path)["report"]
+        self.assertEqual(report["runs"]["a"]["loadgen"]["loadgen_total_requests"], 1)
+
+    def test_it_reads_single_document_reports(self):
+        with open(self.path, "w") as fp:
+            yaml.dump({"report": {"runs": {"a": {"interactions": {}}}, "experiment_key": "abc"}}, fp)
+        report = read_report(self.path)["report"]
+        self.assertEqual((list(report["runs"]), report["experiment_key"]), (["a"], "abc"))
+
+
+class StreamingReporterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.reporter = Reporter(report_path=self.directory.name + "/")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def report_run(self, run_key, interactions):
+        for _ in range(interactions):
+            self.reporter._add_interaction_data(
+                treatment_name="pause",
+                treatment_start=100,
+                treatment_type="PauseTreatment",
+                treatment_end=110,
+                response_name="latency",
+                response_type="metric",
+                response_start=90,
+                response_end=120,
+                p_value="0.5",
+                test_statistic="1.0",
+                test_performed="welch t-test",
+                store_key=f"{run_key}/latency",
+            )
+        self.reporter.assemble_interaction_data(run_key=run_key)
+        self.reporter.add_timing_data(timer=mock.Mock(summary=lambda: {}), runner=mock.Mock(short_id=run_key))
+        self.reporter.write_run(run_key=run_key)
+
+    def test_runs_only_hold_their_own_interactions(self):
+        for run_key in ("a", "b", "c"):
+            self.report_run(run_key, interactions=2)
+        self.assertEqual(self.reporter.report_data["report"]["runs"], {})
+        self.reporter.dump_report_data()
+        runs = read_report(self.reporter.stream.path)["report"]["runs"]
+        self.assertEqual([len(run["interactions"]) for run in runs.values()], [2, 2, 2])
+        self.assertEqual(runs["c"]["interactions"]["interaction_0"]["store_key"], "c/latency")
+
+
+if __name__ == "__main__":
+    unittest.main()
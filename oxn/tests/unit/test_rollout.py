@@ -0,0 +1,65 @@
+"""Test the watch-based rollout wait of the kubernetes orchestrator"""
+import unittest
+from unittest import mock
+
+import gevent
+from kubernetes import client
+
+from oxn.kubernetes_cache import Informer, KubernetesCache
+from oxn.kubernetes_orchestrator import KubernetesOrchestrator, RESTARTED_AT_ANNOTATION
+
+
+def fake_deployment(generation, observed_generation, replicas, updated, available, resource_version):
+    return client.V1Deployment(
+        metadata=client.V1ObjectMeta(
+            name="otelcol", namespace="sue", generation=generation, resource_version=str(resource_version)
+        ),
+        spec=client.V1DeploymentSpec(
+            replicas=2, selector=client.V1LabelSelector(match_labels={"app": "otelcol"}), template=client.V1PodTemplateSpec()
+        ),
+        status=client.V1DeploymentStatus(
+            observed_generation=observed_generation,
+            replicas=replicas,
+            updated_replicas=updated,
+            available_replicas=available,
+        ),
+    )
+
+
+class RolloutTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.orc = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+        self.orc.cache = KubernetesCache(core_api=mock.Mock(), apps_api=mock.Mock())
+        self.informer = Informer(
+            kind="deployments",
+            list_function=mock.Mock(
+                return_value=client.V1DeploymentList(
+                    items=[fake_deployment(1, 1, 2, 2, 2, resource_version=1)],
+                    metadata=client.V1ListMeta(resource_version="1"),
+                )
+            ),
+            namespace="sue",
+            on_change=self.orc.cache._notify,
+        )
+        self.informer.relist()
+        self.orc.cache.informers[("deployments", "sue")] = self.informer
+        self.orc.api_client = mock.Mock()
+        self.orc.api_client.patch_namespaced_deployment.return_value = fake_deployment(2, 1, 2, 2, 2, resource_version=2)
+
+    def _roll_out(self):
+        for resource_version, status in enumerate([(2, 3, 1, 2), (2, 3, 2, 2), (2, 2, 2, 2)], start=3):
+            gevent.sleep(0.02)
+            observed, replicas, updated, available = status
+            self.informer.apply(
+                "MODIFIED", fake_deployment(2, observed, replicas, updated, available, resource_version)
+            )
+
+    def test_it_restarts_with_an_annotation_and_waits_for_the_new_generation(self):
+        rollout = gevent.spawn(self._roll_out)
+        self.assertTrue(self.orc.restart_pods_of_deployment(self.informer.get("otelcol"), timeout=1))
+        self.assertTrue(rollout.dead)
+        patch_body = self.orc.api_client.patch_namespaced_deployment.call_args.kwargs["body"]
+        self.assertIn(RESTARTED_AT_ANNOTATION, patch_body["spec"]["template"]["metadata"]["annotations"])
+
+    def test_it_times_out_on_incomplete_rollouts(self):
+        self.assertFalse(self.orc.restart_pods_of_deployment(self.informer.get("otelcol"), timeout=0.1))
@@ -0,0 +1,166 @@
+"""Test the background resource sampling of sue containers"""
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import gevent
+
+from oxn.responses import ResourceResponseVariable
+from oxn.sampler import ResourceSampler, cgroup_path, read_docker_stats
+from oxn.statistics import StatisticsStage
+
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:    {lo}       1    0    0    0     0          0         0    {lo}       1    0    0    0     0       0          0
+  eth0:    {rx}      10    0    0    0     0          0         0    {tx}      10    0    0    0     0       0          0
+"""
+
+
+class FakeHost:
+    """Cgroup v2 and procfs files of one container in a temporary directory"""
+
+    def __init__(self, root, container_id="abc", pid=42):
+        self.cgroup = os.path.join(root, "cgroup", "system.slice", f"docker-{container_id}.scope")
+        self.net = os.path.join(root, "proc", str(pid), "net")
+        os.makedirs(self.cgroup)
+        os.makedirs(self.net)
+        self.cgroup_root = os.path.join(root, "cgroup")
+        self.proc_root = os.path.join(root, "proc")
+
+    def write(self, cpu_usec, memory, rbytes, wbytes, rx, tx):
+        with open(os.path.join(self.cgroup, "cpu.stat"), "w") as cpu:
+            cpu.write(f"usage_usec {cpu_usec}\nuser_usec {cpu_usec}\nsystem_usec 0\n")
+        with open(os.path.join(self.cgroup, "memory.current"), "w") as memory_file:
+            memory_file.write(f"{memory}\n")
+        with open(os.path.join(self.cgroup, "io.stat"), "w") as io:
+            io.write(f"8:0 rbytes={rbytes} wbytes={wbytes} rios=1 wios=1 dbytes=0 dios=0\n")
+        with open(os.path.join(self.net, "dev"), "w") as dev:
+            dev.write(NET_DEV.format(lo=999, rx=rx, tx=tx))
+
+
+class ResourceSamplerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.host = FakeHost(self.directory.name)
+        self.container = mock.Mock(id="abc", attrs={"State": {"Pid": 42}})
+        self.container.name = "frontend"
+        self.sampler = ResourceSampler(
+            containers={"frontend": self.container},
+            interval=0.1,
+            cgroup_root=self.host.cgroup_root,
+            proc_root=self.host.proc_root,
+        )
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_it_finds_the_cgroup_of_a_container(self):
+        self.host.write(0, 0, 0, 0, 0, 0)
+        self.assertEqual(cgroup_path("abc", root=self.host.cgroup_root), self.host.cgroup)
+        self.assertIsNone(cgroup_path("other", root=self.host.cgroup_root))
+
+    def test_it_computes_rates_between_samples(self):
+        self.host.write(cpu_usec=1_000_000, memory=100, rbytes=10, wbytes=20, rx=1000, tx=2000)
+        with mock.patch("oxn.sampler.time.time", return_value=100.0):
+            self.sampler.sample()
+        self.host.write(cpu_usec=2_000_000, memory=300, rbytes=30, wbytes=20, rx=5000, tx=2000)
+        with mock.patch("oxn.sampler.time.time", return_value=102.0):
+            self.sampler.sample()
+        self.assertEqual(self.sampler.sources, {"frontend": "cgroup"})
+        [row] = self.sampler.rows(start=0, end=200)
+        self.assertEqual(row["timestamp"], 102.0)
+        self.assertEqual(row["cpu_cores"], 0.5)
+        self.assertEqual(row["memory_bytes"], 300)
+        self.assertEqual(row["block_read_bytes_per_second"], 10)
+        # loopback traffic does not leave the container
+        self.assertEqual(row["network_rx_bytes_per_second"], 2000)
+        self.assertEqual(row["network_tx_bytes_per_second"], 0)
+        self.assertEqual(self.sampler.rows(start=0, end=200, container="other"), [])
+
+    def test_counters_that_start_over_have_no_rate(self):
+        self.host.write(cpu_usec=5_000_000, memory=100, rbytes=10, wbytes=20, rx=1000, tx=2000)
+        with mock.patch("oxn.sampler.time.time", return_value=100.0):
+            self.sampler.sample()
+        # the container restarted between the samples
+        self.host.write(cpu_usec=1_000_000, memory=50, rbytes=10, wbytes=0, rx=3000, tx=0)
+        with mock.patch("oxn.sampler.time.time", return_value=102.0):
+            self.sampler.sample()
+        [row] = self.sampler.rows(start=0, end=200)
+        self.assertTrue(math.isnan(row["cpu_cores"]))
+        self.assertTrue(math.isnan(row["block_write_bytes_per_second"]))
+        self.assertTrue(math.isnan(row["network_tx_bytes_per_second"]))
+        self.assertEqual(row["block_read_bytes_per_second"], 0)
+        self.assertEqual(row["network_rx_bytes_per_second"], 1000)
+
+    def test_it_falls_back_to_docker_stats(self):
+        self.container.id = "not-in-cgroups"
+        self.container.stats.return_value = {
+            "cpu_stats": {"cpu_usage": {"total_usage": 3 * 10 ** 9}},
+            "memory_stats": {"usage": 7},
+            "networks": {"eth0": {"rx_bytes": 1, "tx_bytes": 2}},
+            "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 5}, {"op": "write", "value": 6}]},
+        }
+        self.sampler.sample()
+        self.assertEqual(self.sampler.sources, {"frontend": "docker"})
+        self.assertEqual(self.sampler.samples[0]["cpu_seconds"], 3)
+        self.container.stats.assert_called_with(stream=False, one_shot=True)
+
+    def test_it_samples_in_the_background(self):
+        self.host.write(0, 0, 0, 0, 0, 0)
+        self.sampler.start()
+        gevent.sleep(0.35)
+        self.sampler.stop()
+        # samples at 0, 0.1, 0.2 and 0.3s and a final sample on stop
+        self.assertGreaterEqual(len(self.sampler.samples), 4)
+        self.assertIsNone(self.sampler.greenlet)
+
+    def test_it_labels_samples_like_metrics(self):
+        self.host.write(0, 0, 0, 0, 0, 0)
+        for timestamp in (100.0, 101.0, 102.0, 103.0):
+            with mock.patch("oxn.sampler.time.time", return_value=timestamp):
+                self.sampler.sample()
+        response = ResourceResponseVariable(
+            sampler=self.sampler,
+            name="frontend_memory",
+            experiment_start=101.0,
+            experiment_end=102.0,
+            right_window="1s",
+            left_window="0s",
+            description={"left_window": "0s", "right_window": "1s", "statistic": "memory_bytes"},
+        )
+        data = response.observe()
+        self.assertEqual(list(data["timestamp"]), [101.0, 102.0, 103.0])
+        response.label(treatment_start=101.5, treatment_end=102.5, label_column="pause", label="pause")
+        self.assertEqual(list(response.data["pause"]), ["NoTreatment", "pause", "NoTreatment"])
+        self.assertTrue((response.data["frontend_memory"] == 0).all())
+
+    def test_empty_responses_are_compared_as_missing(self):
+        response = ResourceResponseVariable(
+            sampler=self.sampler,
+            name="frontend_cpu",
+            experiment_start=101.0,
+            experiment_end=102.0,
+            right_window="0s",
+            left_window="0s",
+            description={"left_window": "0s", "right_window": "0s"},
+        )
+        self.assertTrue(response.observe().empty)
+        for treatment in ("pause", "delay"):
+            response.label(treatment_start=101.0, treatment_end=102.0, label_column=treatment, label=treatment)
+        results = StatisticsStage(resamples=10).compare({"key": (response.data, "frontend_cpu")}, ["pause", "delay"])
+        self.assertTrue(math.isnan(results["key"]["pause"]["p_value"]))
+        self.assertEqual(results["key"]["delay"]["treatment_observations"], 0)
+
+
+class DockerStatsTest(unittest.TestCase):
+    def test_missing_sections_count_as_zero(self):
+        sample = read_docker_stats({"cpu_stats": {"cpu_usage": {"total_usage": 0}}, "blkio_stats": {}})
+        self.assertEqual(sample["network_rx_bytes"], 0)
+        self.assertEqual(sample["block_write_bytes"], 0)
+        self.assertFalse(math.isnan(sample["memory_bytes"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Test the load shapes of the load generation"""
+import os
+import tempfile
+import time
+import unittest
+
+import gevent
+
+from oxn.errors import LocustException
+from oxn.shapes import StageScheduler, build_stages, level_at
+
+
+class RecordingRunner:
+    def __init__(self):
+        self.calls = []
+
+    def start(self, user_count, spawn_rate):
+        self.calls.append((time.time(), user_count, spawn_rate))
+
+
+class BuildStagesTest(unittest.TestCase):
+    def test_it_ramps_linearly(self):
+        stages = build_stages({"type": "ramp", "from": 10, "to": 110, "duration": "100s"})
+        self.assertEqual(level_at(stages, "users", 0), 10)
+        self.assertEqual(level_at(stages, "users", 50), 60)
+        self.assertEqual(level_at(stages, "users", 500), 110)
+
+    def test_it_steps(self):
+        stages = build_stages({"type": "step", "from": 5, "step": 10, "steps": 3, "step_duration": "1m"})
+        self.assertEqual([level_at(stages, "users", offset) for offset in (0, 60, 150, 1000)], [5, 15, 25, 25])
+
+    def test_it_spikes_and_returns_to_the_base(self):
+        stages = build_stages({"type": "spike", "base": 2, "peak": 50, "at": 30, "duration": "10s", "unit": "rate"})
+        self.assertEqual([level_at(stages, "rate", offset) for offset in (29.9, 30, 39.9, 40, 400)], [2, 50, 50, 2, 2])
+
+    def test_it_replays_recorded_rates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rps.csv")
+            with open(path, "w") as recording:
+                recording.write("second,rps\n0,10\n1,12.5\n2,8\n")
+            stages = build_stages({"type": "replay", "path": path, "column": "rps", "scale": 2})
+        self.assertEqual([level_at(stages, "rate", offset) for offset in (0.5, 1.5, 2.5, 10)], [20, 25, 16, 16])
+
+    def test_it_rejects_unknown_shapes_and_recordings(self):
+        with self.assertRaises(LocustException):
+            build_stages({"type": "sawtooth"})
+        with self.assertRaises(LocustException):
+            build_stages({"type": "replay", "path": "/does/not/exist.csv"})
+
+
+class StageSchedulerTest(unittest.TestCase):
+    def test_it_starts_every_stage_at_its_offset(self):
+        runner = RecordingRunner()
+        stages = [{"duration": 0.2, "users": 1}, {"duration": 0.4, "users": 5, "spawn_rate": 5}, {"duration": 1, "users": 3}]
+        scheduler = StageScheduler(runner=runner, stages=stages, default_spawn_rate=2)
+        origin = time.time()
+        scheduler.start()
+        gevent.sleep(0.6)
+        scheduler.stop()
+        self.assertEqual([(users, spawn_rate) for _, users, spawn_rate in runner.calls], [(1, 2), (5, 5), (3, 2)])
+        offsets = [started - origin for started, _, _ in runner.calls]
+        for offset, expected in zip(offsets, (0, 0.2, 0.4)):
+            self.assertAlmostEqual(offset, expected, delta=0.05)
+
+    def test_ramps_spawn_at_the_rate_that_reaches_the_users_at_the_end(self):
+        runner = RecordingRunner()
+        scheduler = StageScheduler(runner=runner, stages=build_stages({"type": "ramp", "to": 20, "duration": 10}))
+        scheduler.start()
+        gevent.sleep(0.05)
+        scheduler.stop()
+        self.assertEqual(runner.calls[-1][1:], (20, 2.0))
+
+    def test_it_holds_the_first_stage_until_anchored(self):
+        runner = RecordingRunner()
+        stages = [{"duration": 0.2, "users": 1}, {"duration": 1, "users": 4}]
+        scheduler = StageScheduler(runner=runner, stages=stages)
+        scheduler.start(hold=True)
+        gevent.sleep(0.3)
+        self.assertEqual([users for _, users, _ in runner.calls], [1])
+        anchored = time.time()
+        scheduler.anchor(anchored)
+        gevent.sleep(0.3)
+        scheduler.stop()
+        self.assertEqual([users for _, users, _ in runner.calls], [1, 1, 4])
+        self.assertAlmostEqual(runner.calls[-1][0] - anchored, 0.2, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
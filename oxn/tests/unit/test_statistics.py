@@ -0,0 +1,130 @@
+"""Test the statistics of treatment and response interactions"""
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from oxn.errors import OxnException
+from oxn.report import Reporter
+from oxn.statistics import StatisticsStage, adjust_pvalues, bootstrap_interval, cohens_d, compare_treatment
+
+
+def labeled_response(size=400, shift=1.0, seed=1):
+    """A response whose second quarter is labeled pause and shifted, with every third value missing"""
+    rng = np.random.default_rng(seed)
+    treated = (np.arange(size) >= size // 4) & (np.arange(size) < size // 2)
+    values = rng.normal(10, 2, size) + np.where(treated, shift, 0)
+    values[::3] = np.nan
+    return pd.DataFrame(
+        {
+            "duration": values,
+            "pause": np.where(treated, "pause", "NoTreatment"),
+            "delay": np.where(np.arange(size) >= size // 2, "delay", "NoTreatment"),
+        }
+    )
+
+
+class EffectSizeTest(unittest.TestCase):
+    def test_cohens_d_uses_the_pooled_standard_deviation(self):
+        control, treated = np.array([1.0, 2, 3, 4]), np.array([3.0, 4, 5, 6])
+        self.assertAlmostEqual(cohens_d(control, treated), 2 / np.std([1, 2, 3, 4], ddof=1))
+        self.assertTrue(np.isnan(cohens_d(np.array([1.0]), treated)))
+
+    def test_cliffs_delta_counts_dominating_pairs(self):
+        control, treated = np.array([1.0, 2, 3, 3]), np.array([3.0, 4, 5])
+        pairs = [np.sign(t - c) for t in treated for c in control]
+        comparison = compare_treatment(np.concatenate([control, treated]), np.array([False] * 4 + [True] * 3))
+        self.assertAlmostEqual(comparison["cliffs_delta"], np.mean(pairs))
+
+    def test_empty_samples_are_missing_without_warnings(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            comparison = compare_treatment(np.array([1.0, 2.0, 3.0]), np.array([False, False, False]))
+        self.assertTrue(np.isnan(comparison["p_value"]))
+
+    def test_bootstrap_interval_covers_the_shift(self):
+        rng = np.random.default_rng(3)
+        low, high = bootstrap_interval(rng.normal(0, 1, 500), rng.normal(2, 1, 500), resamples=500)
+        self.assertLess(low, 2)
+        self.assertGreater(high, 2)
+        self.assertLess(high - low, 0.5)
+
+
+class AdjustPvaluesTest(unittest.TestCase):
+    def test_holm_multiplies_by_the_remaining_tests(self):
+        adjusted = adjust_pvalues([0.01, 0.04, 0.03, float("nan")], method="holm")
+        self.assertTrue(np.allclose(adjusted[:3], [0.03, 0.06, 0.06]))
+        self.assertTrue(np.isnan(adjusted[3]))
+
+    def test_benjamini_hochberg_keeps_the_order(self):
+        adjusted = adjust_pvalues([0.01, 0.04, 0.03, 0.5], method="fdr_bh")
+        self.assertTrue(np.allclose(adjusted, [0.04, 0.04 * 4 / 3, 0.04 * 4 / 3, 0.5]))
+
+    def test_it_rejects_unknown_corrections(self):
+        with self.assertRaises(OxnException):
+            adjust_pvalues([0.1], method="bonferroni-ish")
+
+
+class StatisticsStageTest(unittest.TestCase):
+    def test_it_matches_the_welch_test_of_the_reporter(self):
+        dataframe = labeled_response()
+        results = StatisticsStage(resamples=100).compare({"key": (dataframe, "duration")}, ["pause", "delay"])
+        for treatment in ("pause", "delay"):
+            statistic, p_value, _ = Reporter.compute_welch_ttest(dataframe, "NoTreatment", treatment, "duration")
+            self.assertAlmostEqual(results["key"][treatment]["test_statistic"], float(statistic))
+            self.assertAlmostEqual(results["key"][treatment]["p_value"], float(p_value))
+        # the treated observations of pause are shifted up
+        self.assertGreater(results["key"]["pause"]["test_statistic"], 0)
+        self.assertGreater(results["key"]["pause"]["cohens_d"], 0)
+        self.assertEqual(results["key"]["pause"]["treatment_observations"], 67)
+
+    def test_it_adjusts_across_all_pairs_and_caches_by_store_key(self):
+        stage = StatisticsStage(resamples=100)
+        responses = {"a": (labeled_response(seed=1), "duration"), "b": (labeled_response(seed=2), "duration")}
+        results = stage.compare(responses, ["pause", "delay"])
+        pvalues = [results[key][treatment]["p_value"] for key in "ab" for treatment in ("pause", "delay")]
+        adjusted = [results[key][treatment]["adjusted_p_value"] for key in "ab" for treatment in ("pause", "delay")]
+        self.assertEqual(adjusted, adjust_pvalues(pvalues, method="holm"))
+        with mock.patch("oxn.statistics.compare_response") as compare_response:
+            again = stage.compare(responses, ["pause", "delay"])
+        compare_response.assert_not_called()
+        self.assertEqual(again, results)
+
+    def test_it_compares_large_responses_in_worker_processes(self):
+        dataframe = labeled_response()
+        inline = StatisticsStage(resamples=50).compare({"key": (dataframe, "duration")}, ["pause"])
+        stage = StatisticsStage(resamples=50, process_rows=10, workers=1)
+        with mock.patch.object(stage, "_compare_in_processes", wraps=stage._compare_in_processes) as processes:
+            pooled = stage.compare({"key": (dataframe, "duration")}, ["pause"])
+        processes.assert_called_once()
+        self.assertEqual(pooled, inline)
+
+
+class GatherInteractionsTest(unittest.TestCase):
+    def test_it_reports_effect_sizes_for_every_pair(self):
+        reporter = Reporter(report_path="/tmp/")
+        response = mock.Mock(spec=["data", "name", "metric_name", "response_type", "start", "end"])
+        response.name, response.metric_name, response.response_type = "latency", "duration", "MetricResponseVariable"
+        response.data, response.start, response.end = labeled_response(), 100, 200
+        treatments = {}
+        for name in ("pause", "delay"):
+            treatment = mock.Mock(start=120, end=140, treatment_type="runtime")
+            treatment.name = name
+            treatments[name] = treatment
+        experiment = mock.Mock(config_filename="exp.yml", short_id="a")
+        reporter.gather_interactions(experiment=experiment, treatments=treatments, responses={"latency": response})
+        self.assertEqual([interaction["treatment_name"] for interaction in reporter.interactions], ["pause", "delay"])
+        interaction = reporter.interactions[0]
+        self.assertEqual(interaction["test_performed"], "welch t-test")
+        self.assertIsInstance(interaction["p_value"], str)
+        for field in ("adjusted_p_value", "mann_whitney_p_value", "cohens_d", "cliffs_delta", "mean_difference_ci"):
+            self.assertIn(field, interaction)
+        self.assertEqual(len(reporter.statistics.cache), 1)
+        reporter.assemble_interaction_data(run_key="a")
+        self.assertEqual(reporter.statistics.cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
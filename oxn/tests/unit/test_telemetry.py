@@ -0,0 +1,181 @@
+"""Test the aggregation of load generation requests"""
+import unittest
+from unittest import mock
+
+from locust.event import Events
+
+from oxn.observer import Observer
+from oxn.report import Reporter
+from oxn.telemetry import RequestTelemetry, endpoint_id
+
+
+def fire(events, name="/", response_time=3, start_time=100.2, exception=None):
+    events.request.fire(
+        request_type="GET",
+        name=name,
+        response_time=response_time,
+        response_length=2,
+        response=mock.Mock(status_code=500 if exception else 200),
+        context={},
+        exception=exception,
+        start_time=start_time,
+        url=f"http://localhost{name}",
+    )
+
+
+class RequestTelemetryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.events = Events()
+        self.telemetry = RequestTelemetry()
+        self.telemetry.attach(self.events)
+
+    def test_it_aggregates_requests_per_endpoint_and_second(self):
+        fire(self.events, response_time=3, start_time=100.2)
+        fire(self.events, response_time=700, start_time=100.9, exception=ValueError("boom"))
+        fire(self.events, response_time=30000, start_time=101.1)
+        fire(self.events, name="/api/cart", start_time=100.5)
+        endpoints = self.telemetry.to_report()["endpoints"]
+        first, second = endpoints["GET /"]
+        self.assertEqual((first["start"], first["requests"], first["errors"]), (100, 2, 1))
+        self.assertEqual((second["start"], second["requests"]), (101, 1))
+        rows = {row["timestamp"]: row for row in self.telemetry.rows(start=100, end=101) if row["endpoint"] == "GET /"}
+        self.assertAlmostEqual(rows[100]["p50"], 3, delta=0.1)
+        self.assertAlmostEqual(rows[100]["p99"], 700, delta=7)
+        self.assertAlmostEqual(rows[101]["p50"], 30000, delta=300)
+        self.assertEqual(self.telemetry.totals()["GET /api/cart"], {"requests": 1, "errors": 0})
+
+    def test_it_only_keeps_sampled_requests(self):
+        self.assertEqual(self.telemetry.to_report()["samples"], [])
+        telemetry = RequestTelemetry(sample_rate=1.0, max_samples=2)
+        telemetry.attach(self.events)
+        for _ in range(5):
+            fire(self.events)
+        self.assertEqual(len(telemetry.samples), 2)
+        self.assertEqual(telemetry.samples[0]["status_code"], 200)
+
+    def test_it_stops_aggregating_when_detached(self):
+        self.telemetry.detach()
+        fire(self.events)
+        self.assertEqual(self.telemetry.aggregates, {})
+
+    def test_it_flushes_to_the_report(self):
+        fire(self.events)
+        reporter = Reporter(report_path="/tmp/")
+        runner = mock.Mock(short_id="a", treatments={})
+        reporter.report_data["report"]["runs"]["a"] = {}
+        stats = mock.Mock(start_time=100.0, last_request_timestamp=101.0, num_requests=1, num_failures=0, entries={})
+        reporter.add_loadgen_data(request_stats=stats, runner=runner, telemetry=self.telemetry)
+        telemetry = reporter.report_data["report"]["runs"]["a"]["loadgen"]["telemetry"]
+        self.assertEqual(telemetry["endpoints"]["GET /"][0]["requests"], 1)
+
+    def test_it_splits_latencies_into_treatment_windows(self):
+        fire(self.events, response_time=3, start_time=100.2)
+        fire(self.events, response_time=300, start_time=105.5)
+        fire(self.events, response_time=2, start_time=110.1)
+        latencies = self.telemetry.latency_report({"delay": (104.0, 106.0)})
+        self.assertEqual(list(latencies), [endpoint_id("GET /")])
+        windows = latencies[endpoint_id("GET /")]["windows"]
+        self.assertEqual(windows["all"]["count"], 3)
+        self.assertEqual(windows["NoTreatment"]["count"], 2)
+        self.assertAlmostEqual(windows["delay"]["p99.9"], 300, delta=3)
+        self.assertAlmostEqual(windows["NoTreatment"]["p50"], 2, delta=0.1)
+
+    def test_response_percentiles_agree_with_the_report_latencies(self):
+        fire(self.events, response_time=30000, start_time=100.2)
+        self.telemetry.on_arrival(scheduled=100.1, delay=250)
+        [row] = self.telemetry.rows(start=100, end=101)
+        # tail latencies above the largest coarse bucket are kept
+        self.assertAlmostEqual(row["p99"], 30000, delta=300)
+        self.assertEqual(row["p99"], self.telemetry.latency_report({})[endpoint_id("GET /")]["windows"]["all"]["p99"])
+        self.assertAlmostEqual(row["queueing_p50"], 250, delta=3)
+
+    def test_it_keys_tasks_by_stable_endpoint_ids(self):
+        reporter = Reporter(report_path="/tmp/")
+        runner = mock.Mock(short_id="a", treatments={})
+        reporter.report_data["report"]["runs"]["a"] = {}
+        entry = mock.Mock(method="GET", num_requests=1, num_failures=0, fail_ratio=0.0, total_response_time=3,
+                          min_response_time=3, max_response_time=3, avg_response_time=3, median_response_time=3)
+        entry.name = "/"
+        stats = mock.Mock(start_time=100.0, last_request_timestamp=101.0, num_requests=1, num_failures=0,
+                          entries={("/", "GET"): entry})
+        reporter.add_loadgen_data(request_stats=stats, runner=runner, telemetry=self.telemetry)
+        loadgen = reporter.report_data["report"]["runs"]["a"]["loadgen"]
+        self.assertEqual(list(loadgen["task_details"]), [endpoint_id("GET /")])
+        self.assertEqual(loadgen["latencies"], {})
+
+
+class WorkerTelemetryTest(unittest.TestCase):
+    def test_it_ships_worker_aggregates_to_the_master(self):
+        worker_events, master_events = Events(), Events()
+        workers = [RequestTelemetry(sample_rate=1.0), RequestTelemetry(sample_rate=1.0)]
+        workers[0].attach_worker(worker_events)
+        workers[1].attach_worker(Events())
+        master = RequestTelemetry(max_samples=3)
+        master.attach_master(master_events)
+        fire(worker_events)
+        fire(worker_events)
+        workers[1].on_request(request_type="GET", name="/", response_time=3, start_time=100.5)
+        for idx, worker in enumerate(workers):
+            data = {}
+            worker.on_report_to_master(client_id=idx, data=data)
+            master_events.worker_report.fire(client_id=idx, data=data)
+        self.assertEqual(master.totals(), {"GET /": {"requests": 3, "errors": 0}})
+        self.assertEqual(master.latency_report({})[endpoint_id("GET /")]["windows"]["all"]["count"], 3)
+        self.assertEqual(len(master.samples), 3)
+        # reports only carry the requests since the previous report
+        self.assertEqual(workers[0].aggregates, {})
+        master.detach()
+        self.assertIsNone(master.events)
+
+
+class LoadgenResponseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.telemetry = RequestTelemetry()
+        for second in range(100, 110):
+            for _ in range(4):
+                self.telemetry.on_request(request_type="GET", name="/", response_time=15, start_time=second + 0.5)
+            self.telemetry.on_request(
+                request_type="POST", name="/api/cart", response_time=3, start_time=second, exception=ValueError()
+            )
+        config = {
+            "experiment": {
+                "responses": [
+                    {"name": "frontend_p99", "type": "loadgen", "statistic": "p99", "endpoint": "/",
+                     "left_window": "2s", "right_window": "2s"},
+                    {"name": "failure_rate", "type": "loadgen", "statistic": "failure_rate",
+                     "left_window": "0s", "right_window": "0s"},
+                ]
+            }
+        }
+        self.observer = Observer(config=config, orchestrator=None, telemetry=self.telemetry)
+        self.observer.experiment_start = 104
+        self.observer.experiment_end = 106
+        self.observer.initialize_variables()
+        self.observer.observe()
+
+    def test_it_observes_the_requests_within_the_windows(self):
+        latency = self.observer.variables()["frontend_p99"]
+        self.assertEqual(list(latency.data["timestamp"]), [102, 103, 104, 105, 106, 107, 108])
+        self.assertEqual(set(latency.data["endpoint"]), {"GET /"})
+        self.assertEqual(latency.data["requests_per_second"].iloc[0], 4)
+        self.assertAlmostEqual(latency.data["frontend_p99"].iloc[0], latency.data["p99"].iloc[0])
+        failures = self.observer.variables()["failure_rate"]
+        self.assertEqual(set(failures.data.loc[failures.data["endpoint"] == "POST /api/cart", "failure_rate"]), {1.0})
+
+    def test_empty_responses_keep_their_label_columns(self):
+        latency = self.observer.variables()["frontend_p99"]
+        latency.data = latency.data.iloc[0:0]
+        latency.label(treatment_start=104, treatment_end=105, label_column="pause", label="pause")
+        self.assertIn("frontend_p99", latency.data.columns)
+        self.assertIn("pause", latency.data.columns)
+
+    def test_it_labels_intervals_like_metrics(self):
+        latency = self.observer.variables()["frontend_p99"]
+        latency.label(treatment_start=104, treatment_end=105, label_column="pause", label="pause")
+        self.assertEqual(list(latency.data["pause"]).count("pause"), 2)
+        reporter = Reporter(report_path="/tmp/")
+        experiment = mock.Mock(config_filename="exp.yml", short_id="a")
+        treatment = mock.Mock(start=104, end=105, treatment_type="runtime")
+        treatment.name = "pause"
+        reporter.gather_interaction(experiment=experiment, treatment=treatment, response=latency)
+        self.assertEqual(reporter.interactions[0]["response_type"], "LoadgenResponseVariable")
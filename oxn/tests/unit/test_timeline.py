@@ -0,0 +1,106 @@
+"""Test the timeline scheduler for runtime treatments"""
+import time
+import unittest
+from unittest import mock
+
+from oxn.errors import OxnException
+from oxn.runner import ExperimentRunner
+from oxn.timeline import TreatmentTimeline
+
+
+class SleepingTreatment:
+    """Minimal stand-in for a runtime treatment that blocks in inject like the real treatments"""
+
+    def __init__(self, name, duration, fail=False):
+        self.name = name
+        self.duration = duration
+        self.fail = fail
+        self.start = None
+        self.end = None
+        self.cleaned = False
+
+    def inject(self):
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        time.sleep(self.duration)
+
+    def clean(self):
+        self.cleaned = True
+
+
+class ConfiguredTreatment(SleepingTreatment):
+    """Stand-in that is built from a treatment description like the treatments of the library"""
+
+    runtime = True
+
+    def __init__(self, config, name, orchestrator):
+        super().__init__(name=name, duration=config.get("duration", 0.1))
+
+    def is_runtime(self):
+        return self.runtime
+
+
+class CompileTimeTreatment(ConfiguredTreatment):
+    runtime = False
+
+
+class TreatmentTimelineTest(unittest.TestCase):
+    def test_it_overlaps_treatments(self):
+        delay = SleepingTreatment(name="delay", duration=0.3)
+        kill = SleepingTreatment(name="kill", duration=0.2)
+        timeline = TreatmentTimeline(entries=[(0.0, delay), (0.1, kill)])
+        timeline.run()
+        # span of the timeline is max(0.0 + 0.3, 0.1 + 0.2), not the sum of 0.5
+        self.assertLess(timeline.span, 0.45)
+        self.assertGreaterEqual(timeline.span, 0.3)
+        self.assertLess(kill.start, delay.end)
+
+    def test_it_starts_treatments_at_their_offsets(self):
+        first = SleepingTreatment(name="first", duration=0.0)
+        second = SleepingTreatment(name="second", duration=0.0)
+        timeline = TreatmentTimeline(entries=[(0.2, second), (0.0, first)])
+        timeline.run()
+        self.assertAlmostEqual(first.start - timeline.start, 0.0, delta=0.05)
+        self.assertAlmostEqual(second.start - timeline.start, 0.2, delta=0.05)
+
+    def test_it_cleans_and_raises_on_failed_treatments(self):
+        ok = SleepingTreatment(name="ok", duration=0.0)
+        broken = SleepingTreatment(name="broken", duration=0.0, fail=True)
+        timeline = TreatmentTimeline(entries=[(0.0, ok), (0.0, broken)])
+        with self.assertRaises(OxnException):
+            timeline.run()
+        self.assertTrue(ok.cleaned)
+        self.assertTrue(broken.cleaned)
+        self.assertTrue(broken.end)
+
+
+class RunnerTimelineTest(unittest.TestCase):
+    def build_runner(self, treatments):
+        runner = ExperimentRunner.__new__(ExperimentRunner)
+        runner.config = {"experiment": {"treatments": treatments}}
+        runner.orchestrator = mock.Mock()
+        runner.random_treatment_order = False
+        runner.treatment_keys = {"sleep": ConfiguredTreatment, "compile": CompileTimeTreatment}
+        runner.treatments = {}
+        runner.treatment_offsets = {}
+        runner.timer = mock.MagicMock()
+        runner.accountant = None
+        runner.on_treatments_start = None
+        runner.observer = mock.Mock(**{"time_to_wait_left.return_value": 0})
+        runner.start_sampling = mock.Mock()
+        runner._build_treatments()
+        return runner
+
+    def test_compile_time_offsets_keep_runtime_treatments_sequential(self):
+        runner = self.build_runner(
+            [
+                {"rebuild": {"action": "compile", "params": {}, "start": "1s"}},
+                {"first": {"action": "sleep", "params": {"duration": 0.1}}},
+                {"second": {"action": "sleep", "params": {"duration": 0.1}}},
+            ]
+        )
+        self.assertEqual(runner.treatment_offsets, {})
+        runner.execute_runtime_treatments()
+        first, second = runner.treatments["first"], runner.treatments["second"]
+        self.assertGreaterEqual(second.start, first.end)
+        self.assertIsNone(runner.treatments["rebuild"].start)
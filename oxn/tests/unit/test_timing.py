@@ -0,0 +1,74 @@
+"""Test the phase timing instrumentation"""
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from oxn.timeline import TreatmentTimeline
+from oxn.timing import PhaseTimer, RESPONSES, TREATMENTS, to_chrome_trace, write_chrome_trace
+
+
+class SleepingTreatment:
+    def __init__(self, name, duration):
+        self.name = name
+        self.duration = duration
+        self.start = None
+        self.end = None
+
+    def inject(self):
+        time.sleep(self.duration)
+
+    def clean(self):
+        pass
+
+
+class PhaseTimerTest(unittest.TestCase):
+    def test_it_summarizes_phases_treatments_and_responses(self):
+        timer = PhaseTimer(label="run 1")
+        with timer.phase("orchestrate"):
+            time.sleep(0.05)
+        for _ in range(2):
+            with timer.phase("inject", category=TREATMENTS, target="delay"):
+                time.sleep(0.02)
+        with timer.phase("observe", category=RESPONSES, target="latency"):
+            pass
+        summary = timer.summary()
+        self.assertGreaterEqual(summary["phases"]["orchestrate"], 0.05)
+        self.assertGreaterEqual(summary["treatments"]["delay"]["inject"], 0.04)
+        self.assertIn("observe", summary["responses"]["latency"])
+
+    def test_it_records_failing_phases(self):
+        timer = PhaseTimer()
+        with self.assertRaises(RuntimeError):
+            with timer.phase("ready"):
+                raise RuntimeError("not ready")
+        self.assertEqual([span.name for span in timer.spans], ["ready"])
+
+    def test_it_puts_overlapping_treatments_on_separate_tracks(self):
+        timer = PhaseTimer(label="run 1")
+        timeline = TreatmentTimeline(
+            entries=[(0.0, SleepingTreatment("delay", 0.1)), (0.05, SleepingTreatment("kill", 0.1))],
+            timer=timer,
+        )
+        timeline.run()
+        trace = to_chrome_trace([timer])
+        injects = {event["name"]: event for event in trace["traceEvents"] if event["ph"] == "X"}
+        self.assertEqual(set(injects), {"delay.inject", "delay.clean", "kill.inject", "kill.clean"})
+        self.assertNotEqual(injects["delay.inject"]["tid"], injects["kill.inject"]["tid"])
+        self.assertAlmostEqual(injects["kill.inject"]["ts"] - injects["delay.inject"]["ts"], 50000, delta=30000)
+
+    def test_it_writes_a_trace_file_with_a_shared_origin(self):
+        experiment = PhaseTimer(label="experiment")
+        run = PhaseTimer(label="run 1", origin=experiment.origin)
+        time.sleep(0.02)
+        with run.phase("orchestrate"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            write_chrome_trace(path=path, timers=[experiment, run])
+            with open(path) as fp:
+                trace = json.load(fp)
+        [orchestrate] = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual(orchestrate["pid"], 2)
+        self.assertGreaterEqual(orchestrate["ts"], 20000)
@@ -0,0 +1,87 @@
+"""
+Purpose: Schedules runtime treatments on a timeline.
+Functionality: Starts every treatment at its offset relative to the start of the timeline, so that treatments
+can run concurrently and overlap.
+Connection: Used by the Runner to execute runtime treatments that define a start offset in the experiment spec.
+
+Timeline scheduling of runtime treatments"""
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import gevent
+
+from .errors import OxnException
+from .models.treatment import Treatment
+from .timing import PhaseTimer, TREATMENTS
+from .utils import utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class TreatmentTimeline:
+    """
+    A timeline of runtime treatments
+
+    Each treatment is started in its own greenlet once its offset relative to the start of the timeline
+    has elapsed. Since treatments block in inject for their duration, a treatment is cleaned as soon as its
+    own duration is over, independent of the other treatments on the timeline. The timeline therefore takes
+    as long as its longest offset + duration, not the sum of all durations.
+    """
+
+    def __init__(self, entries: List[Tuple[float, Treatment]], timer: Optional[PhaseTimer] = None):
+        self.entries = sorted(entries, key=lambda entry: entry[0])
+        """Pairs of start offsets in seconds and treatments, ordered by offset"""
+        self.timer = timer if timer else PhaseTimer()
+        """Timer that records inject and clean of every treatment"""
+        self.start = None
+        """UTC timestamp of the start of the timeline"""
+        self.end = None
+        """UTC timestamp of the end of the timeline"""
+
+    def __repr__(self):
+        entries = ", ".join(f"{treatment.name}@{offset}s" for offset, treatment in self.entries)
+        return f"TreatmentTimeline({entries})"
+
+    @property
+    def span(self) -> float:
+        """Return the time in seconds between the start and the end of the timeline"""
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+    def _execute(self, treatment: Treatment) -> None:
+        treatment.start = utc_timestamp()
+        logger.info(f"Starting treatment {treatment.name} on timeline")
+        try:
+            with self.timer.phase("inject", category=TREATMENTS, target=treatment.name):
+                treatment.inject()
+        finally:
+            with self.timer.phase("clean", category=TREATMENTS, target=treatment.name):
+                treatment.clean()
+            treatment.end = utc_timestamp()
+            logger.info(f"Finished treatment {treatment.name} on timeline")
+
+    def run(self) -> None:
+        """Run all treatments on the timeline and block until every treatment has been cleaned"""
+        logger.info(f"Running {self}")
+        self.start = utc_timestamp()
+        origin = time.monotonic()
+        greenlets = []
+        for offset, treatment in self.entries:
+            # correct the delay for the time it took to spawn the earlier greenlets
+            delay = max(0.0, offset - (time.monotonic() - origin))
+            greenlets.append(gevent.spawn_later(delay, self._execute, treatment))
+        gevent.joinall(greenlets)
+        self.end = utc_timestamp()
+        logger.info(f"Timeline finished after {self.span:.3f}s")
+        failed = [
+            (treatment, greenlet.exception)
+            for (_, treatment), greenlet in zip(self.entries, greenlets)
+            if greenlet.exception is not None
+        ]
+        if failed:
+            raise OxnException(
+                message="Error while executing treatments on the timeline",
+                explanation="\n".join(f"{treatment.name}: {exception}" for treatment, exception in failed),
+            )
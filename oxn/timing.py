@@ -0,0 +1,151 @@
+"""
+Purpose: Records where the wall-clock time of an experiment goes.
+Functionality: Measures monotonic durations of lifecycle phases, treatments and response variables, summarizes
+them for the report and exports them as a Chrome trace timeline.
+Connection: Used by the Engine, the Runner and the TreatmentTimeline to instrument experiment runs.
+
+Phase timing instrumentation"""
+import contextlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from gevent import monkey
+
+logger = logging.getLogger(__name__)
+
+PHASES = "phases"
+"""Category for lifecycle phases of the engine and the runner"""
+TREATMENTS = "treatments"
+"""Category for inject and clean of single treatments"""
+RESPONSES = "responses"
+"""Category for the observation of single response variables"""
+
+
+class Span:
+    """A single timed section of an experiment"""
+
+    def __init__(self, name: str, category: str, start: float, duration: float, target=None, thread=None):
+        self.name = name
+        """Name of the timed section, e.g. orchestrate or inject"""
+        self.category = category
+        """Category of the timed section, one of phases, treatments or responses"""
+        self.start = start
+        """Start in seconds relative to the origin of the timer"""
+        self.duration = duration
+        """Duration in seconds"""
+        self.target = target
+        """Name of the treatment or response the section belongs to, if any"""
+        self.thread = thread
+        """Identifier of the greenlet or thread the section was executed in"""
+
+    def __repr__(self):
+        target = f"{self.target}." if self.target else ""
+        return f"Span({self.category}:{target}{self.name}, {self.duration:.3f}s)"
+
+
+class PhaseTimer:
+    """
+    Record monotonic durations of the phases of an experiment run
+
+    Timers of several runs can share an origin, so that their spans can be placed on one timeline.
+    Spans are recorded from greenlets and from the native threads of the post-processing pipeline,
+    so recording is guarded by a native lock.
+    """
+
+    def __init__(self, label: Optional[str] = None, origin: Optional[float] = None):
+        self.label = label
+        """Label of the timer, e.g. the run it belongs to"""
+        self.origin = time.monotonic() if origin is None else origin
+        """Monotonic timestamp all span starts are relative to"""
+        self.spans: List[Span] = []
+        """Recorded spans in the order they finished"""
+        self.lock = monkey.get_original("threading", "Lock")()
+        """Native lock guarding the recorded spans"""
+
+    def __repr__(self):
+        return f"PhaseTimer(label={self.label}, spans={len(self.spans)})"
+
+    @contextlib.contextmanager
+    def phase(self, name: str, category: str = PHASES, target=None):
+        """Time the enclosed block, also if it raises"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name=name, category=category, started=started, target=target)
+
+    def record(self, name: str, started: float, category: str = PHASES, target=None, ended=None) -> Span:
+        """Record a span between two monotonic timestamps"""
+        ended = time.monotonic() if ended is None else ended
+        span = Span(
+            name=name,
+            category=category,
+            start=started - self.origin,
+            duration=ended - started,
+            target=target,
+            thread=threading.get_ident(),
+        )
+        with self.lock:
+            self.spans.append(span)
+        logger.debug(f"{self.label or 'experiment'}: {span}")
+        return span
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Summarize the recorded spans for the report
+
+        Durations of sections that ran several times are summed up. Treatments and responses are
+        grouped by their name.
+        """
+        summary: Dict[str, dict] = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            section = summary.setdefault(span.category, {})
+            if span.target is not None:
+                section = section.setdefault(span.target, {})
+            section[span.name] = round(section.get(span.name, 0.0) + span.duration, 6)
+        return summary
+
+
+def to_chrome_trace(timers: Iterable[PhaseTimer]) -> dict:
+    """
+    Convert the spans of several timers to the Chrome trace event format
+
+    Every timer becomes a process in the timeline and every greenlet or thread a track of that process,
+    so that overlapping treatments on a timeline do not end up on the same track.
+    The result can be loaded into chrome://tracing or Perfetto.
+    """
+    events = []
+    for pid, timer in enumerate(timers, start=1):
+        events.append(
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": timer.label or "experiment"}}
+        )
+        tracks = {}
+        with timer.lock:
+            spans = list(timer.spans)
+        for span in spans:
+            tid = tracks.setdefault(span.thread, len(tracks) + 1)
+            event = {
+                "name": f"{span.target}.{span.name}" if span.target else span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round(span.start * 1e6),
+                "dur": round(span.duration * 1e6),
+                "pid": pid,
+                "tid": tid,
+            }
+            if span.target is not None:
+                event["args"] = {"target": span.target}
+            events.append(event)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(path: str, timers: Iterable[PhaseTimer]) -> None:
+    """Write the spans of several timers as a Chrome trace file"""
+    with open(path, "w+") as fp:
+        json.dump(to_chrome_trace(timers), fp)
+    logger.info(f"Wrote timing trace to {path}")
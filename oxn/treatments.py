@@ -24,7 +24,8 @@ from kubernetes.client.models.v1_deployment import V1Deployment
 
 from python_on_whales import DockerClient
 
-from .kubernetes_orchestrator import KubernetesOrchestrator
+from .kubernetes_orchestrator import DeploymentPatch, KubernetesOrchestrator
+from .prometheus import Prometheus
 
 
 from .errors import OrchestratorException, OxnException, OrchestratorResourceNotFoundException
@@ -39,6 +40,74 @@ from oxn.models.treatment import Treatment
 logger = logging.getLogger(__name__)
 
 
+def _apply_to_pods(treatment: Treatment, namespace: str, label_selector: str, label: str, command: List[str]) -> int:
+    """
+    Execute a command concurrently on all matching pods and record when it was applied to all of them
+
+    Sets treatment.pod_results to the per-pod results and treatment.applied to the time the last pod finished.
+    Returns the first non-zero exit code of any pod or 0.
+    """
+    results = treatment.orchestrator.fan_out_console_command(
+        namespace=namespace,
+        label_selector=label_selector,
+        label=label,
+        command=command,
+    )
+    treatment.pod_results = results
+    treatment.applied = max(result.finished for result in results)
+    spread = treatment.applied - min(result.finished for result in results)
+    logger.info(
+        f"Applied {' '.join(command)} to {len(results)} pods with {label_selector}={label} within {spread:.3f}s"
+    )
+    for result in results:
+        if result.exit_code != 0:
+            logger.warning(f"{result} failed: {result.output}")
+    return next((result.exit_code for result in results if result.exit_code != 0), 0)
+
+
+def _exec_on_containers(
+        treatment: Treatment,
+        command: List[str],
+        rollback_command: Optional[List[str]] = None,
+        mark_applied: bool = False,
+) -> bool:
+    """
+    Execute a command concurrently in all containers targeted by a docker treatment
+
+    The targets are resolved from the service_name parameter, which can be a name, a list of names or glob
+    patterns. Sets treatment.container_results to the per-container results. If the command succeeded in all
+    containers and mark_applied is set, the treatment is marked as applied. Otherwise the rollback command, if any,
+    is executed in the containers where the command succeeded, so that no container is left with a partial fault.
+
+    Returns True if the command succeeded in all containers.
+    """
+    containers = treatment.orchestrator.resolve_containers(treatment.config.get("service_name"))
+    if not containers:
+        logger.error(f"No containers match {treatment.config.get('service_name')} for {treatment.name}")
+        treatment.container_results = []
+        return False
+    results = treatment.orchestrator.exec_in_containers(container_names=containers, command=command)
+    treatment.container_results = results
+    for result in results:
+        logger.debug(f"Executed {' '.join(command)} in {result}")
+    failed = [result for result in results if result.exit_code != 0]
+    if not failed:
+        if mark_applied:
+            treatment.mark_applied()
+        spread = max(result.finished for result in results) - min(result.finished for result in results)
+        logger.info(f"Executed {' '.join(command)} in {len(results)} containers within {spread:.3f}s")
+        return True
+    for result in failed:
+        logger.error(f"{' '.join(command)} failed in {result}: {result.output}")
+    succeeded = [result.container for result in results if result.exit_code == 0]
+    if rollback_command and succeeded:
+        logger.warning(f"Rolling back {treatment.name} in containers {', '.join(succeeded)}")
+        for result in treatment.orchestrator.exec_in_containers(container_names=succeeded, command=rollback_command):
+            if result.exit_code != 0:
+                logger.error(f"Rollback failed in {result}. Container state might be polluted now")
+    return False
+
+
 class EmptyTreatment(Treatment):
     """
     Empty treatment to represent a simple observation of response variables
@@ -319,7 +388,6 @@ class ByteMonkeyTreatment(Treatment):
 
     def __init__(self, config, name):
         super().__init__(config, name)
-        self.docker_client = docker.from_env()
         self.original_entrypoint = ""
         self.dockerfile_content = ""
         self.temporary_jar_path = ""
@@ -402,32 +470,22 @@ class CorruptPacketTreatment(Treatment):
         return "corrupt"
 
     def preconditions(self) -> bool:
-        """Check if the service has tc installed"""
-        service = self.config.get("service_name")
+        """Check if all targeted services have tc installed"""
         command = [
             "tc",
             "-Version"
         ]
-        client = docker.from_env()
-        try:
-            container = client.containers.get(container_id=service)
-            status_code, _ = container.exec_run(cmd=command)
-            logger.info(
-                f"Probed container {service} for tc with result {status_code}"
+        if not _exec_on_containers(treatment=self, command=command):
+            self.messages.append(
+                f"Not all containers of {self.config.get('service_name')} have tc installed which is required for "
+                f"{self}. Please install package iptables2 in the containers"
             )
-            if not status_code == 0:
-                self.messages.append(
-                    f"Container {service} does not have tc installed which is required for {self}. Please install "
-                    "package iptables2 in the container"
-                )
-            return status_code == 0
-
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service}")
-            return False
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
             return False
+        return True
+
+    def _clean_command(self) -> List[str]:
+        interface = self.config.get("interface") or "eth0"
+        return ["tc", "qdisc", "del", "dev", interface, "root", "netem"]
 
     def inject(self) -> None:
         service = self.config.get("service_name")
@@ -450,37 +508,24 @@ class CorruptPacketTreatment(Treatment):
             correlation,
         ]
 
-        client = docker.from_env()
-        try:
-            container = client.containers.get(container_id=service)
-            container.exec_run(cmd=command)
-            logger.info(
-                f"Injected packet corruption into container {service}. Waiting for {duration}s."
-            )
-            time.sleep(duration)
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service}")
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
+        if not _exec_on_containers(treatment=self, command=command, rollback_command=self._clean_command(), mark_applied=True):
+            logger.error(f"Failed to inject packet corruption into {service}")
+            return
+        logger.info(
+            f"Injected packet corruption into {service}. Waiting for {duration}s."
+        )
+        time.sleep(duration)
 
     def clean(self) -> None:
-        interface = self.config.get("interface") or "eth0"
         service = self.config.get("service_name")
-        command = ["tc", "qdisc", "del", "dev", interface, "root", "netem"]
-        client = docker.from_env()
-        try:
-            container = client.containers.get(container_id=service)
-            container.exec_run(cmd=command)
-            logger.info(f"Cleaned delay treatment from container {service}")
-        except (ContainerNotFound, DockerAPIError) as e:
-            logger.error(
-                f"Cannot clean delay treatment from container {service}: {e.explanation}"
-            )
+        if _exec_on_containers(treatment=self, command=self._clean_command()):
+            logger.info(f"Cleaned packet corruption treatment from {service}")
+        else:
             logger.error(f"Container state for {service} might be polluted now")
 
     def params(self) -> dict:
         return {
-            "service_name": str,
+            "service_name": (str, list),
             "interface": str,
             "duration": str,
             "corrupt_percentage": str,
@@ -614,11 +659,15 @@ class KubernetesMetricsExportIntervalTreatment(Treatment):
         label_selector: app.kubernetes.io/component,
         label: recommendationservice,
         interval: 1s,
+
+    label can also be a list of labels. All matching deployments are then patched at once and roll out together.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.init_env_value = None
+        self.init_env_values = {}
+        """Initial values of the environment variable by deployment name, None if it was not set"""
+        self.deployments = []
         self.env_name = "OTEL_METRIC_EXPORT_INTERVAL"
         
     def action(self):
@@ -628,62 +677,60 @@ class KubernetesMetricsExportIntervalTreatment(Treatment):
         super().preconditions()
         return True
 
+    def _labels(self) -> List[str]:
+        label = self.config.get("label")
+        return [label] if isinstance(label, str) else list(label)
+
     def inject(self) -> None:
         self.namespace = self.config.get("namespace")
         self.label_selector = self.config.get("label_selector")
-        self.label = self.config.get("label")
         self.interval_ms = self.config.get("interval_ms")
 
         assert isinstance(self.orchestrator, KubernetesOrchestrator)
-        
-        self.deployment = self.orchestrator.get_deployment(self.namespace, self.label_selector, self.label)
-        
-        deployment_environment_variables = self.orchestrator.get_deployment_env_parameters(
-            deployment=self.deployment
-        )
-        
-        # get self.env_name from the deployments environment variables
-        for env_var in deployment_environment_variables:
-            if env_var.name == self.env_name:
-                self.init_env_value = env_var.value
-                break 
-
-        self.deployment = self.orchestrator.get_deployment(self.namespace, self.label_selector, self.label)
-        result = self.orchestrator.set_deployment_env_parameter(
-            deployment=self.deployment,
-            environment_variable_name=self.env_name,
-            environment_variable_value=str(int(self.interval_ms)),
-        )
-        
-        logging.info(f"Environment variable '{self.env_name} set to '{self.interval_ms}'ms for the deployment '{self.deployment.metadata.name}'.")
-
-        time.sleep(3)
 
-        for x in range(0, 10):
-            if self.orchestrator.is_deployment_ready(self.deployment):
-                break
-            logging.info(f"Waiting for deployment {self.deployment.metadata.name} to be ready")
-            time.sleep(2)
+        self.deployments = [
+            self.orchestrator.get_deployment(self.namespace, self.label_selector, label)
+            for label in self._labels()
+        ]
+        for deployment in self.deployments:
+            deployment_environment_variables = self.orchestrator.get_deployment_env_parameters(deployment=deployment)
+            # get self.env_name from the deployments environment variables
+            self.init_env_values[deployment.metadata.name] = next(
+                (env_var.value for env_var in deployment_environment_variables if env_var.name == self.env_name),
+                None,
+            )
 
+        # one patch and one rollout per deployment, all deployments roll out concurrently
+        self.orchestrator.patch_deployments(
+            [
+                DeploymentPatch(deployment=deployment, env={self.env_name: str(int(self.interval_ms))})
+                for deployment in self.deployments
+            ]
+        )
+        names = ", ".join(deployment.metadata.name for deployment in self.deployments)
+        logging.info(f"Environment variable '{self.env_name} set to '{self.interval_ms}'ms for the deployments '{names}'.")
 
     def clean(self) -> None:
-        if self.init_env_value is None:
+        if not self.deployments:
             return
         assert isinstance(self.orchestrator, KubernetesOrchestrator)
-        # update the deployment as otherwise there will be an error because the deployment is outdated
-        self.deployment = self.orchestrator.get_deployment(self.namespace, self.label_selector, self.label)
-        result = self.orchestrator.set_deployment_env_parameter(
-            deployment=self.deployment,
-            environment_variable_name=self.env_name,
-            environment_variable_value=self.init_env_value,
+        self.orchestrator.patch_deployments(
+            [
+                DeploymentPatch(
+                    deployment=deployment,
+                    env={self.env_name: self.init_env_values.get(deployment.metadata.name)},
+                )
+                for deployment in self.deployments
+            ]
         )
-        logging.info(f"Environment variable '{self.env_name} reset for deployment '{self.deployment.metadata.name}' to initial value.")
+        names = ", ".join(deployment.metadata.name for deployment in self.deployments)
+        logging.info(f"Environment variable '{self.env_name} reset for deployments '{names}' to initial value.")
 
     def params(self) -> dict:
         return {
             "namespace": str,
             "label_selector": str,
-            "label": str,
+            "label": (str, list),
             "interval": str,
         }
 
@@ -718,10 +765,6 @@ class ProbabilisticSamplingTreatment(Treatment):
     Add a probabilistic sampling policy to the opentelemetry collector
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.client = docker.from_env()
-
     @property
     def action(self):
         return "probl"
@@ -817,21 +860,21 @@ class KubernetesProbabilisticHeadSamplingTreatment(Treatment):
         configmap_name = "astronomy-shop-otelcol"
         
         try:
-            configmap = self.orchestrator.kube_client.read_namespaced_config_map(name=configmap_name, namespace="system-under-evaluation")
-        except Exception as e:
+            configmap = self.orchestrator.read_config_map(name=configmap_name, namespace=self.orchestrator.sue_namespace)
+        except OrchestratorResourceNotFoundException as e:
             raise OrchestratorException(
-                message=f"Error while reading ConfigMap {configmap_name} in namespace system-under-evaluation: {e.body}",
-                explanation=str(e),
+                message=e.message,
+                explanation=e.explanation,
             )
 
-        self.deployment = self.orchestrator.get_deployment("system-under-evaluation", "app.kubernetes.io/name", "otelcol")
+        self.deployment = self.orchestrator.get_deployment(self.orchestrator.sue_namespace, "app.kubernetes.io/name", "otelcol")
 
         if not configmap:
-            self.messages.append(f"ConfigMap {configmap_name} not found in namespace system-under-evaluation")
+            self.messages.append(f"ConfigMap {configmap_name} not found in namespace {self.orchestrator.sue_namespace}")
             return False
         
         if self.deployment is None:
-            self.messages.append(f"Deployment otelcol not found in namespace system-under-evaluation")
+            self.messages.append(f"Deployment otelcol not found in namespace {self.orchestrator.sue_namespace}")
             return False
         
 
@@ -842,7 +885,7 @@ class KubernetesProbabilisticHeadSamplingTreatment(Treatment):
         assert self.config.get("hash_seed")
         assert isinstance(self.orchestrator, KubernetesOrchestrator)
         
-        self.deployment = self.orchestrator.get_deployment("system-under-evaluation", "app.kubernetes.io/name", "otelcol")
+        self.deployment = self.orchestrator.get_deployment(self.orchestrator.sue_namespace, "app.kubernetes.io/name", "otelcol")
         
         self.initial_sampling_percentage, self.initial_hash_seed = self.orchestrator.get_otel_collector_probabilistic_sampling_values()
         self.orchestrator.set_otel_collector_probabilistic_sampling_values(sampling_percentage=self.config.get("sampling_percentage"), hash_seed=self.config.get("hash_seed"))
@@ -911,10 +954,6 @@ class TailSamplingTreatment(Treatment):
     changing the config.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.client = docker.from_env()
-
     @property
     def action(self):
         return "tail"
@@ -962,10 +1001,11 @@ class TailSamplingTreatment(Treatment):
             file.write(yaml.dump(updated_extras, default_flow_style=False))
 
         # restart the collector and block until it has restarted
-        container = self.client.containers.get("otel-col")
+        container = self.orchestrator.get_container("otel-col")
         container.stop()
         container.wait()
         container.start()
+        self.mark_applied()
 
         duration = self.config.get("duration", "0m")
         if duration:
@@ -1004,10 +1044,6 @@ class TailSamplingTreatment(Treatment):
 
 class PauseTreatment(Treatment):
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.client = docker.from_env()
-
     def is_runtime(self) -> bool:
         return True
 
@@ -1052,7 +1088,7 @@ class PauseTreatment(Treatment):
         """Check if the docker daemon is running and the container is running"""
         service = self.config.get("service_name")
         try:
-            container = self.client.containers.get(container_id=service)
+            container = self.orchestrator.get_container(service, refresh=True)
             container_state = container.status
             logger.info(
                 f"Probed container {service} for state running with result {container_state}"
@@ -1078,8 +1114,9 @@ class PauseTreatment(Treatment):
         service = self.config.get("service_name")
 
         try:
-            container = self.client.containers.get(container_id=service)
+            container = self.orchestrator.get_container(service)
             container.pause()
+            self.mark_applied()
         except ContainerNotFound:
             logger.error(f"Can't find container {service}")
         except DockerAPIError as e:
@@ -1092,10 +1129,9 @@ class PauseTreatment(Treatment):
     def clean(self):
         service = self.config.get("service_name")
         try:
-            container = self.client.containers.get(container_id=service)
+            container = self.orchestrator.get_container(service)
             container.unpause()
             logger.debug(f"Cleaned pause from container {service}.")
-            self.client.close()
         except (ContainerNotFound, DockerAPIError) as e:
             logger.error(
                 f"Cannot clean pause treatment from container {service}: {e.explanation}"
@@ -1246,11 +1282,12 @@ class KubernetesNetworkDelayTreatment(Treatment):
             assert label
             assert duration
             assert isinstance(self.orchestrator, KubernetesOrchestrator)
-            status_code, _ = self.orchestrator.execute_console_command_on_all_matching_pods(
+            status_code = _apply_to_pods(
+                treatment=self,
                 namespace=namespace,
                 label_selector=label_selector,
                 label=label,
-                command=command
+                command=command,
             )
             if status_code > 1:
                 logger.error(
@@ -1302,10 +1339,6 @@ class KubernetesNetworkDelayTreatment(Treatment):
 class PacketLossTreatment(Treatment):
     """Inject packet loss into a service"""
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.client = docker.from_env()
-
     action = "loss"
 
     def is_runtime(self) -> bool:
@@ -1313,7 +1346,7 @@ class PacketLossTreatment(Treatment):
 
     def params(self) -> dict:
         return {
-            "service_name": str,
+            "service_name": (str, list),
             "duration": str,
             "interface": str,
             "loss_percentage": str,
@@ -1351,25 +1384,27 @@ class PacketLossTreatment(Treatment):
             self.config |= {"duration_integer": relative_time_seconds}
 
     def preconditions(self) -> bool:
-        """Check if the service has tc installed"""
-        service = self.config.get("service_name")
+        """Check if all targeted services have tc installed"""
         command = ["tc", "-Version"]
-        try:
-            container = self.client.containers.get(container_id=service)
-            status_code, _ = container.exec_run(cmd=command)
-            logger.info(f"Probed container {service} for tc with result {status_code}")
-            if not status_code == 0:
-                self.messages.append(
-                    f"Container {service} does not have tc installed which is required for {self}. Please install "
-                    "package iptables2 in the container"
-                )
-            return status_code == 0
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service}")
-            return False
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
+        if not _exec_on_containers(treatment=self, command=command):
+            self.messages.append(
+                f"Not all containers of {self.config.get('service_name')} have tc installed which is required for "
+                f"{self}. Please install package iptables2 in the containers"
+            )
             return False
+        return True
+
+    def _clean_command(self) -> List[str]:
+        interface = self.config.get("interface") or "eth0"
+        return [
+            "tc",
+            "qdisc",
+            "del",
+            "dev",
+            interface,
+            "root",
+            "netem",
+        ]
 
     def inject(self):
         duration_seconds = self.config.get("duration_integer")
@@ -1388,43 +1423,22 @@ class PacketLossTreatment(Treatment):
             "random",
             percentage,
         ]
-        try:
-            container = self.client.containers.get(container_id=service)
-            status_code, _ = container.exec_run(cmd=command)
-            logger.debug(
-                f"Injected packet loss into container {service} with status code {status_code}. Waiting for {duration_seconds}s"
-            )
-            time.sleep(duration_seconds)
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service}")
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
+        if not _exec_on_containers(treatment=self, command=command, rollback_command=self._clean_command(), mark_applied=True):
+            logger.error(f"Failed to inject packet loss into {service}")
+            return
+        logger.debug(
+            f"Injected packet loss into {service}. Waiting for {duration_seconds}s"
+        )
+        time.sleep(duration_seconds)
 
     def clean(self):
-        interface = self.config.get("interface") or "eth0"
         service = self.config.get("service_name")
-        command = [
-            "tc",
-            "qdisc",
-            "del",
-            "dev",
-            interface,
-            "root",
-            "netem",
-        ]
-        try:
-            container = self.client.containers.get(container_id=service)
-            container.exec_run(cmd=command)
-            logger.info(f"Cleaned packet loss treatment in container {service}.")
-            self.client.close()
-        except (DockerAPIError, ContainerNotFound) as e:
-            logger.error(
-                f"Cannot clean packet loss treatment from container {service}: {e.explanation}"
-            )
+        if _exec_on_containers(treatment=self, command=self._clean_command()):
+            logger.info(f"Cleaned packet loss treatment in {service}.")
+        else:
             logger.error(f"Container state for {service} might be polluted now")
 
 
-
 class KubernetesNetworkPacketLossTreatment(Treatment):
     """
     Inject network errors into a service to induce packet loss
@@ -1554,11 +1568,12 @@ class KubernetesNetworkPacketLossTreatment(Treatment):
             assert label
             assert duration
             assert isinstance(self.orchestrator, KubernetesOrchestrator)
-            status_code, _ = self.orchestrator.execute_console_command_on_all_matching_pods(
+            status_code = _apply_to_pods(
+                treatment=self,
                 namespace=namespace,
                 label_selector=label_selector,
                 label=label,
-                command=command
+                command=command,
             )
             if status_code > 1:
                 logger.error(
@@ -1730,9 +1745,8 @@ class KillTreatment(Treatment):
     def preconditions(self) -> bool:
         """Check if the docker daemon is running and the container is running"""
         service = self.config.get("service_name")
-        client = docker.from_env()
         try:
-            container = client.containers.get(container_id=service)
+            container = self.orchestrator.get_container(service, refresh=True)
             container_state = container.status
             logger.debug(
                 f"Probed container {service} for state running with result {container_state}"
@@ -1752,10 +1766,10 @@ class KillTreatment(Treatment):
     def inject(self) -> None:
         service_name = self.config.get("service_name")
         duration_seconds = self.config.get("duration_seconds")
-        client = docker.from_env()
         try:
-            container = client.containers.get(container_id=service_name)
+            container = self.orchestrator.get_container(service_name)
             container.kill()
+            self.mark_applied()
             logger.debug(
                 f"Killed container {service_name}. Sleeping for {duration_seconds}"
             )
@@ -1767,9 +1781,8 @@ class KillTreatment(Treatment):
 
     def clean(self) -> None:
         service_name = self.config.get("service_name")
-        client = docker.from_env()
         try:
-            container = client.containers.get(container_id=service_name)
+            container = self.orchestrator.get_container(service_name)
             container.restart()
             logger.debug(f"Restarted container {service_name}")
         except ContainerNotFound:
@@ -2023,39 +2036,62 @@ class KubernetesPrometheusIntervalTreatment(Treatment):
     """
     Treatment to change the global scrape interval of a Prometheus instance.
 
+    The changed configuration is hot-reloaded via the Prometheus lifecycle api, so Prometheus keeps its in-memory
+    data. If Prometheus does not allow reloads, the Prometheus pods are restarted instead.
     """
 
     def preconditions(self) -> bool:
         """Check that the config exists at the specified location and that Prometheus is running"""
         return True
 
+    def _apply_scrape_values(self, scrape_interval, evaluation_interval, scrape_timeout, restart: bool) -> bool:
+        """Write the scrape values to the configmap and reload Prometheus, restarting it only if requested"""
+        self.orchestrator.set_prometheus_scrape_values(
+            scrape_interval=scrape_interval, evaluation_interval=evaluation_interval, scrape_timeout=scrape_timeout
+        )
+        expected_global = {
+            "scrape_interval": scrape_interval,
+            "evaluation_interval": evaluation_interval,
+            "scrape_timeout": scrape_timeout,
+        }
+        if Prometheus(orchestrator=self.orchestrator, target="sue").reload(expected_global=expected_global):
+            return True
+        if not restart:
+            return False
+        logging.info("Falling back to restarting the prometheus pods to apply the scrape configuration")
+        self.deployment = self.orchestrator.get_deployment(self.orchestrator.sue_namespace, "app.kubernetes.io/name", "prometheus")
+        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        return True
+
     def inject(self) -> None:
         assert self.config.get("interval")
         assert self.config.get("evaluation_interval")
         assert self.config.get("scrape_timeout")
         assert isinstance(self.orchestrator, KubernetesOrchestrator)
         
-        self.deployment = self.orchestrator.get_deployment("system-under-evaluation", "app.kubernetes.io/name", "prometheus")
-        
         self.initial_interval, self.initial_evaluation_interval, self.inital_scrape_timeout = self.orchestrator.get_prometheus_scrape_values()
-        self.orchestrator.set_prometheus_scrape_values(scrape_interval=self.config.get("interval"), evaluation_interval=self.config.get("evaluation_interval"), scrape_timeout=self.config.get("scrape_timeout"))
+        self._apply_scrape_values(
+            scrape_interval=self.config.get("interval"),
+            evaluation_interval=self.config.get("evaluation_interval"),
+            scrape_timeout=self.config.get("scrape_timeout"),
+            restart=True,
+        )
         logging.info(f"Set prometheus scrape interval to {self.config.get('interval')}, evaluation interval to {self.config.get('evaluation_interval')} and scrape timeout to {self.config.get('scrape_timeout')}")
 
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
-
-
     def clean(self) -> None:
-        return
-        # if we clean up the changes to prometheus, the pods have to be restarted. The prometheus data is currently not persistent, so we would loose the benchmark data.
-        
         assert isinstance(self.orchestrator, KubernetesOrchestrator)
-        self.orchestrator.set_prometheus_scrape_values(scrape_interval=self.initial_interval, evaluation_interval=self.initial_evaluation_interval, scrape_timeout=self.inital_scrape_timeout)
+        # restarting prometheus would lose the benchmark data since it is not persistent, so only reload here
+        reloaded = self._apply_scrape_values(
+            scrape_interval=self.initial_interval,
+            evaluation_interval=self.initial_evaluation_interval,
+            scrape_timeout=self.inital_scrape_timeout,
+            restart=False,
+        )
+        if not reloaded:
+            logging.warning("Could not reload prometheus, the initial scrape values take effect on its next restart")
+            return
         logging.info(f"Set prometheus scrape interval back to {self.initial_interval}, evaluation interval back to {self.initial_evaluation_interval} and scrape timeout back to {self.inital_scrape_timeout}")
 
-        self.deployment = self.orchestrator.get_deployment("system-under-evaluation", "app.kubernetes.io/name", "prometheus")
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
-
-
     def params(self) -> dict:
         return {
             "interval": str,
@@ -2110,28 +2146,14 @@ class StressTreatment(Treatment):
     action = "stress"
 
     def preconditions(self) -> bool:
-        """Check if the service has stress-ng installed"""
-        service = self.config.get("service_name")
+        """Check if all targeted services have stress-ng installed"""
         command = ["stress-ng", "--version"]
-        client = docker.from_env()
-        try:
-            container = client.containers.get(container_id=service)
-            status_code, _ = container.exec_run(cmd=command)
-            logger.debug(
-                f"Probed container {service} for stress-ng installation with result {status_code}"
+        if not _exec_on_containers(treatment=self, command=command):
+            self.messages.append(
+                f"Not all containers of {self.config.get('service_name')} have stress-ng installed which is required for {self.treatment_type}."
             )
-            if not status_code == 0:
-                self.messages.append(
-                    f"Container {service} does not have stress-ng installed which is required for {self.treatment_type}."
-                )
-            return status_code == 0
-
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service}")
-            return False
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
             return False
+        return True
 
     def _build_stressor_list(self):
         return list(sum(self.stressors.items(), ()))
@@ -2146,18 +2168,17 @@ class StressTreatment(Treatment):
         service_name = self.config.get("service_name")
 
         command = self._build_command()
-        client = docker.from_env()
 
-        try:
-            container = client.containers.get(container_id=service_name)
-            status_code, _ = container.exec_run(cmd=command)
-            logger.debug(
-                f"Injected stress into container {service_name}. stress-ng terminated with status code {status_code}."
+        # stress-ng runs in the foreground until its timeout and cleans up after itself, so there is nothing to roll
+        # back and the results are only available once the stressors have finished
+        if _exec_on_containers(treatment=self, command=command):
+            # the stress took effect when stress-ng was started in the last container, not when it terminated
+            self.mark_applied(
+                timestamp=max(result.finished - result.latency for result in self.container_results)
             )
-        except ContainerNotFound:
-            logger.error(f"Can't find container {service_name}")
-        except DockerAPIError as e:
-            logger.error(f"Docker API returned an error: {e.explanation}")
+            logger.debug(f"Injected stress into {service_name}. stress-ng terminated successfully.")
+        else:
+            logger.error(f"Failed to inject stress into all containers of {service_name}")
 
     def clean(self) -> None:
         # stress-ng cleans up after itself
@@ -2165,7 +2186,7 @@ class StressTreatment(Treatment):
 
     def params(self) -> dict:
         return {
-            "service_name": str,
+            "service_name": (str, list),
             "stressors": dict,
             "duration": str,
         }